@@ -5,28 +5,27 @@ from openpyxl.styles import Font
 from openpyxl.utils import get_column_letter, column_index_from_string
 import tkinter as tk
 from tkinter import filedialog
+import os
+import sys
+
+# Share the merged-range index with the app utilities
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'UI'))
+from app.utils.merged_index import merged_index
+from app.utils.merge_plan import write_merges
 
 def get_merged_cell_value(worksheet, row, col):
     """Get the value of a cell, taking into account if it's part of a merged range."""
     if isinstance(col, str):
         col = column_index_from_string(col)
     
-    for merged_range in worksheet.merged_cells.ranges:
-        if merged_range.min_row <= row <= merged_range.max_row and \
-           merged_range.min_col <= col <= merged_range.max_col:
-            return worksheet.cell(merged_range.min_row, merged_range.min_col).value
-    return worksheet.cell(row, col).value
+    return merged_index(worksheet).get_value(row, col)
 
 def get_merged_cell_range(worksheet, row, col):
     """Get the range of a merged cell if the cell is part of a merged range."""
     if isinstance(col, str):
         col = column_index_from_string(col)
     
-    for merged_range in worksheet.merged_cells.ranges:
-        if merged_range.min_row <= row <= merged_range.max_row and \
-           merged_range.min_col <= col <= merged_range.max_col:
-            return merged_range
-    return None
+    return merged_index(worksheet).get_range(row, col)
 
 def find_matching_row(worksheet, value, column):
     """Find the row in the given worksheet where the value in the specified column matches."""
@@ -54,7 +53,202 @@ def write_to_cell(worksheet, row, col, value, font=None):
     if font:
         cell.font = font
 
-def compare_excel_files(original_file, new_file, output_file):
+def redline_by_scan(ws_original, ws_new, ws_output):
+    """Redline one sheet by scanning the original for every key. Returns the output merge ranges."""
+    output_row = 1
+    processed_first_column_ids = set()
+    merge_ranges_to_apply = []
+    
+    for col in range(1, ws_new.max_column):
+        col_letter = get_column_letter(col)
+        next_col_letter = get_column_letter(col + 1)
+        
+        for new_row in range(1, ws_new.max_row + 1):
+            key_value = get_merged_cell_value(ws_new, new_row, col_letter)
+            
+            if col == 1:
+                if key_value in processed_first_column_ids:
+                    continue
+                processed_first_column_ids.add(key_value)
+            
+            original_row = find_matching_row(ws_original, key_value, col_letter)
+            
+            # Write the key value to the output
+            write_to_cell(ws_output, output_row, col, key_value)
+            
+            new_merged_range = get_merged_cell_range(ws_new, new_row, col_letter)
+            if new_merged_range:
+                row_span = new_merged_range.max_row - new_merged_range.min_row + 1
+            else:
+                row_span = 1
+            
+            start_output_row = output_row
+            
+            if original_row is not None:
+                original_merged_range = get_merged_cell_range(ws_original, original_row, col_letter)
+                
+                new_ids = get_ids_in_merged_range(ws_new, new_merged_range, col + 1) if new_merged_range else [ws_new.cell(new_row, col + 1).value]
+                original_ids = get_ids_in_merged_range(ws_original, original_merged_range, col + 1) if original_merged_range else [ws_original.cell(original_row, col + 1).value]
+                
+                all_ids = list(set(new_ids + original_ids))
+                for i, id_value in enumerate(all_ids):
+                    if id_value in new_ids:
+                        if id_value not in original_ids:
+                            write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="00FF00"))
+                        else:
+                            write_to_cell(ws_output, output_row + i, col + 1, id_value)
+                    else:
+                        write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="FF0000", strike=True))
+                
+                row_span = max(row_span, len(all_ids))
+            else:
+                # New entry, mark entire merged range (or single cell) as green
+                if new_merged_range:
+                    new_ids = get_ids_in_merged_range(ws_new, new_merged_range, col + 1)
+                    for i, id_value in enumerate(new_ids):
+                        write_to_cell(ws_output, output_row + i, col, key_value, Font(color="00FF00"))
+                        write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="00FF00"))
+                    row_span = max(row_span, len(new_ids))
+                else:
+                    write_to_cell(ws_output, output_row, col, key_value, Font(color="00FF00"))
+                    new_id = ws_new.cell(new_row, col + 1).value
+                    if new_id is not None:
+                        write_to_cell(ws_output, output_row, col + 1, new_id, Font(color="00FF00"))
+            
+            # Add merge range if necessary
+            if row_span > 1:
+                merge_range = (start_output_row, col, output_row + row_span - 1, col)
+                merge_ranges_to_apply.append(merge_range)
+            
+            output_row += row_span
+    
+    return merge_ranges_to_apply
+
+def build_column_maps(worksheet, max_col):
+    """
+    Scan the worksheet once and build, for every column up to max_col, the merge-aware value
+    and merged range of each row plus a value -> first row map.
+    Also returns the raw cell values (rows of max_col values) the maps were built from.
+    """
+    index = merged_index(worksheet)
+    max_row = worksheet.max_row
+    raw = [list(row) + [None] * (max_col - len(row))
+           for row in worksheet.iter_rows(min_row=1, max_row=max_row, max_col=max_col, values_only=True)]
+    
+    column_maps = {}
+    for col in range(1, max_col + 1):
+        values = [None] * (max_row + 1)  # 1-based, index 0 unused
+        ranges = [None] * (max_row + 1)
+        first_rows = {}
+        for row in range(1, max_row + 1):
+            merged_range = index.get_range(row, col)
+            if merged_range is not None:
+                value = raw[merged_range.min_row - 1][merged_range.min_col - 1]
+            else:
+                value = raw[row - 1][col - 1]
+            values[row] = value
+            ranges[row] = merged_range
+            first_rows.setdefault(value, row)
+        column_maps[col] = {'values': values, 'ranges': ranges, 'first_rows': first_rows}
+    return column_maps, raw
+
+def get_child_ids(column_maps, raw, row, col, cache):
+    """Get the IDs in column col + 1 under the key at (row, col), computed once per merged range."""
+    merged_range = column_maps[col]['ranges'][row]
+    if merged_range is None:
+        return [raw[row - 1][col]]
+    key = (col, merged_range.min_row)
+    if key not in cache:
+        cache[key] = [raw[r - 1][col] for r in range(merged_range.min_row, merged_range.max_row + 1)
+                      if raw[r - 1][col] is not None]
+    return cache[key]
+
+def redline_by_index(ws_original, ws_new, ws_output):
+    """
+    Redline one sheet from per-column value -> merged range maps of both workbooks.
+    Each workbook is scanned once, so the work stays close to linear in the sheet size.
+    Produces the same output as redline_by_scan. Returns the output merge ranges.
+    """
+    max_col = ws_new.max_column
+    new_maps, new_raw = build_column_maps(ws_new, max_col)
+    original_maps, original_raw = build_column_maps(ws_original, max_col)
+    new_cache = {}
+    original_cache = {}
+    
+    output_row = 1
+    processed_first_column_ids = set()
+    merge_ranges_to_apply = []
+    
+    for col in range(1, max_col):
+        new_values = new_maps[col]['values']
+        new_ranges = new_maps[col]['ranges']
+        original_first_rows = original_maps[col]['first_rows']
+        
+        for new_row in range(1, ws_new.max_row + 1):
+            key_value = new_values[new_row]
+            
+            if col == 1:
+                if key_value in processed_first_column_ids:
+                    continue
+                processed_first_column_ids.add(key_value)
+            
+            original_row = original_first_rows.get(key_value)
+            
+            # Write the key value to the output
+            write_to_cell(ws_output, output_row, col, key_value)
+            
+            new_merged_range = new_ranges[new_row]
+            if new_merged_range:
+                row_span = new_merged_range.max_row - new_merged_range.min_row + 1
+            else:
+                row_span = 1
+            
+            start_output_row = output_row
+            new_ids = get_child_ids(new_maps, new_raw, new_row, col, new_cache)
+            
+            if original_row is not None:
+                original_ids = get_child_ids(original_maps, original_raw, original_row, col, original_cache)
+                new_id_set = set(new_ids)
+                original_id_set = set(original_ids)
+                
+                all_ids = list(set(new_ids + original_ids))
+                for i, id_value in enumerate(all_ids):
+                    if id_value in new_id_set:
+                        if id_value not in original_id_set:
+                            write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="00FF00"))
+                        else:
+                            write_to_cell(ws_output, output_row + i, col + 1, id_value)
+                    else:
+                        write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="FF0000", strike=True))
+                
+                row_span = max(row_span, len(all_ids))
+            else:
+                # New entry, mark entire merged range (or single cell) as green
+                if new_merged_range:
+                    for i, id_value in enumerate(new_ids):
+                        write_to_cell(ws_output, output_row + i, col, key_value, Font(color="00FF00"))
+                        write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="00FF00"))
+                    row_span = max(row_span, len(new_ids))
+                else:
+                    write_to_cell(ws_output, output_row, col, key_value, Font(color="00FF00"))
+                    new_id = new_ids[0]
+                    if new_id is not None:
+                        write_to_cell(ws_output, output_row, col + 1, new_id, Font(color="00FF00"))
+            
+            # Add merge range if necessary
+            if row_span > 1:
+                merge_range = (start_output_row, col, output_row + row_span - 1, col)
+                merge_ranges_to_apply.append(merge_range)
+            
+            output_row += row_span
+    
+    return merge_ranges_to_apply
+
+def compare_excel_files(original_file, new_file, output_file, indexed=True):
+    """
+    Redline the new RTM against the original and save the result to output_file.
+    indexed=True uses the single-scan column maps, indexed=False scans the original per key.
+    """
     wb_original = openpyxl.load_workbook(original_file)
     wb_new = openpyxl.load_workbook(new_file)
     wb_output = openpyxl.Workbook()
@@ -65,77 +259,13 @@ def compare_excel_files(original_file, new_file, output_file):
             ws_new = wb_new[sheet_name]
             ws_output = wb_output.create_sheet(sheet_name)
             
-            output_row = 1
-            processed_first_column_ids = set()
-            merge_ranges_to_apply = []
+            if indexed:
+                merge_ranges_to_apply = redline_by_index(ws_original, ws_new, ws_output)
+            else:
+                merge_ranges_to_apply = redline_by_scan(ws_original, ws_new, ws_output)
             
-            for col in range(1, ws_new.max_column):
-                col_letter = get_column_letter(col)
-                next_col_letter = get_column_letter(col + 1)
-                
-                for new_row in range(1, ws_new.max_row + 1):
-                    key_value = get_merged_cell_value(ws_new, new_row, col_letter)
-                    
-                    if col == 1:
-                        if key_value in processed_first_column_ids:
-                            continue
-                        processed_first_column_ids.add(key_value)
-                    
-                    original_row = find_matching_row(ws_original, key_value, col_letter)
-                    
-                    # Write the key value to the output
-                    write_to_cell(ws_output, output_row, col, key_value)
-                    
-                    new_merged_range = get_merged_cell_range(ws_new, new_row, col_letter)
-                    if new_merged_range:
-                        row_span = new_merged_range.max_row - new_merged_range.min_row + 1
-                    else:
-                        row_span = 1
-                    
-                    start_output_row = output_row
-                    
-                    if original_row is not None:
-                        original_merged_range = get_merged_cell_range(ws_original, original_row, col_letter)
-                        
-                        new_ids = get_ids_in_merged_range(ws_new, new_merged_range, col + 1) if new_merged_range else [ws_new.cell(new_row, col + 1).value]
-                        original_ids = get_ids_in_merged_range(ws_original, original_merged_range, col + 1) if original_merged_range else [ws_original.cell(original_row, col + 1).value]
-                        
-                        all_ids = list(set(new_ids + original_ids))
-                        for i, id_value in enumerate(all_ids):
-                            if id_value in new_ids:
-                                if id_value not in original_ids:
-                                    write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="00FF00"))
-                                else:
-                                    write_to_cell(ws_output, output_row + i, col + 1, id_value)
-                            else:
-                                write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="FF0000", strike=True))
-                        
-                        row_span = max(row_span, len(all_ids))
-                    else:
-                        # New entry, mark entire merged range (or single cell) as green
-                        if new_merged_range:
-                            new_ids = get_ids_in_merged_range(ws_new, new_merged_range, col + 1)
-                            for i, id_value in enumerate(new_ids):
-                                write_to_cell(ws_output, output_row + i, col, key_value, Font(color="00FF00"))
-                                write_to_cell(ws_output, output_row + i, col + 1, id_value, Font(color="00FF00"))
-                            row_span = max(row_span, len(new_ids))
-                        else:
-                            write_to_cell(ws_output, output_row, col, key_value, Font(color="00FF00"))
-                            new_id = ws_new.cell(new_row, col + 1).value
-                            if new_id is not None:
-                                write_to_cell(ws_output, output_row, col + 1, new_id, Font(color="00FF00"))
-                    
-                    # Add merge range if necessary
-                    if row_span > 1:
-                        merge_range = (start_output_row, col, output_row + row_span - 1, col)
-                        merge_ranges_to_apply.append(merge_range)
-                    
-                    output_row += row_span
-            
-            # Apply merge ranges after all content has been written
-            for merge_range in merge_ranges_to_apply:
-                ws_output.merge_cells(start_row=merge_range[0], start_column=merge_range[1],
-                                      end_row=merge_range[2], end_column=merge_range[3])
+            # Apply merge ranges after all content has been written, in one batch
+            write_merges(ws_output, merge_ranges_to_apply, clear_covered=True)
             
             for col in range(1, ws_new.max_column + 1):
                 col_letter = get_column_letter(col)
@@ -0,0 +1,90 @@
+# Redline any nested trace layout described by a JSON hierarchy schema (see redline_schema)
+
+import openpyxl
+from openpyxl.utils import get_column_letter
+import tkinter as tk
+from tkinter import filedialog
+import warnings
+import os
+import sys
+
+# Share the redline engine with the app utilities
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'UI'))
+from app.utils.merge_plan import write_merges
+from app.utils.redline_schema import redline_by_schema, load_schema, DFMEA_SCHEMA
+
+# Suppress UserWarnings
+warnings.filterwarnings("ignore", category=UserWarning)
+
+def compare_excel_files(original_file, new_file, output_file, schema=DFMEA_SCHEMA):
+    """
+    Redline every sheet of the new workbook that is also in the original, laid out as the
+    schema declares, and save the result to output_file.
+    """
+    wb_original = openpyxl.load_workbook(original_file)
+    wb_new = openpyxl.load_workbook(new_file)
+    wb_output = openpyxl.Workbook()
+
+    for sheet_name in wb_new.sheetnames:
+        if sheet_name in wb_original.sheetnames:
+            ws_original = wb_original[sheet_name]
+            ws_new = wb_new[sheet_name]
+            ws_output = wb_output.create_sheet(sheet_name)
+
+            merge_ranges_to_apply = redline_by_schema(ws_original, ws_new, ws_output, schema)
+
+            # Apply merge ranges after all content has been written, in one batch
+            write_merges(ws_output, merge_ranges_to_apply, clear_covered=True)
+
+            # Copy column widths from the new worksheet
+            for col in range(1, ws_new.max_column + 1):
+                col_letter = get_column_letter(col)
+                ws_output.column_dimensions[col_letter].width = ws_new.column_dimensions[col_letter].width
+
+    wb_output.remove(wb_output['Sheet'])
+    wb_output.save(output_file)
+
+def select_file(title, filetypes=(("Excel files", "*.xlsx *.xls"),)):
+    root = tk.Tk()
+    root.withdraw()
+    file_path = filedialog.askopenfilename(title=title, filetypes=list(filetypes))
+    return file_path
+
+def main():
+    print("Schema Redline Comparison Tool")
+    print("------------------------------")
+
+    original_file = select_file("Select the ORIGINAL Excel file")
+    if not original_file:
+        print("No original file selected. Exiting.")
+        return
+
+    new_file = select_file("Select the NEW Excel file")
+    if not new_file:
+        print("No new file selected. Exiting.")
+        return
+
+    # e.g. [{"key": "A", "columns": ["B", "C"]}, {"key": "D", "columns": ["D", "E"], "keyed_columns": ["F"]}]
+    schema_file = select_file("Select the hierarchy schema (cancel for the dFMEA layout)", (("JSON files", "*.json"),))
+    schema = load_schema(schema_file) if schema_file else DFMEA_SCHEMA
+
+    output_file = filedialog.asksaveasfilename(
+        title="Save the comparison result as",
+        defaultextension=".xlsx",
+        filetypes=[("Excel files", "*.xlsx")]
+    )
+    if not output_file:
+        print("No output file specified. Exiting.")
+        return
+
+    print("\nComparing files:")
+    print(f"Original: {original_file}")
+    print(f"New: {new_file}")
+    print(f"Schema: {schema_file or 'dFMEA layout'}")
+    print(f"Output: {output_file}")
+
+    compare_excel_files(original_file, new_file, output_file, schema)
+    print(f"\nComparison complete. Results saved to {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-from ..utils.duplicate_item import highlight_duplicates_in_column
+from ..utils.job_runner import JobRunner
 
 class DuplicateSearchScreen(tk.Frame):
     def __init__(self, parent):
@@ -19,7 +19,9 @@ class DuplicateSearchScreen(tk.Frame):
         file_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
 
         # Add file selection button and label
-        ttk.Button(file_frame, text="Select File", command=self.select_file).grid(row=0, column=0, padx=5, pady=5)
+        # Several files can be selected; they are searched together
+        ttk.Button(file_frame, text="Select File(s)", command=self.select_file).grid(row=0, column=0, padx=5, pady=5)
+        self.file_paths = []
         self.file_label = ttk.Label(file_frame, text="No file selected")
         self.file_label.grid(row=0, column=1, padx=5, pady=5)
 
@@ -34,48 +36,99 @@ class DuplicateSearchScreen(tk.Frame):
         inputs_frame.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
 
         # Create and layout input field
-        ttk.Label(inputs_frame, text="Search Column:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
+        ttk.Label(inputs_frame, text="Search Column(s):").grid(row=0, column=0, padx=5, pady=5, sticky="e")
         self.column_var = tk.StringVar()
         self.column_entry = ttk.Entry(inputs_frame, textvariable=self.column_var, width=15)
         self.column_entry.grid(row=0, column=1, padx=5, pady=5, sticky="w")
 
+        # Exact matches only, or also texts a few words, spaces or punctuation marks apart
+        ttk.Label(inputs_frame, text="Match:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        self.match_var = tk.StringVar(value="Exact")
+        match_dropdown = ttk.Combobox(inputs_frame, textvariable=self.match_var, values=["Exact", "Near Duplicates"], width=15, state="readonly")
+        match_dropdown.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(inputs_frame, text="Similarity:").grid(row=2, column=0, padx=5, pady=5, sticky="e")
+        self.similarity_var = tk.StringVar(value="0.8")
+        self.similarity_entry = ttk.Entry(inputs_frame, textvariable=self.similarity_var, width=15)
+        self.similarity_entry.grid(row=2, column=1, padx=5, pady=5, sticky="w")
+
+        # Check against (and add to) the index of every export searched before
+        ttk.Label(inputs_frame, text="Check Index:").grid(row=3, column=0, padx=5, pady=5, sticky="e")
+        self.index_var = tk.StringVar(value="No")
+        index_dropdown = ttk.Combobox(inputs_frame, textvariable=self.index_var, values=["Yes", "No"], width=15, state="readonly")
+        index_dropdown.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+
         # Add Generate button
-        ttk.Button(main_frame, text="Generate", command=self.generate).grid(row=2, column=0, pady=20)
+        self.generate_button = ttk.Button(main_frame, text="Generate", command=self.generate)
+        self.generate_button.grid(row=2, column=0, pady=20)
+
+        # Progress bar and Cancel button for the running job
+        self.job_runner = JobRunner(main_frame, buttons=[self.generate_button])
+        self.job_runner.grid(row=3, column=0, sticky="ew")
 
     def select_file(self):
-        filename = filedialog.askopenfilename(title="Select File")
-        if filename:
-            self.file_label.config(text=filename)
-            base_name = os.path.splitext(os.path.basename(filename))[0]
+        filenames = filedialog.askopenfilenames(title="Select File(s)")
+        if filenames:
+            self.file_paths = list(filenames)
+            if len(filenames) == 1:
+                self.file_label.config(text=filenames[0])
+            else:
+                self.file_label.config(text=f"{len(filenames)} files selected")
+            base_name = os.path.splitext(os.path.basename(filenames[0]))[0]
             self.output_filename_var.set(f"{base_name}_duplicates")
 
     def generate(self):
-        if not hasattr(self, 'file_label') or not self.file_label.cget('text') or self.file_label.cget('text') == "No file selected":
+        if not self.file_paths:
             messagebox.showerror("Error", "Please select a file first")
             return
         
-        file_path = self.file_label.cget('text')
+        file_path = self.file_paths[0]
         
         try:
             # Get input value
-            search_column = self.column_var.get()
+            # Several columns are separated by commas (e.g. C, E)
+            search_columns = [column.strip() for column in self.column_var.get().split(',') if column.strip()]
             
             # Validate that field is filled
-            if not search_column:
+            if not search_columns:
                 messagebox.showerror("Error", "Please enter a search column")
                 return
+            file_paths = list(self.file_paths)
+            use_index = self.index_var.get() == "Yes"
+            
+            near_duplicates = self.match_var.get() == "Near Duplicates"
+            similarity = float(self.similarity_var.get()) if near_duplicates else None
+            if near_duplicates and not 0 < similarity <= 1:
+                raise ValueError("Similarity must be between 0 and 1")
             
             # Create output path
             output_filename = self.output_filename_var.get()
             output_dir = os.path.dirname(file_path)
             output_path = os.path.join(output_dir, f"{output_filename}.xlsx")
             
-            # Copy file to new location
-            highlight_duplicates_in_column(file_path, search_column)
+            def work():
+                # Imported on first use so the screen opens without loading openpyxl
+                from ..utils.pipelines import find_duplicates_file, find_duplicates_across_files
+                # Only the analysis is written, to the output file; the selected files are left as they are
+                kwargs = {'near_duplicates': True, 'similarity': similarity} if near_duplicates else {}
+                index_path = None
+                if use_index:
+                    from ..utils.duplicate_index import default_index_path
+                    index_path = default_index_path()
+                if len(file_paths) == 1 and len(search_columns) == 1:
+                    return find_duplicates_file(file_path, search_columns[0], output_path=output_path,
+                                                analysis_only=True, index_path=index_path, **kwargs)
+                # Every column of every file goes into one index, so collisions between them are listed
+                targets = [(path, column) for path in file_paths for column in search_columns]
+                return find_duplicates_across_files(targets, output_path, index_path=index_path, **kwargs)
             
-            messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
+            # Run the search off the Tk thread so the window stays responsive
+            self.job_runner.start(work, self.show_success)
             
         except ValueError as e:
             messagebox.showerror("Input Error", str(e))
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}") 
\ No newline at end of file
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+
+    def show_success(self, output_path):
+        messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
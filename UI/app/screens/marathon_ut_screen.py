@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from app.utils.usertask_format import usertask_format
+from app.utils.job_runner import JobRunner
 import os
 
 class MarathonUTScreen(tk.Frame):
@@ -48,6 +48,13 @@ class MarathonUTScreen(tk.Frame):
         self.output_filename_entry = ttk.Entry(file_frame, textvariable=self.output_filename_var, width=40)
         self.output_filename_entry.grid(row=1, column=1, padx=5, pady=5, sticky="w")
 
+        # Add borders dropdown: "Yes" borders the merges covering column B, "By Level" is thick after
+        # each folder and thin after user stories and tasks
+        ttk.Label(file_frame, text="Add Borders:").grid(row=2, column=0, padx=5, pady=5, sticky="e")
+        self.borders_var = tk.StringVar(value="No")
+        borders_dropdown = ttk.Combobox(file_frame, textvariable=self.borders_var, values=["Yes", "By Level", "No"], width=9, state="readonly")
+        borders_dropdown.grid(row=2, column=1, padx=5, pady=5, sticky="w")
+
         # Inputs section
         inputs_frame = ttk.LabelFrame(main_frame, text="Inputs")
         inputs_frame.grid(row=4, column=0, padx=10, pady=10, sticky="ew")
@@ -80,6 +87,10 @@ class MarathonUTScreen(tk.Frame):
         self.generate_button = ttk.Button(main_frame, text="Generate", command=self.generate, style='Large.TButton')
         self.generate_button.grid(row=5, column=0, pady=20, sticky="ew")
 
+        # Progress bar and Cancel button for the running job
+        self.job_runner = JobRunner(main_frame, buttons=[self.generate_button])
+        self.job_runner.grid(row=6, column=0, sticky="ew")
+
     def select_file(self):
         filename = filedialog.askopenfilename(title="Select File")
         if filename:
@@ -107,23 +118,33 @@ class MarathonUTScreen(tk.Frame):
                 messagebox.showerror("Error", "Please fill in all input fields")
                 return
 
-            # Process the file
-            wb = usertask_format(
-                file_path,
-                header_row,
-                item_type_col,
-                us_name_col,
-                ut_name_col
-            )
-            
-            # Save the final workbook with custom filename
             output_dir = os.path.dirname(file_path)
             output_path = os.path.join(output_dir, f"{output_filename}.xlsx")
-            wb.save(output_path)
             
-            messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
+            borders = self.borders_var.get() in ("Yes", "By Level")
+            level_borders = self.borders_var.get() == "By Level"
+            
+            def work():
+                # Imported on first use so the screen opens without loading openpyxl
+                from app.utils.pipelines import format_usertask_file
+                return format_usertask_file(
+                    file_path,
+                    output_path,
+                    header_row,
+                    item_type_col,
+                    us_name_col,
+                    ut_name_col,
+                    borders=borders,
+                    level_borders=level_borders
+                )
+            
+            # Run the formatting off the Tk thread so the window stays responsive
+            self.job_runner.start(work, self.show_success)
             
         except ValueError as e:
             messagebox.showerror("Input Error", str(e))
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}") 
\ No newline at end of file
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+
+    def show_success(self, output_path):
+        messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
@@ -1,9 +1,7 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 from app.utils.risk_matrix import RiskMatrix
-from app.utils.general_format_URRA import format_urra
-from app.utils.risk_score import calculate_risk_score
-from app.utils.border_format import add_merged_borders
+from app.utils.job_runner import JobRunner
 import os
 
 class PremitURRAScreen(tk.Frame):
@@ -49,9 +47,17 @@ class PremitURRAScreen(tk.Frame):
         # Add borders dropdown (new)
         ttk.Label(file_frame, text="Add Borders:").grid(row=2, column=0, padx=5, pady=5, sticky="e")
         self.borders_var = tk.StringVar(value="Yes")
-        borders_dropdown = ttk.Combobox(file_frame, textvariable=self.borders_var, values=["Yes", "No"], width=5, state="readonly")
+        # "By Level" borders the parent groups: thick after the first parent, thin after the second
+        borders_dropdown = ttk.Combobox(file_frame, textvariable=self.borders_var, values=["Yes", "By Level", "No"], width=9, state="readonly")
         borders_dropdown.grid(row=2, column=1, padx=5, pady=5, sticky="w")
 
+        # Risk colours as a fill on every scored cell, or one conditional format per risk column
+        ttk.Label(file_frame, text="Risk Colours:").grid(row=3, column=0, padx=5, pady=5, sticky="e")
+        self.risk_colours_var = tk.StringVar(value="Cell Fills")
+        risk_colours_dropdown = ttk.Combobox(file_frame, textvariable=self.risk_colours_var,
+                                             values=["Cell Fills", "Conditional Formatting"], width=22, state="readonly")
+        risk_colours_dropdown.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+
         # Inputs section
         inputs_frame = ttk.LabelFrame(main_frame, text="Inputs")
         inputs_frame.grid(row=2, column=0, padx=10, pady=10, sticky="ew")
@@ -101,6 +107,10 @@ class PremitURRAScreen(tk.Frame):
         self.generate_button = ttk.Button(main_frame, text="Generate", command=self.generate, style='Large.TButton')
         self.generate_button.grid(row=4, column=0, pady=20, sticky="ew")
 
+        # Progress bar and Cancel button for the running job
+        self.job_runner = JobRunner(main_frame, buttons=[self.generate_button])
+        self.job_runner.grid(row=5, column=0, sticky="ew")
+
         # Configure grid weights
         main_frame.grid_columnconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -141,37 +151,35 @@ class PremitURRAScreen(tk.Frame):
             # Get risk matrix values
             risk_matrix_values = self.risk_matrix.get_matrix_values()
             
-            # Apply URRA formatting first (replaces format_general)
-            wb = format_urra(
-                file_path, 
-                header_row,
-                first_parent_col,
-                second_parent_col,
-                harm_id_col
-            )
-            
-            # Then calculate risk scores
-            wb = calculate_risk_score(
-                wb, 
-                occurrence_col, 
-                severity_col, 
-                risk_analysis_col, 
-                header_row,
-                risk_matrix_values
-            )
-            
-            # Add thick borders if selected
-            if self.borders_var.get() == "Yes":
-                wb = add_merged_borders(wb)
-            
-            # Save the final workbook with custom filename
             output_dir = os.path.dirname(file_path)
             output_path = os.path.join(output_dir, f"{output_filename}.xlsx")
-            wb.save(output_path)
             
-            messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
+            borders = self.borders_var.get() in ("Yes", "By Level")
+            level_borders = self.borders_var.get() == "By Level"
+            conditional_formatting = self.risk_colours_var.get() == "Conditional Formatting"
+            
+            def work():
+                # Imported on first use so the screen opens without loading openpyxl
+                from app.utils.pipelines import format_trace_file
+                # URRA formatting merges within the two parent columns (replaces format_general)
+                return format_trace_file(
+                    file_path, output_path, header_row, harm_id_col,
+                    parent_cols=[first_parent_col, second_parent_col],
+                    score_columns=[(occurrence_col, risk_analysis_col)],
+                    severity_col=severity_col,
+                    risk_matrix_values=risk_matrix_values,
+                    borders=borders,
+                    conditional_formatting=conditional_formatting,
+                    level_borders=level_borders
+                )
+            
+            # Run the formatting off the Tk thread so the window stays responsive
+            self.job_runner.start(work, self.show_success)
             
         except ValueError as e:
             messagebox.showerror("Input Error", str(e))
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
\ No newline at end of file
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+
+    def show_success(self, output_path):
+        messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
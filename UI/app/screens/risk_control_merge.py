@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
+from app.utils.job_runner import JobRunner
 import os
-from app.utils.risk_control import merge_risk_control
 
 class RiskControlScreen(tk.Frame):
     def __init__(self, parent):
@@ -118,6 +118,10 @@ class RiskControlScreen(tk.Frame):
         self.generate_button = ttk.Button(main_frame, text="Generate", command=self.generate, style='Large.TButton')
         self.generate_button.grid(row=5, column=0, pady=20, sticky="ew")
 
+        # Progress bar and Cancel button for the running job
+        self.job_runner = JobRunner(main_frame, buttons=[self.generate_button])
+        self.job_runner.grid(row=6, column=0, sticky="ew")
+
     def select_file(self, file_type):
         filename = filedialog.askopenfilename(title=f"Select {file_type.title()} Document")
         if filename:
@@ -158,22 +162,26 @@ class RiskControlScreen(tk.Frame):
                 messagebox.showerror("Error", "Please fill in all input fields")
                 return
             
-            # Perform merge operation
-            wb = merge_risk_control(
-                risk_file, control_file,
-                risk_header_row, control_header_row,
-                risk_id_col, control_id_col,
-                paste_col, control_content_col
-            )
-            
-            # Save the final workbook with custom filename
             output_dir = os.path.dirname(risk_file)
             output_path = os.path.join(output_dir, f"{output_filename}.xlsx")
-            wb.save(output_path)
             
-            messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
+            def work():
+                # Imported on first use so the screen opens without loading openpyxl
+                from app.utils.pipelines import merge_control_file
+                return merge_control_file(
+                    risk_file, control_file, output_path,
+                    risk_header_row, control_header_row,
+                    risk_id_col, control_id_col,
+                    paste_col, control_content_col
+                )
+            
+            # Run the merge off the Tk thread so the window stays responsive
+            self.job_runner.start(work, self.show_success)
             
         except ValueError as e:
             messagebox.showerror("Input Error", str(e))
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
\ No newline at end of file
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+
+    def show_success(self, output_path):
+        messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
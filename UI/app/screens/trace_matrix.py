@@ -1,7 +1,6 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from app.utils.general_format import format_general
-from app.utils.border_format import add_merged_borders
+from app.utils.job_runner import JobRunner
 import os
 
 class TraceMatrixScreen(tk.Frame):
@@ -72,6 +71,10 @@ class TraceMatrixScreen(tk.Frame):
         self.generate_button = ttk.Button(main_frame, text="Generate", command=self.generate, style='Large.TButton')
         self.generate_button.grid(row=4, column=0, pady=20, sticky="ew")
 
+        # Progress bar and Cancel button for the running job
+        self.job_runner = JobRunner(main_frame, buttons=[self.generate_button])
+        self.job_runner.grid(row=5, column=0, sticky="ew")
+
     def select_file(self):
         filename = filedialog.askopenfilename(title="Select File")
         if filename:
@@ -93,21 +96,23 @@ class TraceMatrixScreen(tk.Frame):
             if not header_row.isdigit():
                 raise ValueError("Header row must be a number")
             
-            # Apply general formatting (without harm ID column)
-            wb = format_general(file_path, header_row=int(header_row), harm_id_col=None)
-            
-            # Add thick borders if selected
-            if self.borders_var.get() == "Yes":
-                wb = add_merged_borders(wb)
-            
-            # Save the final workbook with custom filename
             output_dir = os.path.dirname(file_path)
             output_path = os.path.join(output_dir, f"{output_filename}.xlsx")
-            wb.save(output_path)
             
-            messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
+            borders = self.borders_var.get() == "Yes"
+            
+            def work():
+                # Imported on first use so the screen opens without loading openpyxl
+                from app.utils.pipelines import format_trace_file
+                return format_trace_file(file_path, output_path, int(header_row), borders=borders)
+            
+            # Run the formatting off the Tk thread so the window stays responsive
+            self.job_runner.start(work, self.show_success)
             
         except ValueError as e:
             messagebox.showerror("Input Error", str(e))
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
\ No newline at end of file
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+
+    def show_success(self, output_path):
+        messagebox.showinfo("Success", f"File has been processed and saved as:\n{output_path}")
@@ -1,40 +1,40 @@
-from openpyxl.styles import Border, Side
-from openpyxl.utils import get_column_letter
+from .progress import report_progress, count_work
+from .style_registry import with_bottom
 
-def add_merged_borders(wb):
-    """Add thick bottom borders after merged cell groups in column B"""
-    ws = wb.active
-    
-    # Find the last column with content
-    max_col = 0
-    for row in ws.iter_rows():
-        for cell in row:
-            if cell.value is not None and cell.column > max_col:
-                max_col = cell.column
-    
-    # Create thick bottom border style
-    thick_border = Border(bottom=Side(style='thick'))
-    
-    # Track the last row of each merged range in column B
-    merge_end_rows = set()
-    for merged_range in ws.merged_cells.ranges:
-        # Check if this merge range includes column B
-        if merged_range.min_col <= 2 <= merged_range.max_col:
-            merge_end_rows.add(merged_range.max_row)
-    
-    # Add borders to each row that ends a merge group
-    for row_num in merge_end_rows:
-        for col in range(2, max_col + 1):  # Start from B column
-            cell = ws.cell(row=row_num, column=col)
-            current_border = cell.border
-            
-            # Create new border maintaining existing styles
-            new_border = Border(
-                left=current_border.left,
-                right=current_border.right,
-                top=current_border.top,
-                bottom=Side(style='thick')
-            )
-            cell.border = new_border
-    
-    return wb 
\ No newline at end of file
+def add_merged_borders(table, max_col=None, levels=False):
+    """
+    Add thick bottom borders after merged cell groups in column B: every merged range covering
+    column B, input merges (e.g. a title row) included, is bordered from column B on.
+    With levels, the group ends recorded while the table was merged are used instead: top-level
+    groups get a thick border from column B (or their own column, if it comes first) and the
+    groups of every sub-level (e.g. the second URRA parent, or the user tasks of a UT export)
+    a thin border from their own column on. A table that was not merged has no recorded ends
+    and keeps the column B rule.
+    max_col is the last column to border; by default the last column of the table with content.
+    """
+    report_progress(0, stage="Adding borders")
+    if max_col is None:
+        max_col = table.content_extent()
+
+    group_ends = table.group_ends if levels else None
+    if group_ends is None:
+        group_ends = {merged_range.max_row: (0, 2) for merged_range in table.merged_ranges
+                      if merged_range.min_col <= 2 <= merged_range.max_col}
+
+    # Add borders to each row that ends a group
+    rows = cells = 0
+    bottom_borders = {}
+    for row_num, (level, group_col) in group_ends.items():
+        if level == 0:
+            # Start from B column (or the top-level column, if it comes first)
+            first_col, style = min(2, group_col), 'thick'
+        else:
+            first_col, style = group_col, 'thin'
+        for col in range(first_col, max_col + 1):
+            # New border maintaining existing styles, built once per distinct border
+            table.set_style(row_num, col, border=with_bottom(table.get_style(row_num, col, 'border'), style, bottom_borders))
+        rows += 1
+        cells += max(0, max_col - first_col + 1)
+    count_work(rows=rows, cells=cells)
+
+    return table
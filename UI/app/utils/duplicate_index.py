@@ -0,0 +1,108 @@
+import os
+import sqlite3
+from .near_duplicates import normalize_text
+from .progress import report_progress, count_work
+
+# Persistent index of every item text Duplicate Search has seen, so a new export can be checked
+# against earlier releases. Texts are stored by their normalized form (see normalize_text) with
+# the item ID (the previous column's content), source file, column and row. The normalized text
+# is indexed, so checking and adding an export costs one lookup and one insert per new entry,
+# whatever the size of the index. An entry is identified by its text, item ID, file name, column
+# and row, so indexing the same export again (even after its analysis was saved into it) adds
+# nothing and does not report the export as a duplicate of itself.
+
+INDEX_PATH_ENV = "JAMAGUI_DUPLICATE_INDEX"
+
+# Matches listed per entry in the analysis; the rest are counted
+MAX_LISTED_MATCHES = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    key TEXT NOT NULL,
+    content TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    source_file TEXT NOT NULL,
+    column_letter TEXT NOT NULL,
+    row_info TEXT NOT NULL,
+    UNIQUE (key, item_id, source_file, column_letter, row_info)
+);
+CREATE INDEX IF NOT EXISTS items_key ON items (key);
+"""
+
+def default_index_path():
+    """$JAMAGUI_DUPLICATE_INDEX, or ~/.jamagui/duplicate_index.sqlite"""
+    return os.environ.get(INDEX_PATH_ENV) or os.path.join(os.path.expanduser("~"), ".jamagui", "duplicate_index.sqlite")
+
+class DuplicateIndex:
+    """SQLite store of indexed entries; use as a context manager so each run is one transaction"""
+    def __init__(self, path=None):
+        self.path = path or default_index_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Batch runs index files from several processes, so wait for the other writers
+        self.connection = sqlite3.connect(self.path, timeout=60)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+        self.connection.close()
+
+    def lookup(self, entries, source_file, column_letter):
+        """
+        Return the earlier matches of each (previous column content, content, row(s)) entry of a
+        column as a list of (item ID, source file, column, row(s)); the entry itself is left out.
+        """
+        name = os.path.basename(source_file)
+        matches_by_key = {}
+        matches = []
+        for done, (prev_value, value, row_info) in enumerate(entries, start=1):
+            report_progress(done, len(entries), "Checking index")
+            key = normalize_text(value)
+            if key not in matches_by_key:
+                matches_by_key[key] = self.connection.execute(
+                    "SELECT item_id, source_file, column_letter, row_info FROM items "
+                    "WHERE key = ? ORDER BY rowid", (key,)).fetchall()
+            itself = (prev_value, name, column_letter, row_info)
+            matches.append([match for match in matches_by_key[key] if match != itself])
+        count_work(rows=len(entries))
+        return matches
+
+    def add(self, entries, source_file, column_letter):
+        """Index the entries of one column; entries already in the index are skipped"""
+        report_progress(0, stage="Updating index")
+        name = os.path.basename(source_file)
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO items (key, content, item_id, source_file, column_letter, row_info) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((normalize_text(value), value, prev_value, name, column_letter, row_info)
+             for prev_value, value, row_info in entries))
+        count_work(cells=len(entries))
+
+def describe_matches(matches):
+    """One cell of text naming where an entry was seen before, e.g. 'REQ-12 in release_1.xlsx (Column C, Row 5)'"""
+    if not matches:
+        return ""
+    described = [f"{item_id or '?'} in {source_file} (Column {column_letter}, {row_info})"
+                 for item_id, source_file, column_letter, row_info in matches[:MAX_LISTED_MATCHES]]
+    if len(matches) > MAX_LISTED_MATCHES:
+        described.append(f"and {len(matches) - MAX_LISTED_MATCHES} more")
+    return "; ".join(described)
+
+def check_and_index(columns, index_path=None):
+    """
+    Check the entries of each (file, column letter, entries) against the index, then add them
+    all to it; columns searched together are not reported as earlier matches of each other.
+    Returns, per column, the description of each entry's earlier matches ('' if it is new).
+    """
+    with DuplicateIndex(index_path) as index:
+        matches = [index.lookup(entries, file_path, column_letter.upper()) for file_path, column_letter, entries in columns]
+        for file_path, column_letter, entries in columns:
+            index.add(entries, file_path, column_letter.upper())
+    return [[describe_matches(entry_matches) for entry_matches in column_matches] for column_matches in matches]
@@ -1,120 +1,355 @@
+import os
+import openpyxl
 from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter, column_index_from_string
+from .merged_index import merged_index, MergedRangeIndex
+from .trace_table import TraceTable
+from .streaming import read_sheet_layout
+from .progress import report_progress, count_work
+from .style_registry import solid_fill
+from .near_duplicates import find_clusters, DEFAULT_SIMILARITY
+from .duplicate_index import check_and_index
+
+ANALYSIS_SHEET = "Duplicate_Analysis"
+COLLISIONS_SHEET = "Collisions"
 
 def get_merged_cell_value(worksheet, row, col):
     """Get the value of a cell, taking into account if it's part of a merged range."""
-    for merged_range in worksheet.merged_cells.ranges:
-        if merged_range.min_row <= row <= merged_range.max_row and \
-           merged_range.min_col <= col <= merged_range.max_col:
-            return worksheet.cell(merged_range.min_row, merged_range.min_col).value
-    return worksheet.cell(row, col).value
+    return merged_index(worksheet).get_value(row, col)
+
+def scan_columns(rows, merged_ranges, columns, total_rows=0):
+    """
+    For each (search column, previous column) pair, return (previous column content, content,
+    original row(s)) for every non-empty cell of the search column. The rows are read once and
+    in order (rows yields each row's values), however many columns are searched.
+    A merged cell reads as its top-left value and is listed once, for all the rows it covers.
+    """
+    # The top-left values of merges are remembered as their first row goes past
+    top_left = {}
+    starts = {}
+    for merged_range in merged_ranges:
+        starts.setdefault(merged_range.min_row, []).append((merged_range.min_row, merged_range.min_col))
+    index = MergedRangeIndex(merged_ranges, lambda row, col: top_left.get((row, col)))
+
+    entries = [[] for _ in columns]
+    processed_until = [0] * len(columns)  # last row of the merge each column's previous entry came from
+    row = 0
+    for row, values in enumerate(rows, start=1):
+        report_progress(row, total_rows, "Scanning rows")
+        for start in starts.get(row, ()):
+            top_left[start] = values[start[1] - 1] if start[1] <= len(values) else None
+
+        def cell_value(col):
+            merged_range = index.get_range(row, col)
+            if merged_range is not None:
+                return top_left.get((merged_range.min_row, merged_range.min_col))
+            return values[col - 1] if col <= len(values) else None
+
+        for target, (col_idx, prev_col_idx) in enumerate(columns):
+            if row <= processed_until[target]:
+                continue
+            value = cell_value(col_idx)
+            if value:  # Skip empty cells
+                prev_value = cell_value(prev_col_idx)
+                value = str(value).strip()
+                prev_value = str(prev_value).strip() if prev_value else ""
+
+                # A merged cell covers the rest of its range
+                merged_range = index.get_range(row, col_idx)
+                if merged_range is not None:
+                    processed_until[target] = merged_range.max_row
+                    row_info = f"Rows {merged_range.min_row}-{merged_range.max_row}"
+                else:
+                    row_info = f"Row {row}"
+                entries[target].append((prev_value, value, row_info))
+
+    count_work(rows=row, cells=3 * sum(len(column_entries) for column_entries in entries))
+    return entries
+
+def scan_column(rows, merged_ranges, col_idx, prev_col_idx, total_rows=0):
+    """scan_columns for a single search column"""
+    return scan_columns(rows, merged_ranges, [(col_idx, prev_col_idx)], total_rows)[0]
+
+def search_columns(col_idx):
+    """(search column, previous column) pair of a column number; column A is its own previous column"""
+    return col_idx, max(1, col_idx - 1)
+
+def stream_file_columns(file_path, column_numbers):
+    """
+    Scan the search columns of a file in one streaming pass: CSV exports are read straight into
+    a TraceTable, workbooks in read_only mode with their merges taken from the sheet XML.
+    Returns one list of entries per column (see scan_columns).
+    """
+    columns = [search_columns(col_idx) for col_idx in column_numbers]
+    if file_path.lower().endswith('.csv'):
+        table = TraceTable.load(file_path)
+        return scan_columns(zip(*table.columns), [], columns, table.max_row)
 
-def highlight_duplicates_in_column(file_path: str, column_letter: str) -> None:
+    report_progress(0, stage="Reading layout")
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        ws = wb.active
+        # Keep the declared size for progress, then read every row whatever it claims
+        declared_rows = ws.max_row or 0
+        ws.reset_dimensions()
+        merged_ranges, _ = read_sheet_layout(ws)
+        return scan_columns(ws.iter_rows(values_only=True), merged_ranges, columns, declared_rows)
+    finally:
+        wb.close()
+
+def group_entries(entries, near_duplicates=False, similarity=DEFAULT_SIMILARITY):
+    """
+    Number the groups of equal content (or near-duplicate clusters) in order of first appearance.
+    Equal content is the same text once stripped (as scan_columns reads it), in every search path;
+    only near-duplicate clustering and the duplicate index ignore case and punctuation.
+    Returns one (group number, similarity or None, group size) per entry.
+    """
+    if near_duplicates:
+        # Group the texts into near-duplicate clusters, scored against each cluster's first text
+        groups = find_clusters([value for _, value, _ in entries], similarity)
+    else:
+        # One hash index over every entry: content -> group number
+        numbers = {}
+        groups = [(numbers.setdefault(value, len(numbers) + 1), None)
+                  for _, value, _ in entries]
+    sizes = {}
+    for group, _ in groups:
+        sizes[group] = sizes.get(group, 0) + 1
+    return [(group, score, sizes[group]) for group, score in groups]
+
+def write_analysis(analysis_ws, entries, groups, column_letter, prev_col_letter, near_duplicates=False,
+                   previous=None):
+    """
+    Append the analysis rows to a new (or write-only) worksheet; duplicates are highlighted.
+    previous, if given, describes where each entry was seen in earlier indexed exports;
+    entries seen before but not duplicated within this export are filled orange.
+    """
+    # Adjust column widths for better readability (write-only sheets need them before any row)
+    analysis_ws.column_dimensions['A'].width = 50
+    analysis_ws.column_dimensions['B'].width = 50
+    analysis_ws.column_dimensions['C'].width = 20
+    analysis_ws.column_dimensions['D'].width = 10
+    if near_duplicates:
+        analysis_ws.column_dimensions['E'].width = 12
+    if previous is not None:
+        analysis_ws.column_dimensions['F' if near_duplicates else 'E'].width = 60
+
+    header = [f"Content from Column {prev_col_letter}", f"Content from Column {column_letter}", "Original Row(s)", "Item ID"]
+    if near_duplicates:
+        header.append("Similarity")
+    if previous is not None:
+        header.append("Previously Seen In")
+    analysis_ws.append(header)
+
+    report_progress(0, stage="Highlighting duplicates")
+    yellow_fill = solid_fill('FFFF00')
+    orange_fill = solid_fill('FFC000')
+    for index, ((prev_value, value, row_info), (group, score, size)) in enumerate(zip(entries, groups)):
+        row = [prev_value, value, row_info, group]
+        if near_duplicates:
+            row.append(round(score, 2))
+        seen_in = previous[index] if previous is not None else ""
+        if previous is not None:
+            row.append(seen_in)
+        fill = yellow_fill if size > 1 else orange_fill if seen_in else None
+        if fill is not None:
+            # Duplicates are filled across the whole row
+            cells = []
+            for cell_value in row:
+                cell = WriteOnlyCell(analysis_ws, value=cell_value)
+                cell.fill = fill
+                cells.append(cell)
+            row = cells
+        analysis_ws.append(row)
+
+def highlight_duplicates_in_column(file_path: str, column_letter: str, output_path: str = None,
+                                   near_duplicates: bool = False, similarity: float = DEFAULT_SIMILARITY,
+                                   analysis_only: bool = False, index_path: str = None) -> str:
     """
-    Creates a new worksheet with simplified content from the specified column and 
+    Creates a new worksheet with simplified content from the specified column and
     highlights duplicates in the new worksheet. Also includes content from the previous column.
-    
+
     Args:
-        file_path (str): Path to the Excel file
+        file_path (str): Path to the Excel file or CSV export
         column_letter (str): Column letter to search (e.g., 'A', 'B', 'C')
+        output_path (str): Workbook to save; by default the input workbook, or the
+            CSV export's name with an .xlsx extension (<input>_duplicates.xlsx with analysis_only)
+        near_duplicates (bool): Also group texts that differ only in case, whitespace,
+            punctuation or a few words, and add each text's similarity to its group
+        similarity (float): Shingle similarity (0 to 1) at which near duplicates are grouped
+        analysis_only (bool): Stream the source and write only the analysis sheet to output_path,
+            leaving the input untouched
+        index_path (str): Duplicate index to check the column against (adding a Previously Seen In
+            column) and then add the column to; None leaves the index alone
+
+    Returns:
+        str: The path written
     """
-    # Load the workbook and select active sheet
-    wb = load_workbook(file_path)
+    if analysis_only:
+        return write_duplicate_analysis(file_path, column_letter, output_path, near_duplicates, similarity,
+                                        index_path)
+
+    # Load the workbook (a CSV export is read straight into a new workbook) and select active sheet
+    if file_path.lower().endswith('.csv'):
+        wb = TraceTable.load(file_path).to_workbook()
+        default_output = os.path.splitext(file_path)[0] + ".xlsx"
+    else:
+        report_progress(0, stage="Loading workbook")
+        wb = load_workbook(file_path)
+        default_output = file_path
+    output_path = output_path or default_output
     source_ws = wb.active
-    
-    # Create a new worksheet for simplified content
-    analysis_ws = wb.create_sheet("Duplicate_Analysis")
-    
+
     # Convert column letter to index and get previous column
     col_idx = column_index_from_string(column_letter)
     prev_col_idx = max(1, col_idx - 1)  # Ensure we don't go below column A
-    prev_col_letter = get_column_letter(prev_col_idx)
-    
-    # Add headers to analysis worksheet
-    analysis_ws['A1'] = f"Content from Column {prev_col_letter}"
-    analysis_ws['B1'] = f"Content from Column {column_letter}"
-    analysis_ws['C1'] = "Original Row(s)"
-    analysis_ws['D1'] = "Item ID"
-    
-    # Process each row in the source worksheet
-    processed_rows = set()
-    analysis_row = 2  # Start after header
-    
-    for row in range(1, source_ws.max_row + 1):
-        if row in processed_rows:
-            continue
-            
-        value = get_merged_cell_value(source_ws, row, col_idx)
-        prev_value = get_merged_cell_value(source_ws, row, prev_col_idx)
-        
-        if value:  # Skip empty cells
-            value = str(value).strip()
-            prev_value = str(prev_value).strip() if prev_value else ""
-            
-            # Check if this cell is part of a merged range
-            is_merged = False
-            merged_range = None
-            for range_ in source_ws.merged_cells.ranges:
-                if (range_.min_col <= col_idx <= range_.max_col and
-                    range_.min_row <= row <= range_.max_row):
-                    is_merged = True
-                    merged_range = range_
-                    break
-            
-            if is_merged:
-                # Add all rows in merge range to processed set
-                for r in range(merged_range.min_row, merged_range.max_row + 1):
-                    processed_rows.add(r)
-                # Store original row range information
-                row_info = f"Rows {merged_range.min_row}-{merged_range.max_row}"
-            else:
-                row_info = f"Row {row}"
-            
-            # Write to analysis worksheet
-            analysis_ws.cell(row=analysis_row, column=1, value=prev_value)
-            analysis_ws.cell(row=analysis_row, column=2, value=value)
-            analysis_ws.cell(row=analysis_row, column=3, value=row_info)
-            analysis_row += 1
-    
-    # Create yellow fill pattern
-    yellow_fill = PatternFill(start_color='FFFF00',
-                             end_color='FFFF00',
-                             fill_type='solid')
-    
-    # Find and highlight duplicates in analysis worksheet
-    value_positions = {}
-    for row in range(2, analysis_ws.max_row + 1):  # Start after header
-        value = analysis_ws.cell(row=row, column=2).value  # Check column B for duplicates
-        if value:
-            value = str(value).strip()
-            if value in value_positions:
-                value_positions[value].append(row)
-            else:
-                value_positions[value] = [row]
-    
-    # Highlight duplicates and assign IDs
-    current_id = 1
-    processed_values = set()
-    
-    for value, rows in value_positions.items():
-        if value not in processed_values:
-            processed_values.add(value)
-            # Assign the same ID to all instances of this value
-            for row in rows:
-                analysis_ws.cell(row=row, column=4, value=current_id)  # Add ID
-                if len(rows) > 1:  # If there are duplicates
-                    analysis_ws.cell(row=row, column=1).fill = yellow_fill
-                    analysis_ws.cell(row=row, column=2).fill = yellow_fill
-                    analysis_ws.cell(row=row, column=3).fill = yellow_fill
-                    analysis_ws.cell(row=row, column=4).fill = yellow_fill
-            current_id += 1
-    
-    # Adjust column widths for better readability
-    analysis_ws.column_dimensions['A'].width = 50
-    analysis_ws.column_dimensions['B'].width = 50
-    analysis_ws.column_dimensions['C'].width = 20
-    analysis_ws.column_dimensions['D'].width = 10  # Add width for new column
-    
+
+    entries = scan_column(source_ws.iter_rows(values_only=True), source_ws.merged_cells.ranges,
+                          col_idx, prev_col_idx, source_ws.max_row)
+    groups = group_entries(entries, near_duplicates, similarity)
+    previous = check_and_index([(file_path, column_letter, entries)], index_path)[0] if index_path else None
+
+    # Create a new worksheet for simplified content
+    analysis_ws = wb.create_sheet(ANALYSIS_SHEET)
+    write_analysis(analysis_ws, entries, groups, column_letter, get_column_letter(prev_col_idx), near_duplicates,
+                   previous)
+
     # Save the workbook
-    wb.save(file_path)
+    report_progress(0, stage="Saving")
+    wb.save(output_path)
+    return output_path
+
+def write_duplicate_analysis(file_path, column_letter, output_path=None, near_duplicates=False,
+                             similarity=DEFAULT_SIMILARITY, index_path=None):
+    """
+    Write only the Duplicate_Analysis sheet to its own workbook (<input>_duplicates.xlsx by default).
+    The source is streamed in read_only mode and the output is write-only, so the run does not
+    load or re-save the source and its time follows the size of the analysis.
+    """
+    output_path = output_path or os.path.splitext(file_path)[0] + "_duplicates.xlsx"
+    col_idx, prev_col_idx = search_columns(column_index_from_string(column_letter))
+    entries = stream_file_columns(file_path, [col_idx])[0]
+    groups = group_entries(entries, near_duplicates, similarity)
+    previous = check_and_index([(file_path, column_letter, entries)], index_path)[0] if index_path else None
+
+    output = openpyxl.Workbook(write_only=True)
+    write_analysis(output.create_sheet(ANALYSIS_SHEET), entries, groups, column_letter,
+                   get_column_letter(prev_col_idx), near_duplicates, previous)
+    report_progress(0, stage="Saving")
+    output.save(output_path)
+    return output_path
+
+def collision_scope(members):
+    """How far apart the entries of a duplicate group are: across files, across columns or within one column"""
+    if len({file_path for file_path, _, _ in members}) > 1:
+        return "Cross-file"
+    if len({column for _, column, _ in members}) > 1:
+        return "Cross-column"
+    return "Same column"
+
+def find_duplicates_across(targets, output_path, near_duplicates=False, similarity=DEFAULT_SIMILARITY,
+                           index_path=None):
+    """
+    Search several (file, column letter) targets together. Each file is streamed once for all
+    of its columns and every entry goes into one shared index of content (or one
+    near-duplicate clustering), so duplicates are found across columns and across files.
+    Writes a Duplicate_Analysis sheet listing every entry, and a Collisions sheet listing each
+    duplicate group's entries together with how far apart they are. index_path checks every
+    column against the duplicate index of earlier exports (a Previously Seen In column) and
+    then adds them to it.
+
+    Returns:
+        str: The path written
+    """
+    if not targets:
+        raise ValueError("Please select at least one file and column")
+
+    # Group the columns by file, keeping the order they were given in
+    columns_by_file = {}
+    for file_path, column_letter in targets:
+        letters = columns_by_file.setdefault(file_path, [])
+        letter = column_letter.strip().upper()
+        if letter not in letters:
+            letters.append(letter)
+
+    sources = []  # (file name, column letter, previous column letter) per entry
+    entries = []
+    indexed = []  # (file, column letter, entries) per column, for the duplicate index
+    for file_path, letters in columns_by_file.items():
+        column_numbers = [column_index_from_string(letter) for letter in letters]
+        file_name = os.path.basename(file_path)
+        for letter, col_idx, column_entries in zip(letters, column_numbers,
+                                                   stream_file_columns(file_path, column_numbers)):
+            prev_letter = get_column_letter(search_columns(col_idx)[1])
+            sources.extend([(file_name, letter, prev_letter)] * len(column_entries))
+            entries.extend(column_entries)
+            indexed.append((file_path, letter, column_entries))
+    groups = group_entries(entries, near_duplicates, similarity)
+    previous = None
+    if index_path:
+        previous = [seen_in for column in check_and_index(indexed, index_path) for seen_in in column]
+
+    output = openpyxl.Workbook(write_only=True)
+    yellow_fill = solid_fill('FFFF00')
+    orange_fill = solid_fill('FFC000')
+
+    def append(ws, row, fill):
+        if fill is not None:
+            cells = []
+            for cell_value in row:
+                cell = WriteOnlyCell(ws, value=cell_value)
+                cell.fill = fill
+                cells.append(cell)
+            row = cells
+        ws.append(row)
+
+    header = ["Source File", "Column", "Content from Previous Column", "Content", "Original Row(s)", "Item ID"]
+    if near_duplicates:
+        header.append("Similarity")
+    if previous is not None:
+        header.append("Previously Seen In")
+    widths = [30, 8, 50, 50, 20, 10] + ([12] if near_duplicates else []) + ([60] if previous is not None else [])
+
+    analysis_ws = output.create_sheet(ANALYSIS_SHEET)
+    for col, width in enumerate(widths, start=1):
+        analysis_ws.column_dimensions[get_column_letter(col)].width = width
+    analysis_ws.append(header)
+
+    report_progress(0, stage="Highlighting duplicates")
+    members = {}
+    for index, ((file_name, letter, prev_letter), (prev_value, value, row_info), (group, score, size)) in \
+            enumerate(zip(sources, entries, groups)):
+        row = [file_name, letter, prev_value, value, row_info, group]
+        if near_duplicates:
+            row.append(round(score, 2))
+        if previous is not None:
+            row.append(previous[index])
+        append(analysis_ws, row, yellow_fill if size > 1 else orange_fill if previous and previous[index] else None)
+        if size > 1:
+            members.setdefault(group, []).append(index)
+
+    # Every collision, its entries listed together and in order of the group's first appearance
+    collisions_ws = output.create_sheet(COLLISIONS_SHEET)
+    # Item ID and Scope, then the analysis columns less its own Item ID column
+    collision_widths = [10, 14] + widths[:5] + widths[6:]
+    for col, width in enumerate(collision_widths, start=1):
+        collisions_ws.column_dimensions[get_column_letter(col)].width = width
+    collisions_ws.append(["Item ID", "Scope"] + header[:5] + header[6:])
+    for shade, (group, indexes) in enumerate(members.items()):
+        scope = collision_scope([sources[index] for index in indexes])
+        for index in indexes:
+            file_name, letter, _ = sources[index]
+            prev_value, value, row_info = entries[index]
+            row = [group, scope, file_name, letter, prev_value, value, row_info]
+            if near_duplicates:
+                row.append(round(groups[index][1], 2))
+            if previous is not None:
+                row.append(previous[index])
+            # Alternate groups are filled so neighbouring groups stay apart
+            append(collisions_ws, row, yellow_fill if shade % 2 == 0 else None)
+    count_work(cells=len(entries) + sum(len(indexes) for indexes in members.values()))
+
+    report_progress(0, stage="Saving")
+    output.save(output_path)
+    return output_path
@@ -1,8 +1,8 @@
-import openpyxl
-from openpyxl.styles import Alignment
-import shutil
 from openpyxl.utils import column_index_from_string, get_column_letter
 import os
+from .trace_table import TraceTable, check_input_file
+from .merge_engine import read_columns, hierarchical_runs, apply_merges, group_ends
+from .progress import report_progress, count_work
 
 def convert_column_input(column_input):
     """Convert column input (letter or number) to column number"""
@@ -19,90 +19,33 @@ def convert_column_input(column_input):
         except:
             raise ValueError(f"Invalid column input: {column_input}")
 
-def merge_cells(filepath, header_row, harm_col_num):
-    """Merge cells in the Excel file based on column B values."""
-    wb = openpyxl.load_workbook(filepath)
-    ws = wb.active
-    
+def merge_cells(table, header_row, harm_col_num):
+    """Merge cells in the trace table based on column B values."""
     # Find the maximum row and column
-    max_row = ws.max_row
-    max_col = ws.max_column
-    
-    # First, find merge ranges in column B
-    merge_ranges = []
-    current_value = None
-    start_row = header_row + 1
+    max_row = table.max_row
+    max_col = table.max_column
+    first_row = header_row + 1
     
-    for row in range(header_row + 1, max_row + 1):
-        cell_value = ws.cell(row=row, column=2).value
-        
-        if cell_value != current_value:
-            if start_row and start_row < row - 1:
-                merge_ranges.append((start_row, row - 1))
-            current_value = cell_value
-            start_row = row
+    # Read every column once (column B is always read since it drives the merge)
+    report_progress(0, stage="Finding merges")
+    columns = read_columns(table, first_row, max_row, max(max_col, 2))
+    count_work(rows=max(0, max_row - header_row), cells=max(0, max_row - header_row) * len(columns))
     
-    # Add the last range if necessary
-    if start_row and start_row < max_row:
-        merge_ranges.append((start_row, max_row))
+    # Column B is the only parent: every later column is merged within its runs
+    skip_cols = set() if harm_col_num is None else {harm_col_num, harm_col_num + 1, harm_col_num + 2}
+    merge_ranges = [(start + first_row, col, end + first_row, col)
+                    for start, end, col in hierarchical_runs(columns, [2], skip_cols)]
     
-    # Process each merge range independently
-    for start_row, end_row in merge_ranges:
-        # Merge column B
-        if start_row < end_row:  # Only merge if there are multiple rows
-            ws.merge_cells(f'B{start_row}:B{end_row}')
-            merged_cell = ws.cell(row=start_row, column=2)
-            merged_cell.alignment = Alignment(vertical='center')
-        
-        # For each column after B
-        for col in range(3, max_col + 1):
-            # Skip harm column and the next two columns only if harm_col_num is provided
-            if harm_col_num is not None and (col == harm_col_num or col == harm_col_num + 1 or col == harm_col_num + 2):
-                continue
-                
-            # Find sub-ranges within this range that have the same value
-            sub_ranges = []
-            sub_start = start_row
-            current_value = ws.cell(row=start_row, column=col).value
-            
-            for row in range(start_row + 1, end_row + 1):
-                cell_value = ws.cell(row=row, column=col).value
-                
-                if cell_value != current_value:
-                    if sub_start < row - 1:  # Only add if there are multiple rows
-                        sub_ranges.append((sub_start, row - 1))
-                    sub_start = row
-                    current_value = cell_value
-            
-            # Add the last sub-range if necessary
-            if sub_start < end_row:
-                sub_ranges.append((sub_start, end_row))
-            
-            # Merge each sub-range
-            for sub_start, sub_end in sub_ranges:
-                if sub_start < sub_end:  # Only merge if there are multiple rows
-                    ws.merge_cells(
-                        start_row=sub_start,
-                        start_column=col,
-                        end_row=sub_end,
-                        end_column=col
-                    )
-                    merged_cell = ws.cell(row=sub_start, column=col)
-                    merged_cell.alignment = Alignment(vertical='center')
+    # Apply all merges in one batch; the groups of column B are where borders go
+    apply_merges(table, merge_ranges)
+    table.add_group_ends(group_ends(merge_ranges, [2]))
     
-    return wb
+    return table
 
 def format_general(file_path, header_row, harm_id_col=None):
     """Format Excel file with general formatting rules"""
-    # Verify file is xlsx
-    if not file_path.lower().endswith('.xlsx'):
-        raise ValueError("Please select a valid .xlsx file")
-    
-    # Create output path
-    output_path = file_path.rsplit('.', 1)[0] + '_formatted.xlsx'
-    
-    # Copy the original file to the new location before processing
-    shutil.copy2(file_path, output_path)
+    # Verify file is xlsx or csv
+    check_input_file(file_path)
     
     # Convert column input to number if harm_id_col is provided
     harm_col_num = None
@@ -116,5 +59,5 @@ def format_general(file_path, header_row, harm_id_col=None):
     # Convert header_row to integer
     header_row = int(header_row)
     
-    # Process the file
-    return merge_cells(output_path, header_row, harm_col_num)
\ No newline at end of file
+    # Parse the file once and process it in memory
+    return merge_cells(TraceTable.load(file_path), header_row, harm_col_num)
\ No newline at end of file
@@ -1,8 +1,8 @@
-import openpyxl
-from openpyxl.styles import Alignment
-import shutil
 from openpyxl.utils import column_index_from_string, get_column_letter
 import os
+from .trace_table import TraceTable, check_input_file
+from .merge_engine import read_columns, hierarchical_runs, apply_merges, group_ends
+from .progress import report_progress, count_work
 
 def convert_column_input(column_input):
     """Convert column input (letter or number) to column number"""
@@ -19,152 +19,57 @@ def convert_column_input(column_input):
         except:
             raise ValueError(f"Invalid column input: {column_input}")
 
-def merge_cells(filepath, header_row, first_parent_col, second_parent_col, harm_col_num):
-    """Merge cells in the Excel file based on two parent columns."""
-    wb = openpyxl.load_workbook(filepath)
-    ws = wb.active
+def harm_skip_cols(harm_col_num):
+    """The harm column and the two columns after it are never merged"""
+    if harm_col_num is None:
+        return set()
+    return {harm_col_num, harm_col_num + 1, harm_col_num + 2}
+
+def merge_hierarchy(table, header_row, parent_cols, harm_col_num):
+    """
+    Merge cells in the trace table based on any number of nested parent columns,
+    given in hierarchy order (e.g. Need, Req, Spec, Verification).
+    """
+    first_row = header_row + 1
+    report_progress(0, stage="Finding merges")
+    columns = read_columns(table, first_row, table.max_row, max([table.max_column] + list(parent_cols)))
+    count_work(rows=max(0, table.max_row - header_row), cells=max(0, table.max_row - header_row) * len(columns))
     
-    max_row = ws.max_row
-    max_col = ws.max_column
+    merge_ranges = [(start + first_row, col, end + first_row, col)
+                    for start, end, col in hierarchical_runs(columns, parent_cols, harm_skip_cols(harm_col_num))]
     
-    # First, find merge ranges for the first parent column
-    first_parent_ranges = []
-    current_value = None
-    start_row = header_row + 1
+    # Apply all merges in one batch and keep each parent level's groups for the borders
+    apply_merges(table, merge_ranges)
+    table.add_group_ends(group_ends(merge_ranges, parent_cols))
     
-    for row in range(header_row + 1, max_row + 1):
-        cell_value = ws.cell(row=row, column=first_parent_col).value
-        
-        if cell_value != current_value:
-            if start_row and start_row < row - 1:
-                first_parent_ranges.append((start_row, row - 1))
-            current_value = cell_value
-            start_row = row
+    return table
+
+def merge_cells(table, header_row, first_parent_col, second_parent_col, harm_col_num):
+    """Merge cells in the trace table based on two parent columns."""
+    return merge_hierarchy(table, header_row, [first_parent_col, second_parent_col], harm_col_num)
+
+def format_hierarchy(file_path, header_row, parent_cols, harm_id_col=None):
+    """Format Excel file by any number of nested parent columns, outermost first"""
+    check_input_file(file_path)
     
-    # Add the last range if necessary
-    if start_row and start_row < max_row:
-        first_parent_ranges.append((start_row, max_row))
+    # Convert column inputs to numbers
+    parent_nums = [convert_column_input(col) for col in parent_cols]
+    harm_col_num = None if harm_id_col is None else convert_column_input(harm_id_col)
     
-    # Process each first parent range
-    for parent_start, parent_end in first_parent_ranges:
-        # Merge first parent column
-        if parent_start < parent_end:
-            ws.merge_cells(
-                start_row=parent_start,
-                start_column=first_parent_col,
-                end_row=parent_end,
-                end_column=first_parent_col
-            )
-            merged_cell = ws.cell(row=parent_start, column=first_parent_col)
-            merged_cell.alignment = Alignment(vertical='center')
-        
-        # Find and merge ranges for columns between first and second parent
-        for col in range(first_parent_col + 1, second_parent_col):
-            if harm_col_num is not None and (col == harm_col_num or col == harm_col_num + 1 or col == harm_col_num + 2):
-                continue
-                
-            current_value = None
-            sub_start = parent_start
-            
-            for row in range(parent_start, parent_end + 1):
-                cell_value = ws.cell(row=row, column=col).value
-                
-                if cell_value != current_value:
-                    if sub_start < row - 1:
-                        ws.merge_cells(
-                            start_row=sub_start,
-                            start_column=col,
-                            end_row=row - 1,
-                            end_column=col
-                        )
-                        merged_cell = ws.cell(row=sub_start, column=col)
-                        merged_cell.alignment = Alignment(vertical='center')
-                    current_value = cell_value
-                    sub_start = row
-            
-            if sub_start < parent_end:
-                ws.merge_cells(
-                    start_row=sub_start,
-                    start_column=col,
-                    end_row=parent_end,
-                    end_column=col
-                )
-                merged_cell = ws.cell(row=sub_start, column=col)
-                merged_cell.alignment = Alignment(vertical='center')
-        
-        # Process second parent ranges within first parent range
-        second_parent_ranges = []
-        current_value = None
-        sub_start = parent_start
-        
-        for row in range(parent_start, parent_end + 1):
-            cell_value = ws.cell(row=row, column=second_parent_col).value
-            
-            if cell_value != current_value:
-                if sub_start < row - 1:
-                    second_parent_ranges.append((sub_start, row - 1))
-                current_value = cell_value
-                sub_start = row
-        
-        if sub_start < parent_end:
-            second_parent_ranges.append((sub_start, parent_end))
-        
-        # Process each second parent range
-        for sub_start, sub_end in second_parent_ranges:
-            # Merge second parent column
-            if sub_start < sub_end:
-                ws.merge_cells(
-                    start_row=sub_start,
-                    start_column=second_parent_col,
-                    end_row=sub_end,
-                    end_column=second_parent_col
-                )
-                merged_cell = ws.cell(row=sub_start, column=second_parent_col)
-                merged_cell.alignment = Alignment(vertical='center')
-            
-            # Merge remaining columns within second parent bounds
-            for col in range(second_parent_col + 1, max_col + 1):
-                if harm_col_num is not None and (col == harm_col_num or col == harm_col_num + 1 or col == harm_col_num + 2):
-                    continue
-                    
-                current_value = None
-                merge_start = sub_start
-                
-                for row in range(sub_start, sub_end + 1):
-                    cell_value = ws.cell(row=row, column=col).value
-                    
-                    if cell_value != current_value:
-                        if merge_start < row - 1:
-                            ws.merge_cells(
-                                start_row=merge_start,
-                                start_column=col,
-                                end_row=row - 1,
-                                end_column=col
-                            )
-                            merged_cell = ws.cell(row=merge_start, column=col)
-                            merged_cell.alignment = Alignment(vertical='center')
-                        current_value = cell_value
-                        merge_start = row
-                
-                if merge_start < sub_end:
-                    ws.merge_cells(
-                        start_row=merge_start,
-                        start_column=col,
-                        end_row=sub_end,
-                        end_column=col
-                    )
-                    merged_cell = ws.cell(row=merge_start, column=col)
-                    merged_cell.alignment = Alignment(vertical='center')
+    # Validate column order
+    if not parent_nums:
+        raise ValueError("At least one parent column is required")
+    if any(child <= parent for parent, child in zip(parent_nums, parent_nums[1:])):
+        raise ValueError("Each parent column must be after the one before it")
+    
+    header_row = int(header_row)
     
-    return wb
+    # Parse the file once and process it in memory
+    return merge_hierarchy(TraceTable.load(file_path), header_row, parent_nums, harm_col_num)
 
 def format_urra(file_path, header_row, first_parent_col, second_parent_col, harm_id_col=None):
     """Format Excel file with URRA-specific formatting rules"""
-    if not file_path.lower().endswith('.xlsx'):
-        raise ValueError("Please select a valid .xlsx file")
-    
-    output_path = file_path.rsplit('.', 1)[0] + '_formatted.xlsx'
-    shutil.copy2(file_path, output_path)
+    check_input_file(file_path)
     
     # Convert column inputs to numbers
     first_parent_num = convert_column_input(first_parent_col)
@@ -177,4 +82,5 @@ def format_urra(file_path, header_row, first_parent_col, second_parent_col, harm
     
     header_row = int(header_row)
     
-    return merge_cells(output_path, header_row, first_parent_num, second_parent_num, harm_col_num)
\ No newline at end of file
+    # Parse the file once and process it in memory
+    return merge_cells(TraceTable.load(file_path), header_row, first_parent_num, second_parent_num, harm_col_num)
\ No newline at end of file
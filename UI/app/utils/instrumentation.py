@@ -0,0 +1,171 @@
+import json
+import os
+import time
+import tracemalloc
+
+# Per-stage run statistics. A stage starts whenever pipeline code reports a new
+# progress stage ("Loading workbook", "Merging cells", "Saving", ...), so every
+# stage that shows in the progress bar is also timed. Each finished run is appended
+# to a JSON-lines log, one line per run.
+
+RUN_LOG_ENV = "JAMAGUI_RUN_LOG"
+
+def default_log_path():
+    """The run log: $JAMAGUI_RUN_LOG, or ~/.jamagui/runs.jsonl"""
+    return os.environ.get(RUN_LOG_ENV) or os.path.join(os.path.expanduser("~"), ".jamagui", "runs.jsonl")
+
+class StageStats:
+    """Wall time, work done and traced memory peak of one stage"""
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.rows = 0
+        self.cells = 0
+        self.merges = 0
+        self.peak_bytes = None  # Only when memory is traced
+
+    def to_dict(self):
+        return {
+            'stage': self.name,
+            'seconds': round(self.seconds, 4),
+            'rows': self.rows,
+            'cells': self.cells,
+            'merges': self.merges,
+            'peak_bytes': self.peak_bytes,
+        }
+
+class RunStats:
+    """
+    Statistics of one pipeline run, stage by stage.
+    trace_memory records the tracemalloc peak of each stage; it makes allocation-heavy
+    stages several times slower, so it is off unless asked for.
+    """
+    def __init__(self, name="", trace_memory=False):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.stages = []  # In the order they first ran
+        self._by_name = {}
+        self.status = None
+        self.started = None  # Unix time the run started
+        self.seconds = None
+        self._current = None
+        self._stage_start = None
+        self._run_start = None
+        self._started_tracing = False
+
+    def start(self):
+        self.started = time.time()
+        self._run_start = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def begin(self, stage):
+        """
+        Close the current stage and start timing the next. A stage that runs again
+        (as the per-block stages of a streamed file do) adds to its earlier totals.
+        """
+        self._close_stage()
+        if stage not in self._by_name:
+            self._by_name[stage] = StageStats(stage)
+            self.stages.append(self._by_name[stage])
+        self._current = self._by_name[stage]
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._stage_start = time.perf_counter()
+
+    def count(self, rows=0, cells=0, merges=0):
+        """Add work done to the current stage"""
+        if self._current is None:
+            self.begin("Starting")
+        self._current.rows += rows
+        self._current.cells += cells
+        self._current.merges += merges
+
+    def _close_stage(self):
+        if self._current is None:
+            return
+        self._current.seconds += time.perf_counter() - self._stage_start
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            self._current.peak_bytes = max(peak, self._current.peak_bytes or 0)
+        self._current = None
+
+    def finish(self, status="ok"):
+        self._close_stage()
+        self.status = status
+        if self._run_start is not None:
+            self.seconds = time.perf_counter() - self._run_start
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @property
+    def peak_bytes(self):
+        peaks = [stage.peak_bytes for stage in self.stages if stage.peak_bytes is not None]
+        return max(peaks) if peaks else None
+
+    def totals(self):
+        """Rows, cells and merges summed over every stage"""
+        return (sum(stage.rows for stage in self.stages),
+                sum(stage.cells for stage in self.stages),
+                sum(stage.merges for stage in self.stages))
+
+    def to_dict(self):
+        return {
+            'run': self.name,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)) if self.started else None,
+            'status': self.status,
+            'seconds': None if self.seconds is None else round(self.seconds, 4),
+            'peak_bytes': self.peak_bytes,
+            'stages': [stage.to_dict() for stage in self.stages],
+        }
+
+    def write_log(self, path=None):
+        """Append this run as one JSON line to the run log"""
+        path = path or default_log_path()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(json.dumps(self.to_dict()) + "\n")
+        return path
+
+    def headline(self):
+        """One-line summary: total time and the slowest stage"""
+        if self.seconds is None:
+            return ""
+        text = f"{self.seconds:.1f} s"
+        if self.stages:
+            slowest = max(self.stages, key=lambda stage: stage.seconds)
+            text += f", slowest stage: {slowest.name} ({slowest.seconds:.1f} s)"
+        return text
+
+    def summary(self):
+        """Table of every stage, for the post-run summary"""
+        lines = [f"{'Stage':<20}{'Seconds':>9}{'Rows':>10}{'Cells':>12}{'Merges':>9}{'Peak MB':>9}"]
+        for stage in self.stages:
+            peak = "-" if stage.peak_bytes is None else f"{stage.peak_bytes / 2**20:.1f}"
+            lines.append(f"{stage.name:<20}{stage.seconds:>9.2f}{stage.rows:>10,}{stage.cells:>12,}"
+                         f"{stage.merges:>9,}{peak:>9}")
+        rows, cells, merges = self.totals()
+        peak = "-" if self.peak_bytes is None else f"{self.peak_bytes / 2**20:.1f}"
+        total = 0.0 if self.seconds is None else self.seconds
+        lines.append(f"{'Total':<20}{total:>9.2f}{rows:>10,}{cells:>12,}{merges:>9,}{peak:>9}")
+        return "\n".join(lines)
+
+def run_instrumented(name, work, args=(), kwargs=None, log_path=None, trace_memory=False):
+    """
+    Run work(*args, **kwargs) as a job outside the GUI, time its stages and append it to the run log.
+    Returns (result, stats); the run is logged even when work raises.
+    """
+    from .progress import Job, run_job
+    stats = RunStats(name, trace_memory)
+    try:
+        result = run_job(Job(stats), work, *args, **(kwargs or {}))
+    finally:
+        try:
+            stats.write_log(log_path)
+        except OSError:
+            pass
+    return result, stats
@@ -0,0 +1,152 @@
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox
+from .progress import Job, JobCancelled, run_job
+from .instrumentation import RunStats
+
+class JobRunner(ttk.Frame):
+    """
+    Progress bar, status line and Cancel button that run a screen's pipeline work on a
+    worker thread. The Tk main thread polls the job with after(), so the window stays
+    responsive, and the result or error is handed back on the main thread.
+    Every run is timed stage by stage, appended to the run log, and summarised
+    by the Run Summary button.
+    """
+    POLL_INTERVAL = 100  # ms
+
+    def __init__(self, parent, buttons=()):
+        super().__init__(parent)
+        self.buttons = list(buttons)  # Disabled while a job runs
+        self.job = None
+        self._result = None
+        self._error = None
+        self._thread = None
+        self.stats = None  # RunStats of the last run
+        self.log_path = None
+        self.trace_memory_var = tk.BooleanVar(value=False)
+
+        self.grid_columnconfigure(0, weight=1)
+        self.progress_bar = ttk.Progressbar(self, mode='determinate', maximum=100)
+        self.progress_bar.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self.cancel, state="disabled")
+        self.cancel_button.grid(row=0, column=1, padx=5, pady=5)
+        self.summary_button = ttk.Button(self, text="Run Summary", command=self.show_summary, state="disabled")
+        self.summary_button.grid(row=0, column=2, padx=5, pady=5)
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.grid(row=1, column=0, padx=5, sticky="w")
+        # Tracing memory makes runs several times slower, so it is opt-in
+        ttk.Checkbutton(self, text="Record memory use", variable=self.trace_memory_var).grid(
+            row=1, column=1, columnspan=2, padx=5, sticky="e")
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, work, on_success, *args, **kwargs):
+        """
+        Run work(*args, **kwargs) on a worker thread, then call on_success(result) on the Tk thread.
+        Errors are shown the same way the screens show them.
+        """
+        if self.running:
+            messagebox.showerror("Error", "A job is already running")
+            return
+
+        # Name the run after the screen whose work it is (e.g. PremitRiskScreen.generate.<locals>.work)
+        name = getattr(work, '__qualname__', '').split('.')[0]
+        self.stats = RunStats(name, trace_memory=self.trace_memory_var.get())
+        self.log_path = None
+        self.job = Job(self.stats)
+        self._result = None
+        self._error = None
+        self._on_success = on_success
+
+        for button in self.buttons:
+            button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.summary_button.config(state="disabled")
+        self.status_label.config(text="Starting...")
+
+        self._thread = threading.Thread(target=self._run, args=(self.job, work, args, kwargs), daemon=True)
+        self._thread.start()
+        self.after(self.POLL_INTERVAL, self._poll)
+
+    def cancel(self):
+        """Ask the running job to stop at its next progress report"""
+        if self.job is not None:
+            self.job.cancel()
+            self.status_label.config(text="Cancelling...")
+
+    def _run(self, job, work, args, kwargs):
+        # Worker thread: never touch Tk widgets here
+        try:
+            self._result = run_job(job, work, *args, **kwargs)
+        except BaseException as e:
+            self._error = e
+        try:
+            self.log_path = job.stats.write_log()
+        except OSError:
+            pass  # The log is a diagnostic; never fail a run over it
+
+    def _poll(self):
+        job = self.job
+        if self.running:
+            self._show_progress(job)
+            self.after(self.POLL_INTERVAL, self._poll)
+            return
+        self._finish()
+
+    def _show_progress(self, job):
+        if job.total:
+            if str(self.progress_bar.cget('mode')) != 'determinate':
+                self.progress_bar.stop()
+                self.progress_bar.config(mode='determinate')
+            self.progress_bar.config(value=min(100, 100 * job.done / job.total))
+            status = f"{job.stage} {job.done:,} of {job.total:,}"
+        else:
+            # Stage of unknown size (e.g. openpyxl parsing the file)
+            if str(self.progress_bar.cget('mode')) != 'indeterminate':
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_bar.start(10)
+            status = job.stage
+        if not job.cancelled:
+            self.status_label.config(text=status)
+
+    def _finish(self):
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate', value=0)
+        self.cancel_button.config(state="disabled")
+        self.summary_button.config(state="normal")
+        for button in self.buttons:
+            button.config(state="normal")
+
+        error = self._error
+        self._thread = None
+        if error is None:
+            self.status_label.config(text=f"Done in {self.stats.headline()}")
+            self._on_success(self._result)
+        elif isinstance(error, JobCancelled):
+            self.status_label.config(text="Cancelled")
+            messagebox.showinfo("Cancelled", "The job was cancelled, no file was written")
+        elif isinstance(error, ValueError):
+            self.status_label.config(text="")
+            messagebox.showerror("Input Error", str(error))
+        else:
+            self.status_label.config(text="")
+            messagebox.showerror("Error", f"An error occurred: {str(error)}")
+
+    def show_summary(self):
+        """Window with the per-stage table of the last run"""
+        if self.stats is None:
+            return
+        window = tk.Toplevel(self)
+        window.title("Run Summary")
+        text = self.stats.summary()
+        if self.log_path:
+            text += f"\n\nLogged to {self.log_path}"
+        lines = text.splitlines()
+        summary = tk.Text(window, font=("Courier", 10), width=max(len(line) for line in lines) + 2,
+                          height=len(lines) + 1)
+        summary.insert("1.0", text)
+        summary.config(state="disabled")
+        summary.pack(padx=10, pady=10, fill="both", expand=True)
+        ttk.Button(window, text="Close", command=window.destroy).pack(pady=(0, 10))
@@ -0,0 +1,70 @@
+from .progress import report_progress
+from .style_registry import center_alignment
+
+def read_columns(table, first_row, last_row, max_col):
+    """Read rows first_row..last_row of the table into a list of columns (index 0 is column A)"""
+    return [table.column_values(col, first_row, last_row) for col in range(1, max_col + 1)]
+
+def run_starts(values, bounds=()):
+    """
+    Return the sorted offsets where a new run of equal values begins.
+    Any offsets in bounds (e.g. the run starts of a parent column) also start a new run.
+    """
+    # Compare every value with its predecessor in a single pass over the column
+    starts = {i for i, (prev, cur) in enumerate(zip(values, values[1:]), 1) if cur != prev}
+    starts.update(bounds)
+    if values:
+        starts.add(0)
+    return sorted(starts)
+
+def find_runs(values, bounds=()):
+    """Return (start, end) offsets for every run of two or more equal values, split at bounds"""
+    starts = run_starts(values, bounds)
+    ends = starts[1:] + [len(values)]
+    return [(start, end - 1) for start, end in zip(starts, ends) if end - 1 > start]
+
+def hierarchical_runs(columns, parent_cols, skip_cols=()):
+    """
+    Return (start, end, col) for every merge of a nested trace view in one traversal.
+    parent_cols is the ordered hierarchy (e.g. Need, Req, Spec, Verification columns). The runs
+    of each parent column are bounded by the runs of the parent before it, and every column after
+    a parent, up to the next parent, is merged within that parent's runs. Columns before the
+    first parent and columns in skip_cols are left alone.
+    """
+    parent_cols = sorted(parent_cols)
+    merges = []
+    bounds = []
+    for level, parent_col in enumerate(parent_cols):
+        next_parent = parent_cols[level + 1] if level + 1 < len(parent_cols) else len(columns) + 1
+        parent_values = columns[parent_col - 1]
+        merges.extend((start, end, parent_col) for start, end in find_runs(parent_values, bounds))
+
+        # The boundaries of this level bound every column below it
+        bounds = run_starts(parent_values, bounds)
+        for col in range(parent_col + 1, next_parent):
+            if col in skip_cols:
+                continue
+            merges.extend((start, end, col) for start, end in find_runs(columns[col - 1], bounds))
+    return merges
+
+def group_ends(merge_ranges, parent_cols):
+    """
+    Return (end row, level, column) for every merge in a parent column, the level being the
+    parent's place in the hierarchy (0 for the outermost). The border stage draws on these.
+    """
+    levels = {col: level for level, col in enumerate(sorted(parent_cols))}
+    return [(end_row, levels[start_col], start_col)
+            for _, start_col, end_row, _ in merge_ranges if start_col in levels]
+
+def apply_merges(table, merge_ranges):
+    """Merge every (start_row, start_col, end_row, end_col) range of the table and center its top cell"""
+    alignment = center_alignment()
+    for merged, (start_row, start_col, end_row, end_col) in enumerate(merge_ranges, start=1):
+        report_progress(merged, len(merge_ranges), "Merging cells")
+        table.merge_cells(
+            start_row=start_row,
+            start_column=start_col,
+            end_row=end_row,
+            end_column=end_col
+        )
+        table.set_style(start_row, start_col, alignment=alignment)
@@ -0,0 +1,72 @@
+from bisect import bisect_left
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.merge import MergedCellRange
+from .progress import report_progress, count_work
+
+# Merges are collected as plain rectangles while a sheet is formatted and only written
+# to the worksheet's <mergeCells> list when it is saved. openpyxl's ws.merge_cells
+# instead creates a MergedCell object for every covered cell and checks each new range
+# against every existing one, so its cost grows with the merged cells and quadratically
+# with the merges; here it grows with the number of merges.
+
+def as_bounds(merge_range):
+    """(min_row, min_col, max_row, max_col) of a CellRange or a (start_row, start_col, end_row, end_col) tuple"""
+    if isinstance(merge_range, CellRange):
+        return merge_range.min_row, merge_range.min_col, merge_range.max_row, merge_range.max_col
+    return tuple(merge_range)
+
+def plan_merges(merge_ranges):
+    """
+    Check a batch of merges for overlaps in one pass and return (kept, dropped) bounds.
+    Excel rejects overlapping merges, so a range overlapping an earlier one is dropped;
+    for a range inside an earlier one this is what ws.merge_cells did as well.
+    Each column keeps its accepted row intervals sorted, so a check is a binary search.
+    """
+    starts = {}  # column -> sorted min_row of the accepted ranges covering it
+    ends = {}  # column -> max_row of those ranges, in the same order
+    kept = []
+    dropped = []
+    for merge_range in merge_ranges:
+        min_row, min_col, max_row, max_col = as_bounds(merge_range)
+        overlaps = False
+        for col in range(min_col, max_col + 1):
+            col_starts = starts.get(col)
+            if not col_starts:
+                continue
+            pos = bisect_left(col_starts, min_row)
+            # The interval starting at or after min_row, or the one before it reaching min_row
+            if (pos < len(col_starts) and col_starts[pos] <= max_row) or (pos > 0 and ends[col][pos - 1] >= min_row):
+                overlaps = True
+                break
+        if overlaps:
+            dropped.append((min_row, min_col, max_row, max_col))
+            continue
+        for col in range(min_col, max_col + 1):
+            col_starts = starts.setdefault(col, [])
+            pos = bisect_left(col_starts, min_row)
+            col_starts.insert(pos, min_row)
+            ends.setdefault(col, []).insert(pos, max_row)
+        kept.append((min_row, min_col, max_row, max_col))
+    return kept, dropped
+
+def write_merges(ws, merge_ranges, clear_covered=False):
+    """
+    Register merges on an openpyxl worksheet without materialising MergedCell objects.
+    The ranges are written to <mergeCells> when the workbook is saved. Covered cells should
+    hold no values; clear_covered=True removes any covered cells already in the sheet, as
+    ws.merge_cells would (this touches every covered cell, so use it only when needed).
+    Returns the ranges dropped for overlapping an earlier one.
+    """
+    report_progress(0, stage="Writing merges")
+    kept, dropped = plan_merges(merge_ranges)
+    ranges = ws.merged_cells.ranges
+    for min_row, min_col, max_row, max_col in kept:
+        coord = CellRange(min_row=min_row, min_col=min_col, max_row=max_row, max_col=max_col).coord
+        ranges.add(MergedCellRange(ws, coord))
+        if clear_covered:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    if (row, col) != (min_row, min_col):
+                        ws._cells.pop((row, col), None)
+    count_work(merges=len(kept))
+    return dropped
@@ -0,0 +1,60 @@
+from bisect import bisect_right
+import weakref
+
+class MergedRangeIndex:
+    """
+    Interval index over the merged ranges of a worksheet (or TraceTable).
+    Ranges are bucketed per column and sorted by start row, so a point lookup is a
+    binary search instead of a scan over every merged range in the sheet.
+    The index reflects the merges present when it was built.
+    """
+    def __init__(self, ranges, get_cell_value):
+        self.get_cell_value = get_cell_value  # (row, col) -> value of the cell
+        self._ranges = {}  # column -> merged ranges covering it, sorted by min_row
+        self._starts = {}  # column -> min_row of each range in self._ranges
+
+        for merged_range in ranges:
+            for col in range(merged_range.min_col, merged_range.max_col + 1):
+                self._ranges.setdefault(col, []).append(merged_range)
+
+        # Merged ranges never overlap, so the intervals in one column are disjoint
+        for col, ranges in self._ranges.items():
+            ranges.sort(key=lambda merged_range: merged_range.min_row)
+            self._starts[col] = [merged_range.min_row for merged_range in ranges]
+
+    @classmethod
+    def from_worksheet(cls, worksheet):
+        """Build the index over an openpyxl worksheet's merged ranges"""
+        return cls(worksheet.merged_cells.ranges, lambda row, col: worksheet.cell(row, col).value)
+
+    def get_range(self, row, col):
+        """Return the merged range containing the cell, or None if the cell is not merged"""
+        starts = self._starts.get(col)
+        if not starts:
+            return None
+        pos = bisect_right(starts, row) - 1
+        if pos >= 0:
+            merged_range = self._ranges[col][pos]
+            if row <= merged_range.max_row:
+                return merged_range
+        return None
+
+    def get_value(self, row, col):
+        """Return the value of the cell, taking into account if it's part of a merged range"""
+        merged_range = self.get_range(row, col)
+        if merged_range is not None:
+            return self.get_cell_value(merged_range.min_row, merged_range.min_col)
+        return self.get_cell_value(row, col)
+
+_index_cache = weakref.WeakKeyDictionary()
+
+def merged_index(worksheet, rebuild=False):
+    """
+    Return the MergedRangeIndex for a worksheet, building it once per sheet.
+    Pass rebuild=True after the sheet's merges have changed.
+    """
+    index = None if rebuild else _index_cache.get(worksheet)
+    if index is None:
+        index = MergedRangeIndex.from_worksheet(worksheet)
+        _index_cache[worksheet] = index
+    return index
@@ -0,0 +1,144 @@
+import re
+import unicodedata
+from zlib import crc32
+from .progress import report_progress, count_work
+
+# Near-duplicate grouping for Duplicate Search. Texts are normalized and cut into character
+# shingles; a MinHash signature of each shingle set is split into bands, and texts sharing
+# any band land in the same bucket. Only texts sharing a bucket are compared (by the Jaccard
+# similarity of their shingles), so the work grows with the number of texts rather than with
+# every pair of them. Matches are joined into clusters with a disjoint set.
+
+SHINGLE_SIZE = 4
+BANDS = 8
+ROWS_PER_BAND = 4
+SIGNATURE_SIZE = BANDS * ROWS_PER_BAND
+# Texts in a bucket with more members than this are only compared with the bucket's first
+# text, not with each other (64 members would otherwise be 2016 comparisons), so a very common
+# band does not make the comparisons quadratic. Two such texts are still grouped if they share
+# another, smaller bucket, or through a text each of them matches.
+MAX_BUCKET_MEMBERS = 64
+
+DEFAULT_SIMILARITY = 0.8
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Case, accents, punctuation and runs of whitespace are ignored when texts are compared"""
+    text = str(text).casefold()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = PUNCTUATION.sub(' ', text)
+    return WHITESPACE.sub(' ', text).strip()
+
+def shingle_set(normalized):
+    """Hashes of the text's overlapping character shingles (the whole text if it is shorter)"""
+    data = normalized.encode()
+    if len(data) <= SHINGLE_SIZE:
+        return {crc32(data)}
+    return {crc32(data[i:i + SHINGLE_SIZE]) for i in range(len(data) - SHINGLE_SIZE + 1)}
+
+def signature(shingles):
+    """
+    One-permutation MinHash: every shingle hash falls in one of SIGNATURE_SIZE bins and each
+    bin keeps its smallest hash, so a signature costs one pass over the shingles. Empty bins
+    borrow the value of the next filled bin.
+    """
+    bins = [None] * SIGNATURE_SIZE
+    for shingle in shingles:
+        slot = shingle % SIGNATURE_SIZE
+        value = shingle // SIGNATURE_SIZE
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+    if None in bins:
+        # Walk right to left remembering the last filled bin; bins after the last filled one
+        # wrap around to the first. The offset keeps borrowed values apart from real ones.
+        donor = next(slot for slot, value in enumerate(bins) if value is not None) + SIGNATURE_SIZE
+        for slot in range(SIGNATURE_SIZE - 1, -1, -1):
+            if bins[slot] is None:
+                bins[slot] = (bins[donor % SIGNATURE_SIZE], donor - slot)
+            else:
+                donor = slot
+    return bins
+
+def jaccard(first, second):
+    if first is second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+class DisjointSet:
+    """Union-find over 0..size-1 with path halving and union by size"""
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, item):
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return False
+        if self.size[first] < self.size[second]:
+            first, second = second, first
+        self.parent[second] = first
+        self.size[first] += self.size[second]
+        return True
+
+def find_clusters(texts, similarity=DEFAULT_SIMILARITY):
+    """
+    Group texts that are equal once normalized, or whose shingles are at least `similarity`
+    alike (Jaccard). Returns one (cluster number, similarity to the cluster's first text) per
+    text; clusters are numbered from 1 in order of first appearance.
+    """
+    # Identical normalized texts are handled once
+    distinct = {}
+    text_keys = []
+    for text in texts:
+        text_keys.append(distinct.setdefault(normalize_text(text), len(distinct)))
+    normalized = list(distinct)
+    shingles = [shingle_set(text) for text in normalized]
+
+    # Texts sharing a band of their signatures are candidates
+    groups = DisjointSet(len(normalized))
+    buckets = {}
+    for key, text_shingles in enumerate(shingles):
+        report_progress(key + 1, len(shingles), "Hashing texts")
+        bins = signature(text_shingles)
+        for band in range(BANDS):
+            start = band * ROWS_PER_BAND
+            buckets.setdefault((band, *bins[start:start + ROWS_PER_BAND]), []).append(key)
+
+    report_progress(0, stage="Comparing candidates")
+    compared = 0
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        if len(members) > MAX_BUCKET_MEMBERS:
+            pairs = ((members[0], other) for other in members[1:])
+        else:
+            pairs = ((first, second) for i, first in enumerate(members) for second in members[i + 1:])
+        for first, second in pairs:
+            if groups.find(first) != groups.find(second):
+                compared += 1
+                if jaccard(shingles[first], shingles[second]) >= similarity:
+                    groups.union(first, second)
+    count_work(rows=len(normalized), cells=compared)
+
+    # Number clusters by first appearance and score every text against the cluster's first text
+    numbers = {}
+    first_keys = {}
+    results = []
+    for key in text_keys:
+        root = groups.find(key)
+        if root not in numbers:
+            numbers[root] = len(numbers) + 1
+            first_keys[root] = key
+        results.append((numbers[root], jaccard(shingles[first_keys[root]], shingles[key])))
+    return results
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from .progress import report_progress
+
+# On-disk cache of parsed inputs, keyed by a hash of the file's content, so re-running a
+# screen on the same export (with another header row, risk matrix or border option)
+# skips parsing entirely. Entries are evicted least recently used first once the cache
+# grows past its size limit.
+
+CACHE_DIR_ENV = "JAMAGUI_CACHE_DIR"
+CACHE_SIZE_ENV = "JAMAGUI_CACHE_MB"  # 0 turns the cache off
+DEFAULT_CACHE_MB = 256
+
+# Bump when the cached object layout changes so old entries are not loaded
+CACHE_VERSION = b"trace-table-5"
+
+def cache_dir():
+    """$JAMAGUI_CACHE_DIR, or ~/.jamagui/parse_cache"""
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".jamagui", "parse_cache")
+
+def cache_limit():
+    """Cache size limit in bytes"""
+    try:
+        return int(float(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_CACHE_MB * 1024 * 1024
+
+def content_key(file_path):
+    """SHA-256 of the file's bytes (and the cache version), read in 1 MB chunks"""
+    digest = hashlib.sha256(CACHE_VERSION)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _entry_path(key):
+    return os.path.join(cache_dir(), f"{key}.pickle")
+
+def get(key):
+    """Return the cached object for key, or None. A hit marks the entry as recently used."""
+    path = _entry_path(key)
+    try:
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated or stale entry: drop it and parse again
+        remove(path)
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return value
+
+def put(key, value):
+    """Store value under key, then evict old entries beyond the size limit"""
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so a reader never sees a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, _entry_path(key))
+    except BaseException:
+        remove(tmp_path)
+        raise
+    evict(cache_limit())
+
+def remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def evict(limit):
+    """Delete the least recently used entries until the cache is at most limit bytes"""
+    directory = cache_dir()
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(".pickle"):
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        remove(path)
+        total -= size
+
+def clear():
+    """Delete every cached entry"""
+    directory = cache_dir()
+    if os.path.isdir(directory):
+        evict(0)
+
+def cached_parse(file_path, parse):
+    """
+    Return parse(file_path), loading it from the cache when a file with the same content
+    has been parsed before. The cached copy is a fresh object each time, so callers may
+    modify it. A cache that cannot be read or written never fails the parse.
+    """
+    if cache_limit() <= 0:
+        return parse(file_path)
+
+    report_progress(0, stage="Checking parse cache")
+    try:
+        key = content_key(file_path)
+        value = get(key)
+    except OSError:
+        return parse(file_path)
+    if value is not None:
+        return value
+
+    value = parse(file_path)
+    report_progress(0, stage="Caching parsed file")
+    try:
+        put(key, value)
+    except (OSError, pickle.PicklingError):
+        pass
+    return value
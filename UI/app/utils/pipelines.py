@@ -0,0 +1,103 @@
+from .general_format import format_general
+from .general_format_URRA import format_hierarchy
+from .risk_score import calculate_risk_scores
+from .border_format import add_merged_borders
+from .streaming import use_streaming, stream_format_general, stream_format_hierarchy
+from .risk_control import merge_risk_control
+from .usertask_format import usertask_format
+from .duplicate_item import highlight_duplicates_in_column, find_duplicates_across
+from .near_duplicates import DEFAULT_SIMILARITY
+
+# End-to-end jobs shared by the screens and the batch CLI: each reads its input
+# once and writes its output once, and returns the path it wrote.
+
+def format_trace_file(file_path, output_path, header_row, harm_id_col=None, parent_cols=None,
+                      score_columns=(), severity_col=None, risk_matrix_values=None, borders=False,
+                      conditional_formatting=False, level_borders=False):
+    """
+    Format a trace view export.
+    parent_cols selects hierarchical (URRA) merging, otherwise cells merge on column B.
+    score_columns lists the (occurrence column, risk analysis column) pairs scored against severity_col;
+    conditional_formatting colours their levels with one conditional format per column instead of cell fills.
+    borders adds thick borders after the merged groups covering column B; with level_borders they
+    follow the hierarchy instead: thick after each top-level group, thin after the groups of every
+    lower parent.
+    Exports over the streaming threshold are formatted block by block.
+    """
+    if use_streaming(file_path):
+        # Very large export: format block by block with flat memory use
+        if parent_cols:
+            stream_format_hierarchy(file_path, output_path, header_row, parent_cols, harm_id_col,
+                                    score_columns, severity_col, risk_matrix_values, borders,
+                                    conditional_formatting, level_borders)
+        else:
+            stream_format_general(file_path, output_path, header_row, harm_id_col,
+                                  score_columns, severity_col, risk_matrix_values, borders,
+                                  conditional_formatting)
+        return output_path
+
+    if parent_cols:
+        table = format_hierarchy(file_path, header_row, parent_cols, harm_id_col)
+    else:
+        table = format_general(file_path, header_row, harm_id_col)
+
+    # Score every (occurrence, risk analysis) pair in one pass
+    if score_columns:
+        table = calculate_risk_scores(table, score_columns, severity_col, header_row, risk_matrix_values,
+                                      conditional_formatting)
+
+    # Add thick borders if selected (and thin ones between sub-level groups)
+    if borders:
+        table = add_merged_borders(table, levels=level_borders)
+
+    # Write the formatted table once
+    table.save(output_path)
+    return output_path
+
+def merge_control_file(risk_file, control_file, output_path, risk_header_row, control_header_row,
+                       risk_id_col, control_id_col, paste_col, control_content_col):
+    """Paste the risk controls of control_file into risk_file"""
+    table = merge_risk_control(
+        risk_file, control_file,
+        risk_header_row, control_header_row,
+        risk_id_col, control_id_col,
+        paste_col, control_content_col
+    )
+    table.save(output_path)
+    return output_path
+
+def format_usertask_file(file_path, output_path, header_row, item_type_col, us_name_col, ut_name_col,
+                         borders=False, level_borders=False):
+    """
+    Format a Marathon UT export. borders adds thick borders after the merged groups covering
+    column B; with level_borders they follow the hierarchy instead: thick after each folder,
+    thin after each user story and user task.
+    """
+    table = usertask_format(file_path, header_row, item_type_col, us_name_col, ut_name_col)
+    if borders:
+        table = add_merged_borders(table, levels=level_borders)
+    table.save(output_path)
+    return output_path
+
+def find_duplicates_file(file_path, column_letter, near_duplicates=False, similarity=DEFAULT_SIMILARITY,
+                         output_path=None, analysis_only=False, index_path=None):
+    """
+    Add the Duplicate_Analysis sheet for one column. It is written into an input workbook;
+    a CSV export is saved as an .xlsx of the same name. near_duplicates also groups texts
+    that are at least `similarity` alike. analysis_only writes just the analysis to
+    output_path and leaves the input untouched. index_path checks the column against the
+    duplicate index of earlier exports and adds it there.
+    """
+    return highlight_duplicates_in_column(file_path, column_letter, output_path, near_duplicates=near_duplicates,
+                                          similarity=similarity, analysis_only=analysis_only,
+                                          index_path=index_path)
+
+def find_duplicates_across_files(targets, output_path, near_duplicates=False, similarity=DEFAULT_SIMILARITY,
+                                 index_path=None):
+    """
+    Search every (file, column letter) target for duplicates at once, reading each file once.
+    The analysis and the cross-column and cross-file collisions are written to output_path.
+    index_path checks the targets against the duplicate index of earlier exports and adds them there.
+    """
+    return find_duplicates_across(targets, output_path, near_duplicates=near_duplicates, similarity=similarity,
+                                  index_path=index_path)
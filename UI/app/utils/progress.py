@@ -0,0 +1,78 @@
+import threading
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+class Job:
+    """
+    Progress and cancellation state of one piece of pipeline work.
+    The worker thread writes the progress; the GUI reads it and may request cancellation.
+    stats (a RunStats) is timed stage by stage as the progress stages change.
+    """
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.stage = ""
+        self.done = 0
+        self.total = 0  # 0 while the size of the current stage is unknown
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Ask the job to stop at its next progress report"""
+        self._cancel.set()
+
+    def report(self, done, total=None, stage=None):
+        """Record progress and raise JobCancelled if the job has been cancelled"""
+        if stage is not None and stage != self.stage:
+            self.stage = stage
+            self.total = 0
+            if self.stats is not None:
+                self.stats.begin(stage)
+        if total is not None:
+            self.total = total
+        self.done = done
+        if self._cancel.is_set():
+            raise JobCancelled("Cancelled")
+
+_local = threading.local()
+
+def current_job():
+    """Return the Job running on this thread, or None"""
+    return getattr(_local, 'job', None)
+
+def run_job(job, work, *args, **kwargs):
+    """Call work(*args, **kwargs) with job as the current job of this thread"""
+    stats = job.stats
+    if stats is not None:
+        stats.start()
+    status = "error"
+    _local.job = job
+    try:
+        result = work(*args, **kwargs)
+        status = "ok"
+        return result
+    except JobCancelled:
+        status = "cancelled"
+        raise
+    finally:
+        _local.job = None
+        if stats is not None:
+            stats.finish(status)
+
+def report_progress(done, total=None, stage=None):
+    """
+    Report row-level progress from pipeline code. Does nothing outside a job;
+    inside one it raises JobCancelled once the job has been cancelled.
+    """
+    job = getattr(_local, 'job', None)
+    if job is not None:
+        job.report(done, total, stage)
+
+def count_work(rows=0, cells=0, merges=0):
+    """Add rows and cells touched and merges created to the current stage of the job's stats"""
+    job = getattr(_local, 'job', None)
+    if job is not None and job.stats is not None:
+        job.stats.count(rows, cells, merges)
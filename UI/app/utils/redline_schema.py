@@ -0,0 +1,208 @@
+import json
+from openpyxl.styles import Font
+from openpyxl.utils import column_index_from_string
+from .merged_index import merged_index
+from .progress import report_progress, count_work
+
+# Redline engine for nested trace layouts described by a hierarchy schema instead of fixed
+# column letters. A schema lists the nesting levels, outermost first; each level is a dict of
+#   key:           column the level's groups are read from (a merged range is one group) and
+#                  matched on in the original
+#   columns:       columns that depend on the key; within each group the IDs of the new and the
+#                  original are compared (green: added, red strikethrough: removed). A level that
+#                  does not list its key here writes the key unchanged, merged over the group.
+#   keyed_columns: columns under the level matched on their own value, each in its own merges
+# Each level's groups lie within a group of the level before it, and a group is only matched
+# if its parent group was. Every key column of the original is indexed (value -> first row) in
+# one scan, so each match is a dictionary lookup.
+
+DFMEA_SCHEMA = [
+    {'key': 'A', 'columns': ['B', 'C', 'D', 'E', 'F', 'M', 'N']},
+    {'key': 'G', 'columns': ['G', 'H'], 'keyed_columns': ['I', 'J', 'K', 'L']},
+]
+
+ADDED_COLOR = "00FF00"
+REMOVED_COLOR = "FF0000"
+
+def column_number(column):
+    """Column letter (or number) as a 1-based column number"""
+    if isinstance(column, int):
+        return column
+    return column_index_from_string(str(column).strip().upper())
+
+def normalize_schema(schema):
+    """Return the schema as (key, columns, keyed columns) column numbers per level, checking it"""
+    if not schema:
+        raise ValueError("The schema needs at least one level")
+    levels = []
+    for depth, level in enumerate(schema, start=1):
+        if 'key' not in level:
+            raise ValueError(f"Level {depth} of the schema has no key column")
+        unknown = set(level) - {'key', 'columns', 'keyed_columns'}
+        if unknown:
+            raise ValueError(f"Level {depth} of the schema has unknown entries: {', '.join(sorted(unknown))}")
+        try:
+            levels.append((column_number(level['key']),
+                           [column_number(col) for col in level.get('columns', ())],
+                           [column_number(col) for col in level.get('keyed_columns', ())]))
+        except ValueError:
+            raise ValueError(f"Level {depth} of the schema has an invalid column letter")
+    return levels
+
+def load_schema(path):
+    """Read a schema from a JSON file: a list of levels, or an object with a "levels" list"""
+    with open(path) as f:
+        schema = json.load(f)
+    if isinstance(schema, dict):
+        schema = schema.get('levels')
+    normalize_schema(schema)
+    return schema
+
+def build_sheet_maps(worksheet, columns):
+    """
+    Scan the worksheet once and build, for each column, the merge-aware value and merged range
+    of every row (1-based lists) and a value -> first row index.
+    """
+    index = merged_index(worksheet)
+    max_row = worksheet.max_row
+    max_col = max(columns)
+    raw = [list(row) + [None] * (max_col - len(row))
+           for row in worksheet.iter_rows(min_row=1, max_row=max_row, max_col=max_col, values_only=True)]
+
+    maps = {}
+    for col in columns:
+        values = [None] * (max_row + 1)
+        ranges = [None] * (max_row + 1)
+        first_rows = {}
+        for row in range(1, max_row + 1):
+            merged_range = index.get_range(row, col)
+            if merged_range is not None:
+                value = raw[merged_range.min_row - 1][merged_range.min_col - 1]
+            else:
+                value = raw[row - 1][col - 1]
+            values[row] = value
+            ranges[row] = merged_range
+            first_rows.setdefault(value, row)
+        maps[col] = {'values': values, 'ranges': ranges, 'first_rows': first_rows}
+    count_work(rows=max_row, cells=max_row * len(columns))
+    return maps
+
+class SheetMaps:
+    """Column maps of one worksheet with the lookups the redline needs"""
+    def __init__(self, worksheet, columns):
+        self.max_row = worksheet.max_row
+        self.maps = build_sheet_maps(worksheet, columns)
+        self.id_cache = {}
+
+    def value(self, row, col):
+        return self.maps[col]['values'][row] if row <= self.max_row else None
+
+    def span(self, row, col):
+        """Rows in the merged range at (row, col), 1 if the cell is not merged"""
+        merged_range = self.maps[col]['ranges'][row] if row <= self.max_row else None
+        return merged_range.max_row - merged_range.min_row + 1 if merged_range else 1
+
+    def first_row(self, value, col):
+        return self.maps[col]['first_rows'].get(value)
+
+    def ids(self, start_row, end_row, col):
+        """The non-empty values of col in start_row..end_row, a merged range counting once"""
+        key = (start_row, end_row, col)
+        if key not in self.id_cache:
+            ids = []
+            row = start_row
+            while row <= end_row:
+                value = self.value(row, col)
+                if value is not None:
+                    ids.append(value)
+                merged_range = self.maps[col]['ranges'][row] if row <= self.max_row else None
+                row = merged_range.max_row + 1 if merged_range else row + 1
+            self.id_cache[key] = ids
+        return self.id_cache[key]
+
+def redline_order(new_ids, original_ids):
+    """The IDs of a compared group in output order: the new IDs as they appear, then the removed originals"""
+    return list(dict.fromkeys(new_ids + original_ids))
+
+def write_to_cell(worksheet, row, col, value, font=None):
+    cell = worksheet.cell(row, col)
+    cell.value = value
+    if font:
+        cell.font = font
+
+def redline_by_schema(ws_original, ws_new, ws_output, schema):
+    """
+    Redline one sheet laid out as the schema declares. Both sheets are scanned once; groups are
+    matched by their key through the original's index. Returns the output merge ranges.
+    """
+    levels = normalize_schema(schema)
+    used_columns = sorted({col for key, columns, keyed in levels for col in [key, *columns, *keyed]})
+    report_progress(0, stage="Indexing sheets")
+    new = SheetMaps(ws_new, used_columns)
+    original = SheetMaps(ws_original, used_columns)
+    merge_ranges = []
+
+    def redline_columns(new_row, span, original_row, original_span, output_row, columns):
+        """Compare (or, with no original group, add) the IDs of each column within one group"""
+        for col in columns:
+            new_ids = new.ids(new_row, new_row + span - 1, col)
+            if original_row is not None:
+                original_ids = original.ids(original_row, original_row + original_span - 1, col)
+                new_id_set = set(new_ids)
+                original_id_set = set(original_ids)
+                for i, id_value in enumerate(redline_order(new_ids, original_ids)):
+                    if id_value in new_id_set:
+                        if id_value not in original_id_set:
+                            write_to_cell(ws_output, output_row + i, col, id_value, Font(color=ADDED_COLOR))
+                        else:
+                            write_to_cell(ws_output, output_row + i, col, id_value)
+                    else:
+                        write_to_cell(ws_output, output_row + i, col, id_value, Font(color=REMOVED_COLOR, strike=True))
+            else:
+                for i, id_value in enumerate(new_ids):
+                    write_to_cell(ws_output, output_row + i, col, id_value, Font(color=ADDED_COLOR))
+            merge_ranges.append((output_row, col, output_row + span - 1, col))
+
+    def match(row, col, matched):
+        """Row and span of the key's group in the original, or (None, 0); always unmatched under an unmatched parent"""
+        original_row = original.first_row(new.value(row, col), col) if matched else None
+        return (original_row, original.span(original_row, col)) if original_row is not None else (None, 0)
+
+    def redline_keyed(start_row, end_row, output_row, col, matched):
+        """Groups of a keyed column within one parent group, each matched on its own value"""
+        row = start_row
+        while row < end_row:
+            span = new.span(row, col)
+            redline_columns(row, span, *match(row, col, matched), output_row, [col])
+            row += span
+            output_row += span
+
+    def redline_level(depth, start_row, end_row, output_row, matched):
+        """Redline the groups of a level within new rows start_row..end_row - 1; returns the next output row"""
+        key, columns, keyed_columns = levels[depth]
+        row = start_row
+        while row < end_row:
+            if depth == 0:
+                report_progress(row, new.max_row, "Comparing groups")
+            span = new.span(row, key)
+            original_row, original_span = match(row, key, matched)
+            group_output_row = output_row
+            if key not in columns:
+                write_to_cell(ws_output, output_row, key, new.value(row, key))
+            redline_columns(row, span, original_row, original_span, output_row, columns)
+
+            # The group ends after its own rows, or after the groups nested in it if they run on
+            next_output_row = output_row + span
+            if depth + 1 < len(levels):
+                next_output_row = max(next_output_row,
+                                      redline_level(depth + 1, row, row + span, output_row, original_row is not None))
+            for col in keyed_columns:
+                redline_keyed(row, row + span, output_row, col, original_row is not None)
+            if key not in columns:
+                merge_ranges.append((group_output_row, key, next_output_row - 1, key))
+            row += span
+            output_row = next_output_row
+        return output_row
+
+    redline_level(0, 1, new.max_row + 1, 1, True)
+    return merge_ranges
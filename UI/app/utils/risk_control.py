@@ -1,5 +1,6 @@
-import openpyxl
 from openpyxl.utils import column_index_from_string, get_column_letter
+from .trace_table import TraceTable
+from .progress import report_progress, count_work
 
 def convert_column_input(column_input):
     """
@@ -49,25 +50,47 @@ def convert_column_input(column_input):
     
     raise ValueError(f"Invalid column input type: {type(column_input)}. Please use letters (A, B, AA) or numbers.")
 
-def get_merged_cell_ranges(worksheet):
+def resolve_column(table, col, first_row):
     """
-    Get a dictionary of merged cell ranges and their values.
-    Returns: Dict[tuple, str] where tuple is (start_row, end_row, column)
+    Resolve a column into its effective value for every row from first_row down, in one pass.
+    Rows inside a single-column merge take the merge's top value.
+    Returns (values, spans): spans holds the (start_row, end_row) of that merge for each row, or None.
     """
-    merged_ranges = {}
+    values = table.column_values(col, first_row)
+    spans = [None] * len(values)
+    
+    for merged_range in table.merged_ranges:
+        if merged_range.min_col != col or merged_range.max_col != col:
+            continue
+        value = table.get_value(merged_range.min_row, col)
+        # A merge with an empty top cell reads as a run of empty, unmerged cells
+        if value is None:
+            continue
+        span = (merged_range.min_row, merged_range.max_row)
+        for row in range(max(merged_range.min_row, first_row), min(merged_range.max_row, table.max_row) + 1):
+            values[row - first_row] = value
+            spans[row - first_row] = span
+    
+    return values, spans
+
+def build_control_index(control_table, control_header_row, control_id_col_num, control_content_col_num):
+    """Hash the control document: control ID -> every content value for it, in row order"""
+    first_row = control_header_row + 1
+    control_ids, _ = resolve_column(control_table, control_id_col_num, first_row)
+    control_contents, _ = resolve_column(control_table, control_content_col_num, first_row)
     
-    # Get all merged ranges in the worksheet
-    for merged_range in worksheet.merged_cells.ranges:
-        # Only process single-column merged ranges
-        if merged_range.min_col == merged_range.max_col:
-            col = merged_range.min_col
-            start_row = merged_range.min_row
-            end_row = merged_range.max_row
-            # Get value from the top cell of the merged range
-            value = worksheet.cell(row=start_row, column=col).value
-            merged_ranges[(start_row, end_row, col)] = value
-            
-    return merged_ranges
+    control_dict = {}
+    for control_id, control_content in zip(control_ids, control_contents):
+        # Store in dictionary, handling multiple controls for same ID
+        if control_id and control_content:
+            control_dict.setdefault(control_id, []).append(control_content)
+    return control_dict
+
+def join_content(contents):
+    """Paste value for the controls of one ID: the content itself, or all of them one per line"""
+    if len(contents) == 1:
+        return contents[0]
+    return "\n".join(str(item) for item in contents if item is not None)
 
 def merge_risk_control(risk_file, control_file, 
                       risk_header_row, control_header_row,
@@ -83,104 +106,48 @@ def merge_risk_control(risk_file, control_file,
     control_id_col_num = convert_column_input(control_id_col)
     paste_col_num = convert_column_input(paste_col)
     control_content_col_num = convert_column_input(control_content_col)
-    
-    # Load workbooks
-    risk_wb = openpyxl.load_workbook(risk_file)
-    control_wb = openpyxl.load_workbook(control_file)
-    
-    risk_ws = risk_wb.active
-    control_ws = control_wb.active
-    
-    # Get merged ranges for both worksheets
-    risk_merged = get_merged_cell_ranges(risk_ws)
-    control_merged = get_merged_cell_ranges(control_ws)
-    
-    # Create dictionary to store control content
-    control_dict = {}
-    
-    # Process control document
-    for row in range(control_header_row + 1, control_ws.max_row + 1):
-        control_id = None
-        control_content = None
-        
-        # Check if current row is part of a merged range in ID column
-        for (start_row, end_row, col) in control_merged:
-            if col == control_id_col_num and start_row <= row <= end_row:
-                control_id = control_merged[(start_row, end_row, col)]
-                break
+    risk_header_row = int(risk_header_row)
+    control_header_row = int(control_header_row)
+    
+    # Parse both documents once
+    risk_table = TraceTable.load(risk_file)
+    control_table = TraceTable.load(control_file)
+    
+    # Hash the control content by ID, then resolve the risk IDs in one pass
+    control_dict = build_control_index(control_table, control_header_row, control_id_col_num, control_content_col_num)
+    first_row = risk_header_row + 1
+    risk_ids, risk_spans = resolve_column(risk_table, risk_id_col_num, first_row)
+    
+    # Join each risk ID to its controls, joining the content of each ID only once
+    joined = {}
+    merge_ranges = []
+    pasted = 0
+    for row, (risk_id, span) in enumerate(zip(risk_ids, risk_spans), start=first_row):
+        report_progress(row, risk_table.max_row, "Joining risk IDs")
+        # Rows inside a merged ID range are pasted once, on its first row
+        if span is not None and row != span[0]:
+            continue
         
-        # If not in merged range, get direct cell value
-        if control_id is None:
-            control_id = control_ws.cell(row=row, column=control_id_col_num).value
+        content = None
+        if risk_id and risk_id in control_dict:
+            if risk_id not in joined:
+                joined[risk_id] = join_content(control_dict[risk_id])
+            content = joined[risk_id]
+        risk_table.set_value(row, paste_col_num, content)
+        pasted += 1
         
-        # Similarly for content column
-        for (start_row, end_row, col) in control_merged:
-            if col == control_content_col_num and start_row <= row <= end_row:
-                control_content = control_merged[(start_row, end_row, col)]
-                break
-                
-        if control_content is None:
-            control_content = control_ws.cell(row=row, column=control_content_col_num).value
-            
-        # Store in dictionary, handling multiple controls for same ID
-        if control_id and control_content:
-            if control_id in control_dict:
-                if isinstance(control_dict[control_id], list):
-                    control_dict[control_id].append(control_content)
-                else:
-                    control_dict[control_id] = [control_dict[control_id], control_content]
-            else:
-                control_dict[control_id] = control_content
-    
-    # Process risk document
-    current_merge_range = None
-    
-    for row in range(risk_header_row + 1, risk_ws.max_row + 1):
-        risk_id = None
-        
-        # Check if current row is part of a merged range in ID column
-        for (start_row, end_row, col) in risk_merged:
-            if col == risk_id_col_num and start_row <= row <= end_row:
-                risk_id = risk_merged[(start_row, end_row, col)]
-                # Store merge range for paste column
-                current_merge_range = (start_row, end_row)
-                break
-        
-        # If not in merged range, get direct cell value
-        if risk_id is None:
-            risk_id = risk_ws.cell(row=row, column=risk_id_col_num).value
-            current_merge_range = None
-        
-        # Handle content pasting and merging
-        if current_merge_range and row == current_merge_range[0]:  # First row of merge range
-            start_row, end_row = current_merge_range
-            
-            # Get content if we have a matching control
-            content = None
-            if risk_id and risk_id in control_dict:
-                content = control_dict[risk_id]
-                if isinstance(content, list):
-                    content = "\n".join(str(item) for item in content if item is not None)
-            
-            # Write content (or empty string) and merge cells
-            risk_ws.cell(row=start_row, column=paste_col_num).value = content
-            
-            # Always merge cells if range spans multiple rows, even if content is None
-            if start_row != end_row:
-                risk_ws.merge_cells(
-                    start_row=start_row,
-                    start_column=paste_col_num,
-                    end_row=end_row,
-                    end_column=paste_col_num
-                )
-        
-        # Handle non-merged cells
-        elif not current_merge_range:
-            content = None
-            if risk_id and risk_id in control_dict:
-                content = control_dict[risk_id]
-                if isinstance(content, list):
-                    content = "\n".join(str(item) for item in content if item is not None)
-            risk_ws.cell(row=row, column=paste_col_num).value = content
-    
-    return risk_wb
\ No newline at end of file
+        # Always merge cells if range spans multiple rows, even if content is None
+        if span is not None and span[0] != span[1]:
+            merge_ranges.append(span)
+    count_work(rows=len(risk_ids), cells=pasted)
+    
+    report_progress(0, stage="Merging cells")
+    for start_row, end_row in merge_ranges:
+        risk_table.merge_cells(
+            start_row=start_row,
+            start_column=paste_col_num,
+            end_row=end_row,
+            end_column=paste_col_num
+        )
+    
+    return risk_table
@@ -1,6 +1,6 @@
-import openpyxl
-from openpyxl.styles import PatternFill
 from openpyxl.utils import column_index_from_string
+from .progress import report_progress, count_work
+from .style_registry import solid_fill, level_rules
 
 def convert_column_input(column_input):
     """Convert column input (letter or number) to column number"""
@@ -24,95 +24,106 @@ def extract_number(value):
         return int(''.join(filter(str.isdigit, value))) if any(char.isdigit() for char in value) else None
     return None
 
+# Default matrix (rows: occurrence 5 down to 1, columns: severity 1 to 5), matches SPR-WI-7.1.1b
+DEFAULT_RISK_MATRIX = [
+    ["LOW", "MOD", "MOD", "INT", "INT"],      # Frequent 5
+    ["LOW", "MOD", "MOD", "MOD", "INT"],      # Likely 4
+    ["LOW", "LOW", "LOW", "MOD", "INT"],      # Occasional 3
+    ["LOW", "LOW", "LOW", "LOW", "MOD"],      # Remote 2
+    ["LOW", "LOW", "LOW", "LOW", "LOW"]       # Incredible 1
+]
+
+RISK_COLORS = {"INT": "red", "MOD": "orange"}
+COLOR_CODES = {"red": "FF0000", "orange": "FFA500"}
+
+def risk_rules():
+    """One conditional formatting rule per coloured risk level"""
+    return level_rules({level: COLOR_CODES[color] for level, color in RISK_COLORS.items()})
+
+def build_risk_table(risk_matrix_values=None):
+    """Compile the risk matrix into an {(occurrence, severity): (risk level, color)} lookup table"""
+    matrix = risk_matrix_values if risk_matrix_values else DEFAULT_RISK_MATRIX
+    risk_table = {}
+    for parent_idx, row in enumerate(matrix[:5]):
+        for child_idx, risk_level in enumerate(row[:5]):
+            # Row 0 is occurrence 5, column 0 is severity 1
+            risk_table[(5 - parent_idx, child_idx + 1)] = (risk_level, RISK_COLORS.get(risk_level))
+    return risk_table
+
 def determine_output(parent_value, child_value, risk_matrix_values=None):
-    # If risk_matrix_values is provided, use it
-    if risk_matrix_values:
-        parent_idx = 5 - parent_value  # Convert 1-5 to array index
-        child_idx = child_value - 1    # Convert 1-5 to array index
-        
-        if 0 <= parent_idx < 5 and 0 <= child_idx < 5:
-            risk_level = risk_matrix_values[parent_idx][child_idx]
-            color = None
-            if risk_level == "INT":
-                color = "red"
-            elif risk_level == "MOD":
-                color = "orange"
-            return risk_level, color
-    # Otherwise use default logic
-    else:
-        if parent_value == 5:
-            if child_value == 1:
-                return "LOW", None
-            elif child_value in [2, 3]:
-                return "MOD", "orange"
-            elif child_value in [4, 5]:
-                return "INT", "red"
-        elif parent_value == 4:
-            if child_value == 1:
-                return "LOW", None
-            elif child_value in [2, 3, 4]:
-                return "MOD", "orange"
-            elif child_value == 5:
-                return "INT", "red"
-        elif parent_value == 3:
-            if child_value in [1, 2, 3]:
-                return "LOW", None
-            elif child_value == 4:
-                return "MOD", "orange"
-            elif child_value == 5:
-                return "INT", "red"
-        elif parent_value == 2:
-            if child_value in [1, 2, 3, 4]:
-                return "LOW", None
-            elif child_value == 5:
-                return "MOD", "orange"
-        elif parent_value == 1:
-            return "LOW", None
-    return None, None
+    return build_risk_table(risk_matrix_values).get((parent_value, child_value), (None, None))
 
-def calculate_risk_score(wb, occurrence_col, severity_col, risk_analysis_col, header_row, risk_matrix_values=None):
-    """Calculate risk scores based on occurrence and severity"""
-    ws = wb.active
-    
+def calculate_risk_scores(table, score_columns, severity_col, header_row, risk_matrix_values=None,
+                          conditional_formatting=False):
+    """
+    Calculate risk scores for any number of (occurrence column, risk analysis column) pairs
+    (e.g. pre- and post-mitigation) in one pass over the trace table.
+    With conditional_formatting the levels are coloured by one conditional formatting rule
+    per risk column instead of a fill on every scored cell.
+    """
     # Convert inputs to column numbers
     header_row = int(header_row)
-    occurrence_col = convert_column_input(occurrence_col)
     severity_col = convert_column_input(severity_col)
-    risk_analysis_col = convert_column_input(risk_analysis_col)
+    score_columns = [(convert_column_input(occurrence_col), convert_column_input(risk_analysis_col))
+                     for occurrence_col, risk_analysis_col in score_columns]
     
-    # Create fill patterns
-    orange_fill = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-    red_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-
-    # Start processing from after header row
-    row = header_row + 1
-    while row <= ws.max_row:
-        parent_cell = ws.cell(row=row, column=occurrence_col)
-        parent_value = extract_number(parent_cell.value)
+    # Shared fill patterns (none when the column is coloured by conditional formatting)
+    fills = {} if conditional_formatting else {color: solid_fill(code) for color, code in COLOR_CODES.items()}
+    
+    # Compile the matrix once and index the merged ranges once (the sheet has usually just been merged)
+    risk_table = build_risk_table(risk_matrix_values)
+    index = table.merged_index()
+    
+    first_row = header_row + 1
+    max_row = table.max_row
+    if max_row < first_row:
+        return table
+    
+    if conditional_formatting:
+        rules = risk_rules()
+        for _, risk_analysis_col in score_columns:
+            table.add_conditional_format(risk_analysis_col, first_row, max_row, rules)
+    
+    # Pull the score columns out as arrays and parse each distinct score only once
+    parsed = {}
+    def parse_column(col):
+        values = []
+        for value in table.column_values(col, first_row, max_row):
+            if value not in parsed:
+                parsed[value] = extract_number(value)
+            values.append(parsed[value])
+        return values
+    
+    severity_values = parse_column(severity_col)
+    occurrence_values = [parse_column(occurrence_col) for occurrence_col, _ in score_columns]
+    
+    # Current parent (merged occurrence cell) of every pair: [parent value, last row]
+    parents = [[None, first_row - 1] for _ in score_columns]
+    
+    for row in range(first_row, max_row + 1):
+        report_progress(row, max_row, "Scoring rows")
+        child_value = severity_values[row - first_row]
         
-        # Check if the cell is part of a merged range
-        if parent_cell.coordinate in ws.merged_cells:
-            merged_range = [cell_range for cell_range in ws.merged_cells.ranges 
-                          if parent_cell.coordinate in cell_range][0]
-            end_row = merged_range.max_row
-        else:
-            end_row = row
-
-        # Process all child rows corresponding to the parent
-        for child_row in range(row, end_row + 1):
-            child_value = extract_number(ws.cell(row=child_row, column=severity_col).value)
+        for pair_idx, (occurrence_col, risk_analysis_col) in enumerate(score_columns):
+            parent = parents[pair_idx]
+            if row > parent[1]:
+                # A new parent starts here, its value covers the rest of its merged range
+                merged_range = index.get_range(row, occurrence_col)
+                parent[0] = occurrence_values[pair_idx][row - first_row]
+                parent[1] = merged_range.max_row if merged_range is not None else row
             
+            parent_value = parent[0]
             if parent_value is not None and child_value is not None:
-                output_text, fill_color = determine_output(parent_value, child_value, risk_matrix_values)
+                output_text, fill_color = risk_table.get((parent_value, child_value), (None, None))
                 
                 if output_text:
-                    output_cell = ws.cell(row=child_row, column=risk_analysis_col)
-                    output_cell.value = output_text
-                    if fill_color == "orange":
-                        output_cell.fill = orange_fill
-                    elif fill_color == "red":
-                        output_cell.fill = red_fill
-
-        row = end_row + 1
+                    table.set_value(row, risk_analysis_col, output_text)
+                    if fill_color in fills:
+                        table.set_style(row, risk_analysis_col, fill=fills[fill_color])
+    count_work(rows=max_row - first_row + 1, cells=(max_row - first_row + 1) * (len(score_columns) + 1))
     
-    return wb 
\ No newline at end of file
+    return table
+
+def calculate_risk_score(table, occurrence_col, severity_col, risk_analysis_col, header_row, risk_matrix_values=None):
+    """Calculate risk scores based on occurrence and severity"""
+    return calculate_risk_scores(table, [(occurrence_col, risk_analysis_col)], severity_col, header_row, risk_matrix_values)
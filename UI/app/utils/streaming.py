@@ -0,0 +1,271 @@
+import os
+import openpyxl
+from xml.etree.ElementTree import iterparse
+from itertools import zip_longest
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.utils import get_column_letter
+from .trace_table import TraceTable, STYLE_NAMES
+from .border_format import add_merged_borders
+from .risk_score import calculate_risk_scores
+from .progress import report_progress, count_work
+from .merge_plan import plan_merges
+from .style_registry import StyleWriter
+from . import general_format, general_format_URRA
+
+# Exports at least this large are formatted in streaming mode by the screens
+STREAMING_FILE_SIZE = 20 * 1024 * 1024
+
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+def use_streaming(file_path):
+    """
+    Return True if the workbook is large enough to be formatted in streaming mode.
+    CSV exports are already read row by row into the table, so they never stream.
+    """
+    if not file_path.lower().endswith('.xlsx'):
+        return False
+    return os.path.getsize(file_path) >= STREAMING_FILE_SIZE
+
+def read_sheet_layout(ws):
+    """
+    Stream the XML of a read_only worksheet for its merged ranges and column widths,
+    which openpyxl does not expose in read_only mode.
+    """
+    merged_ranges = []
+    column_widths = {}
+    sheet_data = None
+    with ws._get_source() as src:
+        for event, element in iterparse(src, events=('start', 'end')):
+            if event == 'start':
+                if element.tag == SHEET_NS + 'sheetData':
+                    sheet_data = element
+                continue
+            if element.tag == SHEET_NS + 'row' and sheet_data is not None:
+                # Drop parsed rows straight away so memory stays flat
+                sheet_data.clear()
+            elif element.tag == SHEET_NS + 'mergeCell':
+                merged_ranges.append(CellRange(element.get('ref')))
+            elif element.tag == SHEET_NS + 'col' and element.get('width'):
+                for col in range(int(element.get('min')), int(element.get('max')) + 1):
+                    column_widths[get_column_letter(col)] = float(element.get('width'))
+    return merged_ranges, column_widths
+
+def content_extent(ws):
+    """Return the last column with content in a read_only worksheet (one values-only pass)"""
+    max_col = 0
+    for values in ws.iter_rows(values_only=True):
+        for col in range(len(values), max_col, -1):
+            if values[col - 1] is not None:
+                max_col = col
+                break
+    return max_col
+
+def iter_blocks(ws, header_row, group_col, merged_ranges):
+    """
+    Stream the rows of a read_only worksheet grouped into blocks.
+    The header rows form the first block, then each block holds consecutive rows sharing
+    the group column value; a block is extended rather than split across an input merge.
+    Yields (first_row, rows) where rows is a list of (values, styles by column).
+    """
+    merge_ends = {}
+    for merged_range in merged_ranges:
+        merge_ends[merged_range.min_row] = max(merge_ends.get(merged_range.min_row, 0), merged_range.max_row)
+
+    block = []
+    first_row = 1
+    group_value = None
+    open_until = 0  # last row covered by an input merge that started in the current block
+
+    for row_num, cells in enumerate(ws.iter_rows(), start=1):
+        values = [cell.value for cell in cells]
+        value = values[group_col - 1] if group_col <= len(values) else None
+        starts_block = row_num == header_row + 1 or (row_num > header_row and value != group_value)
+
+        if block and starts_block and row_num > open_until:
+            yield first_row, block
+            block = []
+            first_row = row_num
+
+        styles = {}
+        for cell in cells:
+            if getattr(cell, 'has_style', False):
+                styles[cell.column] = {name: getattr(cell, name) for name in STYLE_NAMES}
+        block.append((values, styles))
+        group_value = value
+        open_until = max(open_until, merge_ends.get(row_num, 0))
+
+    if block:
+        yield first_row, block
+
+def build_block_table(first_row, rows, merges_by_row, min_columns=0):
+    """Build a TraceTable for one block, rows numbered from 1 and at least min_columns wide"""
+    columns = [list(column) for column in zip_longest(*(values for values, _ in rows))]
+    columns.extend([None] * len(rows) for _ in range(min_columns - len(columns)))
+    table = TraceTable(columns)
+    for local_row, (_, styles) in enumerate(rows, start=1):
+        for col, style in styles.items():
+            table.styles[(local_row, col)] = style
+    for row in range(first_row, first_row + len(rows)):
+        for merged_range in merges_by_row.get(row, ()):
+            local_range = CellRange(merged_range.coord)
+            local_range.shift(row_shift=1 - first_row)
+            table.merged_ranges.append(local_range)
+    return table
+
+class StreamingWriter:
+    """
+    Write-only output workbook that TraceTable blocks are appended to.
+    Merged ranges are kept as coordinates and only written to <mergeCells> on close;
+    conditional formats of a column are joined across blocks into one range, also written on close.
+    """
+    def __init__(self, output_path, title="Sheet", column_widths=None):
+        self.output_path = output_path
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(title)
+        # Column widths must be set before any row is written
+        for letter, width in (column_widths or {}).items():
+            self.ws.column_dimensions[letter].width = width
+        self.next_row = 1
+        self.style_writer = StyleWriter()
+        self.conditional_formats = {}  # column -> [first row, last row, rules]
+
+    def write_table(self, table):
+        """Append every row of the table, with its styles and merges"""
+        report_progress(self.next_row, stage="Writing rows")
+        row_offset = self.next_row - 1
+        width = max([table.max_column] + [col for _, col in table.styles])
+        for row in range(1, table.max_row + 1):
+            cells = []
+            for col in range(1, width + 1):
+                value = table.get_value(row, col)
+                styles = table.styles.get((row, col))
+                if styles:
+                    cell = WriteOnlyCell(self.ws, value=value)
+                    self.style_writer.apply(cell, styles)
+                    cells.append(cell)
+                else:
+                    cells.append(value)
+            self.ws.append(cells)
+
+        # Blocks never split a merge, so each block's merges are checked for overlaps on their own
+        kept, _ = plan_merges(table.merged_ranges)
+        for min_row, min_col, max_row, max_col in kept:
+            self.ws.merged_cells.ranges.add(CellRange(min_row=min_row + row_offset, min_col=min_col,
+                                                      max_row=max_row + row_offset, max_col=max_col).coord)
+        for cell_range, rules in table.conditional_formats:
+            first_row, last_row = cell_range.min_row + row_offset, cell_range.max_row + row_offset
+            for col in range(cell_range.min_col, cell_range.max_col + 1):
+                extent = self.conditional_formats.setdefault(col, [first_row, last_row, rules])
+                extent[0] = min(extent[0], first_row)
+                extent[1] = max(extent[1], last_row)
+        self.next_row += table.max_row
+        count_work(rows=table.max_row, cells=table.max_row * width)
+
+    def close(self):
+        for col, (first_row, last_row, rules) in self.conditional_formats.items():
+            coord = CellRange(min_row=first_row, min_col=col, max_row=last_row, max_col=col).coord
+            for rule in rules:
+                self.ws.conditional_formatting.add(coord, rule)
+        report_progress(0, stage="Saving")
+        self.wb.save(self.output_path)
+
+def stream_format(file_path, output_path, header_row, group_col, format_block, borders=False, extra_columns=(),
+                  level_borders=False):
+    """
+    Format an export with flat memory use.
+    The source is read in openpyxl read_only mode one parent block at a time. format_block(table)
+    formats each block (rows numbered from 1, no header rows) and the block is appended to a
+    write_only output. extra_columns are output columns (e.g. risk analysis) the borders must reach;
+    level_borders adds thin borders at the ends of sub-level groups.
+    """
+    if not file_path.lower().endswith('.xlsx'):
+        raise ValueError("Please select a valid .xlsx file")
+
+    header_row = int(header_row)
+    report_progress(0, stage="Reading layout")
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        ws = wb.active
+        # Keep the declared width so blocks span the same columns as the full sheet would,
+        # then read every row whatever the stored dimensions claim
+        declared_columns = ws.max_column or 0
+        declared_rows = ws.max_row or 0
+        ws.reset_dimensions()
+        merged_ranges, column_widths = read_sheet_layout(ws)
+        merges_by_row = {}
+        for merged_range in merged_ranges:
+            merges_by_row.setdefault(merged_range.min_row, []).append(merged_range)
+
+        # The border extent is a property of the whole sheet, so find it in a first cheap pass
+        border_col = max([content_extent(ws)] + list(extra_columns)) if borders else None
+
+        writer = StreamingWriter(output_path, ws.title, column_widths)
+        for first_row, rows in iter_blocks(ws, header_row, group_col, merged_ranges):
+            report_progress(first_row, declared_rows, "Formatting rows")
+            table = build_block_table(first_row, rows, merges_by_row, declared_columns)
+            if first_row > header_row:
+                format_block(table)
+            elif level_borders:
+                # Level borders follow the groups merged below the header, so the header rows
+                # (e.g. a merged title) end none, as in the whole-sheet table
+                table.add_group_ends(())
+            if borders:
+                add_merged_borders(table, border_col, level_borders)
+            writer.write_table(table)
+        writer.close()
+    finally:
+        wb.close()
+    return output_path
+
+def _score_block(table, score_columns, severity_col, risk_matrix_values, conditional_formatting=False):
+    if score_columns:
+        calculate_risk_scores(table, score_columns, severity_col, 0, risk_matrix_values, conditional_formatting)
+
+def stream_format_general(file_path, output_path, header_row, harm_id_col=None, score_columns=(),
+                          severity_col=None, risk_matrix_values=None, borders=False,
+                          conditional_formatting=False):
+    """Streaming equivalent of format_general followed by risk scoring and borders"""
+    harm_col_num = None
+    if harm_id_col is not None:
+        try:
+            harm_col_num = general_format.convert_column_input(harm_id_col)
+        except ValueError:
+            harm_col_num = None
+
+    def format_block(table):
+        general_format.merge_cells(table, 0, harm_col_num)
+        _score_block(table, score_columns, severity_col, risk_matrix_values, conditional_formatting)
+
+    extra_columns = [general_format.convert_column_input(col) for _, col in score_columns]
+    return stream_format(file_path, output_path, header_row, 2, format_block, borders, extra_columns)
+
+def stream_format_hierarchy(file_path, output_path, header_row, parent_cols, harm_id_col=None,
+                            score_columns=(), severity_col=None, risk_matrix_values=None, borders=False,
+                            conditional_formatting=False, level_borders=False):
+    """Streaming equivalent of format_hierarchy followed by risk scoring and borders"""
+    parent_nums = [general_format_URRA.convert_column_input(col) for col in parent_cols]
+    harm_col_num = None if harm_id_col is None else general_format_URRA.convert_column_input(harm_id_col)
+
+    if not parent_nums:
+        raise ValueError("At least one parent column is required")
+    if any(child <= parent for parent, child in zip(parent_nums, parent_nums[1:])):
+        raise ValueError("Each parent column must be after the one before it")
+
+    def format_block(table):
+        general_format_URRA.merge_hierarchy(table, 0, parent_nums, harm_col_num)
+        _score_block(table, score_columns, severity_col, risk_matrix_values, conditional_formatting)
+
+    extra_columns = [general_format_URRA.convert_column_input(col) for _, col in score_columns]
+    return stream_format(file_path, output_path, header_row, parent_nums[0], format_block, borders, extra_columns,
+                         level_borders)
+
+def stream_format_urra(file_path, output_path, header_row, first_parent_col, second_parent_col, harm_id_col=None,
+                       score_columns=(), severity_col=None, risk_matrix_values=None, borders=False,
+                       conditional_formatting=False, level_borders=False):
+    """Streaming equivalent of format_urra followed by risk scoring and borders"""
+    if general_format_URRA.convert_column_input(second_parent_col) <= general_format_URRA.convert_column_input(first_parent_col):
+        raise ValueError("Second parent column must be after first parent column")
+    return stream_format_hierarchy(file_path, output_path, header_row, [first_parent_col, second_parent_col],
+                                   harm_id_col, score_columns, severity_col, risk_matrix_values, borders,
+                                   conditional_formatting, level_borders)
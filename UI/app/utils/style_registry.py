@@ -0,0 +1,71 @@
+from copy import copy
+from openpyxl.styles import PatternFill, Alignment, Border, Side
+from openpyxl.formatting.rule import CellIsRule
+
+# One shared instance of every style the formatters apply. openpyxl styles compare and
+# hash by value, so equal styles collapse to a single object here; the table then
+# carries a handful of style objects however many cells use them, and the workbook
+# writer resolves each distinct combination only once (see StyleWriter).
+
+_shared = {}
+
+def shared(style):
+    """Return the shared instance equal to style (style itself the first time it is seen)"""
+    return _shared.setdefault(style, style)
+
+def solid_fill(color):
+    return shared(PatternFill(start_color=color, end_color=color, fill_type="solid"))
+
+def center_alignment():
+    """Vertical centring applied to the top cell of every merge"""
+    return shared(Alignment(vertical='center'))
+
+def with_bottom(border, style='thick', cache=None):
+    """
+    border (or no border) with its bottom side replaced, keeping the other sides.
+    cache is a dict the caller keeps for one pass (see add_merged_borders), so each
+    distinct border is rebuilt only once within it.
+    """
+    # Keyed by identity; the entry keeps the source border alive so its id is not reused
+    key = (id(border), style)
+    cached = cache.get(key) if cache is not None else None
+    if cached is None:
+        current = border or Border()
+        new_border = shared(Border(left=current.left, right=current.right, top=current.top,
+                                   bottom=Side(style=style)))
+        cached = (border, new_border)
+        if cache is not None:
+            cache[key] = cached
+    return cached[1]
+
+def level_rules(colors):
+    """
+    Conditional formatting rules colouring a risk analysis column by its level text:
+    one rule per coloured level (e.g. {"INT": "FF0000", "MOD": "FFA500"}).
+    """
+    return [CellIsRule(operator='equal', formula=[f'"{level}"'], fill=solid_fill(color))
+            for level, color in colors.items()]
+
+class StyleWriter:
+    """
+    Applies TraceTable style dictionaries to openpyxl cells. The first cell with a given
+    combination of style objects goes through openpyxl's style descriptors; every later
+    cell with the same objects gets a copy of that cell's style ids, skipping the
+    per-attribute hashing and lookups in the workbook's style tables.
+    """
+    def __init__(self):
+        # (cell's style ids before, (name, id(style)) pairs) -> (styles, resulting style ids).
+        # The styles are kept in the entry so the ids in the key stay unique.
+        self._arrays = {}
+
+    def apply(self, cell, styles):
+        # An unstyled cell has no style array yet
+        key = (tuple(cell._style or ()), tuple((name, id(style)) for name, style in styles.items()))
+        cached = self._arrays.get(key)
+        if cached is not None:
+            cell._style = copy(cached[1])
+            return
+        for name, style in styles.items():
+            if style is not None:
+                setattr(cell, name, style)
+        self._arrays[key] = (dict(styles), copy(cell._style))
@@ -0,0 +1,411 @@
+import csv
+import os
+import re
+import openpyxl
+from copy import copy
+from io import BytesIO
+from openpyxl.comments import Comment
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.cell import coordinate_from_string, range_boundaries
+from .merged_index import MergedRangeIndex
+from .merge_plan import write_merges
+from .style_registry import StyleWriter
+from . import parse_cache
+from .progress import report_progress, count_work
+
+# Cell style attributes carried from the source and written to the output
+STYLE_NAMES = ('font', 'fill', 'border', 'alignment', 'number_format')
+
+# Sheet settings carried from the source worksheet to the output as they are
+SHEET_SETTINGS = ('freeze_panes', 'print_title_rows', 'print_title_cols', 'page_setup', 'print_options',
+                  'page_margins', 'sheet_properties')
+
+# Inputs every pipeline reads: a saved workbook or Jama's own CSV export
+INPUT_EXTENSIONS = ('.xlsx', '.csv')
+
+# CSV fields Excel would store as numbers (leading zeros and very long digit strings stay text)
+NUMBER_PATTERN = re.compile(r'-?(0|[1-9]\d{0,14})(\.\d+)?')
+
+def check_input_file(file_path):
+    """Raise ValueError unless the file is an .xlsx workbook or a .csv export"""
+    if not file_path.lower().endswith(INPUT_EXTENSIONS):
+        raise ValueError("Please select a valid .xlsx or .csv file")
+
+def csv_value(text):
+    """Convert a CSV field the way Excel does on opening: empty is no value, plain numbers are numbers"""
+    if text == "":
+        return None
+    if NUMBER_PATTERN.fullmatch(text):
+        return float(text) if '.' in text else int(text)
+    return text
+
+def csv_sheet_title(file_path):
+    """Excel names the sheet of an opened CSV after the file"""
+    title = re.sub(r'[\\/*?:\[\]]', '_', os.path.splitext(os.path.basename(file_path))[0])
+    return title[:31] or "Sheet1"
+
+def shift_for_insert(cell_range, col):
+    """Move a range right of a column inserted before col, or widen it if the column lands inside it"""
+    if cell_range.min_col >= col:
+        cell_range.shift(col_shift=1)
+    elif cell_range.max_col >= col:
+        cell_range.expand(right=1)
+
+class TraceTable:
+    """
+    Compact in-memory copy of a trace view sheet that every formatting stage works on.
+    Values are stored column-wise (columns[col - 1][row - 1]); merges, cell styles,
+    column widths, row heights, hyperlinks, comments, data validations and the sheet
+    settings in SHEET_SETTINGS are kept alongside so a job parses its input once and
+    writes its output once. The other sheets of the source workbook are kept as a small
+    workbook of their own, written out around the formatted sheet.
+    """
+    def __init__(self, columns=None, title="Sheet"):
+        self.title = title
+        self.columns = columns if columns is not None else []
+        self.max_row = max((len(column) for column in self.columns), default=0)
+        for column in self.columns:
+            column.extend([None] * (self.max_row - len(column)))
+        self.merged_ranges = []
+        # (row, col) -> {style name: style object}. Cells with the same styles may share one
+        # dictionary, so it is replaced rather than modified (see set_style)
+        self.styles = {}
+        self.conditional_formats = []  # (CellRange, conditional formatting rules)
+        self.column_widths = {}  # column letter -> width
+        self.row_dimensions = {}  # row -> (height, hidden)
+        self.hyperlinks = {}  # (row, col) -> Hyperlink
+        self.comments = {}  # (row, col) -> (text, author, width, height)
+        self.data_validations = []
+        self.sheet_settings = {}  # SHEET_SETTINGS name -> value
+        # The source workbook without this sheet, as .xlsx bytes (None if it had no other
+        # sheets), and the sheet's position in it
+        self.other_sheets = None
+        self.sheet_index = 0
+        # row -> (level, group column) of the outermost merged group ending on the row, level 0
+        # being the top of the hierarchy; None until the table has been merged
+        self.group_ends = None
+        self._index = None
+        self._extent = None  # last column holding a value, once known
+
+    @property
+    def max_column(self):
+        return len(self.columns)
+
+    def __getstate__(self):
+        # The merged index is rebuilt on demand, so it is never pickled into the parse cache
+        state = self.__dict__.copy()
+        state['_index'] = None
+        return state
+
+    @classmethod
+    def from_worksheet(cls, ws):
+        """Copy the values, styles, merges, dimensions, links, comments and settings of an openpyxl worksheet"""
+        max_row = ws.max_row
+        max_col = ws.max_column
+        columns = [[None] * max_row for _ in range(max_col)]
+        styles = {}
+        shared_styles = {}  # the cell's style ids -> copied style dictionary
+        hyperlinks = {}
+        comments = {}
+
+        for row_num, row in enumerate(ws.iter_rows(min_row=1, max_row=max_row, max_col=max_col), start=1):
+            report_progress(row_num, max_row, "Reading rows")
+            for cell in row:
+                if cell.value is not None:
+                    columns[cell.column - 1][cell.row - 1] = cell.value
+                if cell.has_style:
+                    # Copy each distinct style once; every cell styled the same shares the copy
+                    key = tuple(cell._style)
+                    cell_styles = shared_styles.get(key)
+                    if cell_styles is None:
+                        cell_styles = shared_styles[key] = {name: copy(getattr(cell, name)) for name in STYLE_NAMES}
+                    styles[(cell.row, cell.column)] = cell_styles
+                if cell.hyperlink is not None:
+                    hyperlinks[(cell.row, cell.column)] = copy(cell.hyperlink)
+                if cell.comment is not None:
+                    comment = cell.comment
+                    comments[(cell.row, cell.column)] = (comment.text, comment.author, comment.width, comment.height)
+        count_work(rows=max_row, cells=max_row * max_col)
+
+        table = cls(columns, ws.title)
+        table.styles = styles
+        table.merged_ranges = [CellRange(merged_range.coord) for merged_range in ws.merged_cells.ranges]
+        for letter, dimension in ws.column_dimensions.items():
+            if dimension.width:
+                table.column_widths[letter] = dimension.width
+        for row, dimension in ws.row_dimensions.items():
+            if dimension.height or dimension.hidden:
+                table.row_dimensions[row] = (dimension.height, dimension.hidden)
+        table.hyperlinks = hyperlinks
+        table.comments = comments
+        table.data_validations = [copy(validation) for validation in ws.data_validations.dataValidation]
+        table.sheet_settings = {name: copy(getattr(ws, name)) for name in SHEET_SETTINGS}
+        return table
+
+    def keep_other_sheets(self, ws):
+        """
+        Keep every sheet of ws's workbook except ws, so the output can hold them too. ws is
+        removed from its workbook and the rest is saved to bytes: only the other sheets are
+        written, and they are kept with the table (and in the parse cache) rather than read
+        from the source again at save time.
+        """
+        workbook = ws.parent
+        if len(workbook.sheetnames) < 2:
+            return
+        report_progress(0, stage="Keeping other sheets")
+        self.sheet_index = workbook.index(ws)
+        workbook.remove(ws)
+        workbook.active = 0
+        buffer = BytesIO()
+        workbook.save(buffer)
+        self.other_sheets = buffer.getvalue()
+
+    @classmethod
+    def from_csv(cls, file_path):
+        """
+        Read a CSV export row by row straight into the table's columns, without going
+        through a workbook. Jama writes UTF-8; files re-saved by Excel may be Windows-1252.
+        """
+        try:
+            return cls._read_csv(file_path, 'utf-8-sig')
+        except UnicodeDecodeError:
+            return cls._read_csv(file_path, 'cp1252')
+
+    @classmethod
+    def _read_csv(cls, file_path, encoding):
+        columns = []
+        max_row = 0
+        with open(file_path, newline='', encoding=encoding) as f:
+            for max_row, fields in enumerate(csv.reader(f), start=1):
+                report_progress(max_row, stage="Reading rows")
+                if len(fields) > len(columns):
+                    columns.extend([None] * (max_row - 1) for _ in range(len(fields) - len(columns)))
+                for column, text in zip(columns, fields):
+                    column.append(csv_value(text))
+                for column in columns[len(fields):]:
+                    column.append(None)
+        count_work(rows=max_row, cells=max_row * len(columns))
+        return cls(columns, csv_sheet_title(file_path))
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Parse the active sheet of an .xlsx file, or a .csv export, into a TraceTable.
+        A file whose content was parsed before is loaded from the parse cache instead.
+        """
+        table = parse_cache.cached_parse(file_path, cls.parse)
+        # A cached table may have been parsed from a copy of the file under another name,
+        # and a CSV's sheet is named after the file rather than its content
+        if file_path.lower().endswith('.csv'):
+            table.title = csv_sheet_title(file_path)
+        return table
+
+    @classmethod
+    def parse(cls, file_path):
+        """Parse the file into a TraceTable, bypassing the parse cache"""
+        if file_path.lower().endswith('.csv'):
+            return cls.from_csv(file_path)
+        report_progress(0, stage="Loading workbook")
+        wb = openpyxl.load_workbook(file_path)
+        table = cls.from_worksheet(wb.active)
+        table.keep_other_sheets(wb.active)
+        return table
+
+    def get_value(self, row, col):
+        """Return the stored value of a cell (None outside the table or under a merge)"""
+        if row < 1 or col < 1 or row > self.max_row or col > self.max_column:
+            return None
+        return self.columns[col - 1][row - 1]
+
+    def set_value(self, row, col, value):
+        """Set a cell value, growing the table if needed"""
+        self._grow(row, col)
+        self.columns[col - 1][row - 1] = value
+        if value is not None and self._extent is not None and col > self._extent:
+            self._extent = col
+
+    def content_extent(self):
+        """
+        Return the last column holding a value (0 for an empty table). It is found once,
+        from the right, and then kept up to date as values are set and columns inserted.
+        """
+        if self._extent is None:
+            self._extent = 0
+            for col in range(self.max_column, 0, -1):
+                if any(value is not None for value in self.columns[col - 1]):
+                    self._extent = col
+                    break
+        return self._extent
+
+    def column_values(self, col, first_row=1, last_row=None):
+        """Return the values of rows first_row..last_row of a column as a list"""
+        last_row = self.max_row if last_row is None else last_row
+        if col > self.max_column:
+            return [None] * max(0, last_row - first_row + 1)
+        return self.columns[col - 1][first_row - 1:last_row]
+
+    def get_style(self, row, col, name):
+        """Return one style attribute of a cell, or None if it has not been set"""
+        return self.styles.get((row, col), {}).get(name)
+
+    def set_style(self, row, col, **styles):
+        """Set style attributes (font, fill, border, alignment, number_format) of a cell"""
+        current = self.styles.get((row, col))
+        self.styles[(row, col)] = {**current, **styles} if current else styles
+
+    def merge_cells(self, start_row, start_column, end_row, end_column):
+        """Merge a range; like openpyxl, only the top-left cell keeps its value"""
+        self._grow(end_row, end_column)
+        for col in range(start_column, end_column + 1):
+            column = self.columns[col - 1]
+            first = start_row + 1 if col == start_column else start_row
+            column[first - 1:end_row] = [None] * (end_row - first + 1)
+        self.merged_ranges.append(CellRange(min_col=start_column, min_row=start_row,
+                                            max_col=end_column, max_row=end_row))
+        self._index = None
+        count_work(cells=(end_row - start_row + 1) * (end_column - start_column + 1), merges=1)
+
+    def insert_column(self, col):
+        """
+        Insert an empty column before col. Only the list of columns changes, no cell value is
+        moved; the sparse styles, merges, validations, column widths and the column settings
+        (frozen columns, print title columns) after col are renumbered once.
+        """
+        self._grow(0, col - 1)
+        self.columns.insert(col - 1, [None] * self.max_row)
+        self.styles = {(row, c + 1 if c >= col else c): styles for (row, c), styles in self.styles.items()}
+        # Links and comments belong to their cells and move with them
+        self.hyperlinks = {(row, c + 1 if c >= col else c): link for (row, c), link in self.hyperlinks.items()}
+        self.comments = {(row, c + 1 if c >= col else c): comment for (row, c), comment in self.comments.items()}
+        for merged_range in self.merged_ranges:
+            shift_for_insert(merged_range, col)
+        for validation in self.data_validations:
+            ranges = [CellRange(cell_range.coord) for cell_range in validation.sqref.ranges]
+            for cell_range in ranges:
+                shift_for_insert(cell_range, col)
+            validation.sqref = MultiCellRange(ranges)
+        self._shift_column_settings(col)
+        for cell_range, _ in self.conditional_formats:
+            if cell_range.min_col >= col:
+                cell_range.shift(col_shift=1)
+        if self.group_ends:
+            self.group_ends = {row: (level, c + 1 if c >= col else c) for row, (level, c) in self.group_ends.items()}
+        if self._extent is not None and self._extent >= col:
+            self._extent += 1
+        widths = {}
+        for letter, width in self.column_widths.items():
+            c = column_index_from_string(letter)
+            widths[get_column_letter(c + 1 if c >= col else c)] = width
+        self.column_widths = widths
+        self._index = None
+
+    def _shift_column_settings(self, col):
+        """Keep the frozen columns and the print title columns on the same source columns"""
+        freeze_panes = self.sheet_settings.get('freeze_panes')
+        if freeze_panes:
+            # Columns before the split are frozen; a column inserted among them is frozen too
+            letter, row = coordinate_from_string(freeze_panes)
+            split = column_index_from_string(letter)
+            if col < split:
+                self.sheet_settings['freeze_panes'] = f"{get_column_letter(split + 1)}{row}"
+        print_title_cols = self.sheet_settings.get('print_title_cols')
+        if print_title_cols:
+            first, _, last, _ = range_boundaries(print_title_cols)
+            title_cols = CellRange(min_col=first, min_row=1, max_col=last, max_row=1)
+            shift_for_insert(title_cols, col)
+            self.sheet_settings['print_title_cols'] = (f"{get_column_letter(title_cols.min_col)}:"
+                                                      f"{get_column_letter(title_cols.max_col)}")
+
+    def add_conditional_format(self, col, first_row, last_row, rules):
+        """Apply conditional formatting rules to rows first_row to last_row of a column"""
+        self.conditional_formats.append((CellRange(min_col=col, min_row=first_row, max_col=col, max_row=last_row), rules))
+
+    def add_group_ends(self, ends):
+        """
+        Record the (end row, level, group column) of merged groups. A row ending groups at
+        several levels keeps the outermost one.
+        """
+        if self.group_ends is None:
+            self.group_ends = {}
+        for row, level, col in ends:
+            current = self.group_ends.get(row)
+            if current is None or level < current[0]:
+                self.group_ends[row] = (level, col)
+
+    def merged_index(self):
+        """Return a MergedRangeIndex over the table's current merges"""
+        if self._index is None:
+            self._index = MergedRangeIndex(self.merged_ranges, self.get_value)
+        return self._index
+
+    def _grow(self, row, col):
+        if col > self.max_column:
+            self.columns.extend([None] * self.max_row for _ in range(col - self.max_column))
+        if row > self.max_row:
+            for column in self.columns:
+                column.extend([None] * (row - self.max_row))
+            self.max_row = row
+
+    def new_workbook(self):
+        """
+        Return a workbook and the empty worksheet the table is written to: a new workbook, or,
+        if the source workbook had other sheets, those sheets with the table's sheet back in place.
+        """
+        if self.other_sheets is not None:
+            report_progress(0, stage="Loading other sheets")
+            wb = openpyxl.load_workbook(BytesIO(self.other_sheets))
+            ws = wb.create_sheet(self.title, self.sheet_index)
+            wb.active = self.sheet_index
+            return wb, ws
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = self.title
+        return wb, ws
+
+    def to_workbook(self):
+        """Build an openpyxl workbook holding the table"""
+        wb, ws = self.new_workbook()
+
+        # Covered cells hold no values, so the merges are only registered for <mergeCells>:
+        # no MergedCell is created, and styles set below on covered cells are still written
+        write_merges(ws, self.merged_ranges)
+
+        written = 0
+        for col, column in enumerate(self.columns, start=1):
+            report_progress(col, self.max_column, "Writing columns")
+            for row, value in enumerate(column, start=1):
+                if value is not None:
+                    ws.cell(row=row, column=col).value = value
+                    written += 1
+        count_work(rows=self.max_row, cells=written + len(self.styles))
+
+        style_writer = StyleWriter()
+        for (row, col), styles in self.styles.items():
+            style_writer.apply(ws.cell(row=row, column=col), styles)
+
+        for cell_range, rules in self.conditional_formats:
+            for rule in rules:
+                ws.conditional_formatting.add(cell_range.coord, rule)
+
+        for letter, width in self.column_widths.items():
+            ws.column_dimensions[letter].width = width
+        for row, (height, hidden) in self.row_dimensions.items():
+            ws.row_dimensions[row].height = height
+            ws.row_dimensions[row].hidden = hidden
+
+        for (row, col), link in self.hyperlinks.items():
+            ws.cell(row=row, column=col).hyperlink = copy(link)
+        for (row, col), (text, author, width, height) in self.comments.items():
+            ws.cell(row=row, column=col).comment = Comment(text, author, height=height, width=width)
+        for validation in self.data_validations:
+            ws.add_data_validation(copy(validation))
+        for name, value in self.sheet_settings.items():
+            setattr(ws, name, copy(value))
+        return wb
+
+    def save(self, file_path):
+        """Write the table to an .xlsx file"""
+        wb = self.to_workbook()
+        report_progress(0, stage="Saving")
+        wb.save(file_path)
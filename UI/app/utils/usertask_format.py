@@ -1,179 +1,130 @@
-import openpyxl
-from openpyxl.styles import Alignment
-import shutil
+from bisect import bisect_right
 from .column_converter import convert_column_input
+from .trace_table import TraceTable, check_input_file
+from .progress import report_progress, count_work
+from .style_registry import center_alignment
+
+def merge_runs(table, col, first_row, last_row, alignment):
+    """
+    Merge runs of two or more equal, non-empty values in a column.
+    Returns (start_row, end_row, value) for each merged run.
+    """
+    runs = []
+    merge_start = None
+    current_value = None
+
+    # The column is read once; merges only ever cover rows already passed
+    values = table.column_values(col, first_row, last_row)
+    for row, cell_value in enumerate(values, start=first_row):
+        if cell_value != current_value:
+            if merge_start and current_value is not None and merge_start < row - 1:
+                runs.append((merge_start, row - 1, current_value))
+            merge_start = row
+            current_value = cell_value
+
+    # Handle the last run
+    if merge_start and current_value is not None and merge_start < last_row:
+        runs.append((merge_start, last_row, current_value))
+
+    for start_row, end_row, _ in runs:
+        table.merge_cells(start_row=start_row, start_column=col, end_row=end_row, end_column=col)
+        table.set_style(start_row, col, alignment=alignment)
+    return runs
+
+def merge_within(table, cols, ranges, alignment):
+    """Merge each column over every (start_row, end_row, ...) range whose top cell has a value"""
+    for col in cols:
+        for start_row, end_row, *_ in ranges:
+            if table.get_value(start_row, col) is not None:
+                table.merge_cells(start_row=start_row, start_column=col, end_row=end_row, end_column=col)
+                table.set_style(start_row, col, alignment=alignment)
 
 def usertask_format(file_path, header_row, item_type_col, us_name_col, ut_name_col):
     """Format Excel file with Marathon UT specific formatting rules"""
-    if not file_path.lower().endswith('.xlsx'):
-        raise ValueError("Please select a valid .xlsx file")
-    
-    output_path = file_path.rsplit('.', 1)[0] + '_formatted.xlsx'
-    shutil.copy2(file_path, output_path)
-    
+    check_input_file(file_path)
+
     # Convert column inputs to numbers
     item_type_col_num = convert_column_input(item_type_col)
     us_name_col_num = convert_column_input(us_name_col)
     ut_name_col_num = convert_column_input(ut_name_col)
-    
+
     # Convert header_row to integer
     header_row = int(header_row)
-    
-    wb = openpyxl.load_workbook(output_path)
-    ws = wb.active
-    
-    # Insert new column to the left of Item Type column
-    ws.insert_cols(item_type_col_num)
-    
-    # First pass: Just populate the new column without merging
-    folder_positions = []  # Track where folders are located
-    for row in range(header_row + 1, ws.max_row + 1):
-        item_type = ws.cell(row=row, column=item_type_col_num + 1).value
-        next_item_type = ws.cell(row=row + 1, column=item_type_col_num + 1).value if row < ws.max_row else None
-        
+
+    # Parse the file once and process it in memory
+    table = TraceTable.load(file_path)
+    alignment = center_alignment()
+
+    # Find the folders and the row their name goes on, before the folder column exists
+    item_types = table.column_values(item_type_col_num, header_row + 1)
+    # The US Name column is addressed as it will be numbered once the folder column is in place
+    us_name_out = us_name_col_num + 1
+    if us_name_out == item_type_col_num:
+        us_names = [None] * len(item_types)
+    else:
+        us_source = us_name_out if us_name_out < item_type_col_num else us_name_col_num
+        us_names = table.column_values(us_source, header_row + 1)
+    folder_positions = []  # Rows holding a Folder, in ascending order
+    folder_names = []  # (paste_row, folder name)
+    for offset, item_type in enumerate(item_types):
         if item_type == "Folder":
+            row = header_row + 1 + offset
+            next_item_type = item_types[offset + 1] if offset + 1 < len(item_types) else None
             folder_positions.append(row)
-            current_folder = ws.cell(row=row, column=us_name_col_num + 1).value
-            paste_row = row + 1 if next_item_type != "Folder" else row
-            ws.cell(row=paste_row, column=item_type_col_num).value = current_folder
-    
-    # Save the workbook after column population
-    wb.save(output_path)
-    
-    # Second pass: Handle merging
-    wb = openpyxl.load_workbook(output_path)
-    ws = wb.active
-    
-    # Process merging for the new column
+            folder_names.append((row + 1 if next_item_type != "Folder" else row, us_names[offset]))
+
+    # Add the folder column to the left of Item Type: one new column list, no cells are shifted
+    report_progress(0, stage="Formatting folders")
+    table.insert_column(item_type_col_num)
+    for paste_row, folder_name in folder_names:
+        table.set_value(paste_row, item_type_col_num, folder_name)
+
+    max_row = table.max_row
+    count_work(rows=len(item_types), cells=len(folder_names))
+
+    # Merge the folder column down to the row before the next folder
+    folder_ends = []
     merge_start = None
     current_value = None
-    
-    for row in range(header_row + 1, ws.max_row + 1):
-        cell_value = ws.cell(row=row, column=item_type_col_num).value
-        
+    for row, cell_value in enumerate(table.column_values(item_type_col_num, header_row + 1), start=header_row + 1):
         if cell_value and cell_value != current_value:
             if merge_start and current_value:
                 # Find the next folder position
-                next_folder = next((pos for pos in folder_positions if pos > merge_start), ws.max_row + 1)
-                end_row = next_folder - 1
-                
-                ws.merge_cells(
+                pos = bisect_right(folder_positions, merge_start)
+                next_folder = folder_positions[pos] if pos < len(folder_positions) else max_row + 1
+                table.merge_cells(
                     start_row=merge_start,
                     start_column=item_type_col_num,
-                    end_row=end_row,
+                    end_row=next_folder - 1,
                     end_column=item_type_col_num
                 )
-                merged_cell = ws.cell(row=merge_start, column=item_type_col_num)
-                merged_cell.alignment = Alignment(vertical='center')
+                table.set_style(merge_start, item_type_col_num, alignment=alignment)
+                folder_ends.append(next_folder - 1)
             merge_start = row
             current_value = cell_value
-    
+
     # Handle the last merge for the new column
     if merge_start and current_value:
-        ws.merge_cells(
+        table.merge_cells(
             start_row=merge_start,
             start_column=item_type_col_num,
-            end_row=ws.max_row,
+            end_row=max_row,
             end_column=item_type_col_num
         )
-        merged_cell = ws.cell(row=merge_start, column=item_type_col_num)
-        merged_cell.alignment = Alignment(vertical='center')
-    
-    # Process parent column (US Name) merging
-    merge_start = None
-    current_value = None
-    parent_ranges = []  # Store parent merge ranges
-    
-    for row in range(header_row + 1, ws.max_row + 1):
-        cell_value = ws.cell(row=row, column=us_name_col_num + 1).value
-        
-        if cell_value != current_value:
-            if merge_start and current_value is not None and merge_start < row - 1:
-                ws.merge_cells(
-                    start_row=merge_start,
-                    start_column=us_name_col_num + 1,
-                    end_row=row - 1,
-                    end_column=us_name_col_num + 1
-                )
-                parent_ranges.append((merge_start, row - 1))
-                merged_cell = ws.cell(row=merge_start, column=us_name_col_num + 1)
-                merged_cell.alignment = Alignment(vertical='center')
-            merge_start = row
-            current_value = cell_value
-    
-    # Handle last parent merge
-    if merge_start and current_value is not None and merge_start < ws.max_row:
-        ws.merge_cells(
-            start_row=merge_start,
-            start_column=us_name_col_num + 1,
-            end_row=ws.max_row,
-            end_column=us_name_col_num + 1
-        )
-        parent_ranges.append((merge_start, ws.max_row))
-        merged_cell = ws.cell(row=merge_start, column=us_name_col_num + 1)
-        merged_cell.alignment = Alignment(vertical='center')
-    
-    # Process columns between parent and child within parent bounds
-    for col in range(us_name_col_num + 2, ut_name_col_num + 1):
-        for start_row, end_row in parent_ranges:
-            current_value = ws.cell(row=start_row, column=col).value
-            if current_value is not None:
-                ws.merge_cells(
-                    start_row=start_row,
-                    start_column=col,
-                    end_row=end_row,
-                    end_column=col
-                )
-                merged_cell = ws.cell(row=start_row, column=col)
-                merged_cell.alignment = Alignment(vertical='center')
-    
-    # First process child column and store its merge ranges
-    child_ranges = []
-    merge_start = None
-    current_value = None
-    
-    for row in range(header_row + 1, ws.max_row + 1):
-        cell_value = ws.cell(row=row, column=ut_name_col_num + 1).value
-        
-        if cell_value != current_value:
-            if merge_start and current_value is not None and merge_start < row - 1:
-                ws.merge_cells(
-                    start_row=merge_start,
-                    start_column=ut_name_col_num + 1,
-                    end_row=row - 1,
-                    end_column=ut_name_col_num + 1
-                )
-                child_ranges.append((merge_start, row - 1, current_value))
-                merged_cell = ws.cell(row=merge_start, column=ut_name_col_num + 1)
-                merged_cell.alignment = Alignment(vertical='center')
-            merge_start = row
-            current_value = cell_value
-    
-    # Handle last child merge
-    if merge_start and current_value is not None and merge_start < ws.max_row:
-        ws.merge_cells(
-            start_row=merge_start,
-            start_column=ut_name_col_num + 1,
-            end_row=ws.max_row,
-            end_column=ut_name_col_num + 1
-        )
-        child_ranges.append((merge_start, ws.max_row, current_value))
-        merged_cell = ws.cell(row=merge_start, column=ut_name_col_num + 1)
-        merged_cell.alignment = Alignment(vertical='center')
-    
-    # Process following columns based on child ranges
-    for col in range(ut_name_col_num + 2, ws.max_column + 1):
-        for start_row, end_row, _ in child_ranges:
-            cell_value = ws.cell(row=start_row, column=col).value
-            if cell_value is not None:
-                ws.merge_cells(
-                    start_row=start_row,
-                    start_column=col,
-                    end_row=end_row,
-                    end_column=col
-                )
-                merged_cell = ws.cell(row=start_row, column=col)
-                merged_cell.alignment = Alignment(vertical='center')
-    
-    wb.save(output_path)
-    return wb 
\ No newline at end of file
+        table.set_style(merge_start, item_type_col_num, alignment=alignment)
+        folder_ends.append(max_row)
+
+    # Process parent column (US Name) merging, then the columns between parent and child within it
+    parent_ranges = merge_runs(table, us_name_col_num + 1, header_row + 1, max_row, alignment)
+    merge_within(table, range(us_name_col_num + 2, ut_name_col_num + 1), parent_ranges, alignment)
+
+    # Process child column (UT Name) merging, then the following columns within it
+    child_ranges = merge_runs(table, ut_name_col_num + 1, header_row + 1, max_row, alignment)
+    merge_within(table, range(ut_name_col_num + 2, table.max_column + 1), child_ranges, alignment)
+
+    # Folders, user stories and user tasks are the three border levels
+    table.add_group_ends([(end_row, 0, item_type_col_num) for end_row in folder_ends]
+                         + [(end_row, 1, us_name_col_num + 1) for _, end_row, _ in parent_ranges]
+                         + [(end_row, 2, ut_name_col_num + 1) for _, end_row, _ in child_ranges])
+
+    return table
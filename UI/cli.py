@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app.utils.pipelines import (format_trace_file, merge_control_file, format_usertask_file, find_duplicates_file,
+                                 find_duplicates_across_files)
+from app.utils.near_duplicates import DEFAULT_SIMILARITY
+from app.utils.duplicate_index import default_index_path
+from app.utils.instrumentation import run_instrumented, default_log_path
+
+# Headless batch entry point: runs the same pipelines as the GUI over many exports,
+# one file per worker process. Example:
+#   python UI/cli.py risk "exports/*.xlsx" --header-row 4 --harm-col H --severity-col I --score G:K --borders
+
+def expand_files(patterns):
+    """Expand each argument as a glob (shells on Windows do not), keeping the order given"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise ValueError(f"No files match: {pattern}")
+        for match in matches:
+            if match not in files:
+                files.append(match)
+    return files
+
+def output_path_for(file_path, output_dir, suffix):
+    """Output next to the input (or in output_dir) named <input name><suffix>.xlsx"""
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(output_dir or os.path.dirname(file_path), f"{base_name}{suffix}.xlsx")
+
+def parse_score_pair(text):
+    """Parse an OCCURRENCE:RISK_ANALYSIS column pair such as G:K"""
+    occurrence_col, sep, risk_analysis_col = text.partition(':')
+    if not sep or not occurrence_col or not risk_analysis_col:
+        raise argparse.ArgumentTypeError(f"Expected OCCURRENCE:RISK_ANALYSIS columns, got {text}")
+    return occurrence_col, risk_analysis_col
+
+def load_risk_matrix(path):
+    """Read a 5x5 risk matrix (rows occurrence 5 to 1, columns severity 1 to 5) from a JSON file"""
+    if path is None:
+        return None
+    with open(path) as f:
+        matrix = json.load(f)
+    if len(matrix) != 5 or any(len(row) != 5 for row in matrix):
+        raise ValueError("Risk matrix must be 5 rows of 5 values")
+    return matrix
+
+def build_tasks(args):
+    """Return (input file, function, args, kwargs) for every file of the command"""
+    tasks = []
+    if args.command == 'duplicates-across':
+        # One task: every file and column goes into the same index
+        files = expand_files(args.files)
+        targets = [(file_path, column) for file_path in files for column in args.columns]
+        return [(", ".join(files), find_duplicates_across_files, (targets, args.output),
+                 {'near_duplicates': args.near, 'similarity': args.similarity, 'index_path': args.index})]
+    for file_path in expand_files(args.files):
+        if args.command == 'duplicates':
+            kwargs = {'near_duplicates': args.near, 'similarity': args.similarity, 'index_path': args.index}
+            if args.analysis_only:
+                kwargs.update(output_path=output_path_for(file_path, args.output_dir, args.suffix), analysis_only=True)
+            tasks.append((file_path, find_duplicates_file, (file_path, args.column), kwargs))
+            continue
+
+        output_path = output_path_for(file_path, args.output_dir, args.suffix)
+        if args.command == 'general':
+            tasks.append((file_path, format_trace_file, (file_path, output_path, args.header_row),
+                          {'harm_id_col': args.harm_col, 'borders': args.borders}))
+        elif args.command == 'urra':
+            tasks.append((file_path, format_trace_file, (file_path, output_path, args.header_row),
+                          {'harm_id_col': args.harm_col, 'parent_cols': args.parents, 'borders': args.borders,
+                           'level_borders': args.level_borders}))
+        elif args.command == 'risk':
+            tasks.append((file_path, format_trace_file, (file_path, output_path, args.header_row), {
+                'harm_id_col': args.harm_col,
+                'parent_cols': args.parents,
+                'score_columns': args.score,
+                'severity_col': args.severity_col,
+                'risk_matrix_values': load_risk_matrix(args.risk_matrix),
+                'borders': args.borders,
+                'conditional_formatting': args.conditional_formatting,
+                'level_borders': args.level_borders,
+            }))
+        elif args.command == 'control':
+            tasks.append((file_path, merge_control_file, (
+                file_path, args.control_file, output_path,
+                args.risk_header_row, args.control_header_row,
+                args.risk_id_col, args.control_id_col,
+                args.paste_col, args.control_content_col
+            ), {}))
+        elif args.command == 'usertask':
+            tasks.append((file_path, format_usertask_file, (
+                file_path, output_path, args.header_row,
+                args.item_type_col, args.us_name_col, args.ut_name_col
+            ), {'borders': args.borders, 'level_borders': args.level_borders}))
+    return tasks
+
+def run_tasks(tasks, workers=None, log_path=None, trace_memory=False):
+    """
+    Run the tasks across a process pool; returns the number of failures.
+    Every task's stages are timed and appended to the run log.
+    """
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_instrumented, func.__name__, func, func_args, kwargs, log_path, trace_memory): file_path
+                   for file_path, func, func_args, kwargs in tasks}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                result, stats = future.result()
+                print(f"ok      {file_path} -> {result} ({stats.headline()})")
+            except Exception as e:
+                failures += 1
+                print(f"failed  {file_path}: {e}", file=sys.stderr)
+    return failures
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Format Jama exports without the GUI")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_command(name, help_text, suffix):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('files', nargs='+', help="Files or glob patterns of .xlsx or .csv exports")
+        command.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+        command.add_argument('--log', default=None, help=f"Run log to append per-stage timings to (default: {default_log_path()})")
+        command.add_argument('--trace-memory', action='store_true', help="Record the peak memory of each stage (slower)")
+        if suffix is not None:
+            command.add_argument('--output-dir', default=None, help="Directory for the outputs (default: next to each input)")
+            command.add_argument('--suffix', default=suffix, help=f"Appended to each input name (default: {suffix})")
+        return command
+
+    def add_format_args(command):
+        command.add_argument('--header-row', type=int, default=4)
+        command.add_argument('--harm-col', default=None, help="Harm ID column; it and the two after it are not merged")
+        command.add_argument('--borders', action='store_true', help="Add thick borders after merged groups covering column B")
+
+    def add_level_borders_arg(command):
+        command.add_argument('--level-borders', action='store_true',
+                             help="With --borders, border the hierarchy instead: thick after each top-level group, "
+                                  "thin after the groups of each lower level")
+
+    def add_index_arg(command):
+        command.add_argument('--index', nargs='?', const=default_index_path(), default=None,
+                             help="Check each column against the duplicate index of earlier exports, then add it "
+                                  f"(default index: {default_index_path()})")
+
+    def add_near_args(command):
+        command.add_argument('--near', action='store_true',
+                             help="Also group near duplicates (case, whitespace, punctuation or a few words apart)")
+        command.add_argument('--similarity', type=float, default=DEFAULT_SIMILARITY,
+                             help=f"Similarity (0 to 1) at which near duplicates are grouped (default: {DEFAULT_SIMILARITY})")
+
+    general = add_command('general', "General trace matrix merge (format_general)", "_formatted")
+    add_format_args(general)
+
+    urra = add_command('urra', "Merge within nested parent columns (format_urra)", "_formatted")
+    add_format_args(urra)
+    add_level_borders_arg(urra)
+    urra.add_argument('--parents', nargs='+', required=True, help="Parent columns, outermost first (e.g. B D)")
+
+    risk = add_command('risk', "Format and calculate risk scores (calculate_risk_score)", "_formatted")
+    add_format_args(risk)
+    add_level_borders_arg(risk)
+    risk.add_argument('--parents', nargs='+', default=None, help="Parent columns for URRA merging (default: column B)")
+    risk.add_argument('--severity-col', required=True)
+    risk.add_argument('--score', type=parse_score_pair, action='append', required=True,
+                      help="OCCURRENCE:RISK_ANALYSIS columns; repeat for pre- and post-mitigation")
+    risk.add_argument('--risk-matrix', default=None, help="JSON file with a 5x5 risk matrix (default: SPR-WI-7.1.1b)")
+    risk.add_argument('--conditional-formatting', action='store_true',
+                      help="Colour risk levels with one conditional format per column instead of cell fills")
+
+    control = add_command('control', "Paste risk controls into risk documents (merge_risk_control)", "_merged")
+    control.add_argument('--control-file', required=True)
+    control.add_argument('--risk-header-row', type=int, default=4)
+    control.add_argument('--control-header-row', type=int, default=4)
+    control.add_argument('--risk-id-col', required=True)
+    control.add_argument('--control-id-col', required=True)
+    control.add_argument('--paste-col', required=True)
+    control.add_argument('--control-content-col', required=True)
+
+    usertask = add_command('usertask', "Marathon UT format (usertask_format)", "_formatted")
+    usertask.add_argument('--header-row', type=int, default=4)
+    usertask.add_argument('--item-type-col', required=True)
+    usertask.add_argument('--us-name-col', required=True)
+    usertask.add_argument('--ut-name-col', required=True)
+    usertask.add_argument('--borders', action='store_true', help="Add thick borders after merged groups covering column B")
+    add_level_borders_arg(usertask)
+
+    duplicates = add_command('duplicates', "Add a Duplicate_Analysis sheet (highlight_duplicates_in_column)", "_duplicates")
+    duplicates.add_argument('--column', required=True, help="Column to search for duplicates")
+    add_near_args(duplicates)
+    add_index_arg(duplicates)
+    duplicates.add_argument('--analysis-only', action='store_true',
+                            help="Write only the analysis to its own file (see --output-dir and --suffix) "
+                                 "instead of adding it to each input")
+
+    across = add_command('duplicates-across', "Find duplicates across several columns and files (find_duplicates_across)", None)
+    across.add_argument('--columns', nargs='+', required=True, help="Columns to search in every file (e.g. C E)")
+    across.add_argument('--output', required=True, help="Workbook to write the analysis and collisions to")
+    add_near_args(across)
+    add_index_arg(across)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        tasks = build_tasks(args)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    if (args.command != 'duplicates' or args.analysis_only) and getattr(args, 'output_dir', None):
+        os.makedirs(args.output_dir, exist_ok=True)
+    failures = run_tasks(tasks, args.workers, args.log, args.trace_memory)
+    print(f"{len(tasks) - failures} of {len(tasks)} files processed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,48 +1,67 @@
+import sys
+import time
+import importlib
 import tkinter as tk
 from tkinter import ttk
-from app.screens.start_screen import StartScreen
-from app.screens.premit_risk_screen import PremitRiskScreen
-from app.screens.postmit_risk_screen import PostmitRiskScreen
-from app.screens.trace_matrix import TraceMatrixScreen
-from app.screens.risk_control_merge import RiskControlScreen
-from app.screens.premit_urra_screen import PremitURRAScreen
-from app.screens.postmit_urra_screen import PostmitURRAScreen
-from app.screens.duplicate_search_screen import DuplicateSearchScreen
-from app.screens.marathon_ut_screen import MarathonUTScreen
+
+# Screen name -> module that defines it. Screens are imported and built the first
+# time show_frame needs them, so startup only pays for the start screen.
+SCREENS = {
+    "StartScreen": "app.screens.start_screen",
+    "TraceMatrixScreen": "app.screens.trace_matrix",
+    "PremitRiskScreen": "app.screens.premit_risk_screen",
+    "PostmitRiskScreen": "app.screens.postmit_risk_screen",
+    "RiskControlScreen": "app.screens.risk_control_merge",
+    "PremitURRAScreen": "app.screens.premit_urra_screen",
+    "PostmitURRAScreen": "app.screens.postmit_urra_screen",
+    "DuplicateSearchScreen": "app.screens.duplicate_search_screen",
+    "MarathonUTScreen": "app.screens.marathon_ut_screen",
+}
 
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(self, report_times=False):
         super().__init__()
         self.title("Jama Format Machine")
         self.geometry("1000x850")
-        
-        container = ttk.Frame(self)
-        container.pack(fill="both", expand=True)
-        container.grid_rowconfigure(0, weight=1)
-        container.grid_columnconfigure(0, weight=1)
-        
+
+        self.container = ttk.Frame(self)
+        self.container.pack(fill="both", expand=True)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+
         self.frames = {}
-        for F in (
-            StartScreen,
-            TraceMatrixScreen,
-            PremitRiskScreen,
-            PostmitRiskScreen,
-            RiskControlScreen,
-            PremitURRAScreen,
-            PostmitURRAScreen,
-            DuplicateSearchScreen,
-            MarathonUTScreen
-        ):
-            frame = F(container)
-            self.frames[F.__name__] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
-        
+        self.screen_times = {}  # screen name -> (import seconds, construction seconds)
+        self.report_times = report_times
+
         self.show_frame("StartScreen")
-    
+
+    def get_frame(self, frame_name):
+        """Return the screen, importing its module and building it on first use"""
+        frame = self.frames.get(frame_name)
+        if frame is None:
+            start = time.perf_counter()
+            screen_class = getattr(importlib.import_module(SCREENS[frame_name]), frame_name)
+            imported = time.perf_counter()
+            frame = screen_class(self.container)
+            frame.grid(row=0, column=0, sticky="nsew")
+            built = time.perf_counter()
+
+            self.frames[frame_name] = frame
+            self.screen_times[frame_name] = (imported - start, built - imported)
+            if self.report_times:
+                print(f"{frame_name}: import {1000 * (imported - start):.1f} ms, "
+                      f"build {1000 * (built - imported):.1f} ms")
+        return frame
+
     def show_frame(self, frame_name):
-        frame = self.frames[frame_name]
+        frame = self.get_frame(frame_name)
         frame.tkraise()
 
 if __name__ == "__main__":
-    app = App()
+    # --startup-times prints the import and construction cost of each screen as it is first shown
+    report_times = "--startup-times" in sys.argv[1:]
+    start = time.perf_counter()
+    app = App(report_times)
+    if report_times:
+        print(f"Startup to first screen: {1000 * (time.perf_counter() - start):.1f} ms")
     app.mainloop()
@@ -0,0 +1,183 @@
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+# Times each pipeline stage on generated trace views of 1k, 10k and 100k rows and reports
+# wall time and peak Python memory (tracemalloc). Every case runs in a fresh process so
+# caches and allocations of one case do not leak into the next. Example:
+#   python benchmarks/run_benchmarks.py --sizes 1000 10000 --json results.jsonl
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'UI'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from openpyxl.utils import get_column_letter
+from trace_generator import (generate_trace_view, write_trace_view, generate_control_document,
+                             generate_dfmea_pair, generate_rtm_pair, write_xlsx)
+
+HEADER_ROW = 4
+CASES = [
+    "format_general",
+    "format_urra",
+    "calculate_risk_scores",
+    "add_merged_borders",
+    "merge_risk_control",
+    "usertask_format",
+    "highlight_duplicates_in_column",
+    "near_duplicates",
+    "dfmea_redline",
+    "rtm_redline",
+]
+
+def load_script(name):
+    """Import one of the ExcelCrunch scripts by path"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'ExcelCrunch', f'{name}.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def make_fixtures(directory, rows, seed=0):
+    """Write every input the cases need for one size; returns the fixture description"""
+    from app.utils.pipelines import format_trace_file
+
+    layout, header, data = generate_trace_view(rows, seed=seed)
+    trace = write_trace_view(os.path.join(directory, 'trace.xlsx'), layout, header, data)
+
+    folder_layout, folder_header, folder_data = generate_trace_view(rows, depth=2, folders=True, seed=seed)
+    folders = write_trace_view(os.path.join(directory, 'folders.xlsx'), folder_layout, folder_header, folder_data)
+
+    # The risk document is a formatted trace view; the controls trace to its top-level IDs
+    risk = format_trace_file(trace, os.path.join(directory, 'risk.xlsx'), HEADER_ROW, layout.harm_id)
+    risk_ids = list(dict.fromkeys(row[1] for row in data))
+    control_rows, control_merges = generate_control_document(risk_ids, header_row=HEADER_ROW, seed=seed)
+    control = os.path.join(directory, 'control.xlsx')
+    write_xlsx(control, control_rows, control_merges)
+
+    paths = {}
+    for name, pair in (('dfmea', generate_dfmea_pair(rows, seed=seed)), ('rtm', generate_rtm_pair(rows, seed=seed))):
+        for version, (sheet_rows, merges) in zip(('original', 'new'), pair):
+            paths[f'{name}_{version}'] = os.path.join(directory, f'{name}_{version}.xlsx')
+            write_xlsx(paths[f'{name}_{version}'], sheet_rows, merges)
+
+    return {
+        'directory': directory,
+        'rows': rows,
+        'trace': trace,
+        'folders': folders,
+        'risk': risk,
+        'control': control,
+        'parents': [layout.levels[0][0], layout.levels[1][0]],
+        'harm_id': layout.harm_id,
+        'severity': layout.severity,
+        'scores': layout.scores,
+        'output_columns': layout.output_columns,
+        'us_name': folder_layout.levels[0][1],
+        'ut_name': folder_layout.levels[1][1],
+        'duplicate_column': layout.levels[1][1],
+        **paths,
+    }
+
+def setup_case(case, fx):
+    """Untimed preparation; returns the function to time and its arguments"""
+    from app.utils.general_format import format_general
+    from app.utils.general_format_URRA import format_urra
+    from app.utils.risk_score import calculate_risk_scores
+    from app.utils.border_format import add_merged_borders
+    from app.utils.risk_control import merge_risk_control
+    from app.utils.usertask_format import usertask_format
+    from app.utils.duplicate_item import highlight_duplicates_in_column
+
+    if case == "format_general":
+        return format_general, (fx['trace'], HEADER_ROW, fx['harm_id'])
+    if case == "format_urra":
+        return format_urra, (fx['trace'], HEADER_ROW, *fx['parents'], fx['harm_id'])
+    if case == "calculate_risk_scores":
+        table = format_general(fx['trace'], HEADER_ROW, fx['harm_id'])
+        return calculate_risk_scores, (table, fx['scores'], fx['severity'], HEADER_ROW)
+    if case == "add_merged_borders":
+        table = format_general(fx['trace'], HEADER_ROW, fx['harm_id'])
+        table = calculate_risk_scores(table, fx['scores'], fx['severity'], HEADER_ROW)
+        return add_merged_borders, (table,)
+    if case == "merge_risk_control":
+        paste_col = get_column_letter(fx['output_columns'] + 1)
+        return merge_risk_control, (fx['risk'], fx['control'], HEADER_ROW, HEADER_ROW,
+                                    fx['parents'][0], 'B', paste_col, 'D')
+    if case == "usertask_format":
+        return usertask_format, (fx['folders'], HEADER_ROW, 'A', fx['us_name'], fx['ut_name'])
+    if case in ("highlight_duplicates_in_column", "near_duplicates"):
+        # The analysis is saved into its input, so work on a copy
+        copy = os.path.join(fx['directory'], 'duplicates.xlsx')
+        shutil.copyfile(fx['trace'], copy)
+        return highlight_duplicates_in_column, (copy, fx['duplicate_column'], None, case == "near_duplicates")
+    if case in ("dfmea_redline", "rtm_redline"):
+        name = case.split('_')[0]
+        script = load_script('dFMEA_Redline' if name == 'dfmea' else 'rtmRedline')
+        output = os.path.join(fx['directory'], f'{name}_redline.xlsx')
+        return script.compare_excel_files, (fx[f'{name}_original'], fx[f'{name}_new'], output)
+    raise ValueError(f"Unknown case: {case}")
+
+def run_case(case, fx, measure_memory=True):
+    """Run one case in this process; returns (seconds, peak bytes or None)"""
+    func, args = setup_case(case, fx)
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - start
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+def run_isolated(case, fx, measure_memory=True):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run_case, case, fx, measure_memory).result()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the JamaGUI pipelines on synthetic trace views")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Data rows per fixture")
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per case; the fastest is reported")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Skip tracemalloc (it slows allocation-heavy stages, so wall times are lower without it)")
+    parser.add_argument('--json', default=None, help="Append one JSON line per result to this file")
+    parser.add_argument('--keep', default=None, help="Write fixtures and outputs to this directory and keep them")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--parse-cache', action='store_true',
+                        help="Leave the parse cache on (by default every case parses its input)")
+    args = parser.parse_args(argv)
+    if not args.parse_cache:
+        # Inherited by the case processes
+        os.environ['JAMAGUI_CACHE_MB'] = '0'
+
+    print(f"{'rows':>8}  {'case':<32}{'seconds':>10}{'peak MB':>10}")
+    for rows in args.sizes:
+        directory = os.path.join(args.keep, str(rows)) if args.keep else tempfile.mkdtemp(prefix='jama_bench_')
+        os.makedirs(directory, exist_ok=True)
+        try:
+            fx = make_fixtures(directory, rows, args.seed)
+            for case in args.cases:
+                results = [run_isolated(case, fx, not args.no_memory) for _ in range(args.repeat)]
+                seconds = min(result[0] for result in results)
+                peak = max(result[1] for result in results) if not args.no_memory else None
+                peak_text = f"{peak / 2**20:10.1f}" if peak is not None else f"{'-':>10}"
+                print(f"{rows:>8}  {case:<32}{seconds:10.2f}{peak_text}", flush=True)
+                if args.json:
+                    with open(args.json, 'a') as f:
+                        f.write(json.dumps({'rows': rows, 'case': case, 'seconds': round(seconds, 4),
+                                            'peak_bytes': peak, 'memory_traced': not args.no_memory,
+                                            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}) + "\n")
+        finally:
+            if not args.keep:
+                shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import csv
+import random
+import openpyxl
+from openpyxl.utils import get_column_letter
+
+# Synthetic Jama trace view exports for benchmarking. The layout mirrors a real export:
+# a few title rows, a header row, an Item Type column, an ID and a name column for
+# every level of the trace, the occurrence scores, then Harm ID, Harm and Severity.
+# The risk analysis columns are the empty columns after the export.
+
+LEVEL_NAMES = ["Need", "Requirement", "Specification", "Verification", "Validation", "Test Step"]
+LEVEL_PREFIXES = ["NEED", "REQ", "SPEC", "VER", "VAL", "STEP"]
+WORDS = ("device shall display alarm pressure sensor user interface battery signal pump "
+         "flow rate patient clinician occlusion detect within seconds accuracy therapy "
+         "infusion motor error message limit tolerance calibration storage").split()
+
+class TraceLayout:
+    """Column letters of each role in a generated trace view"""
+    def __init__(self, depth, harm_columns, score_columns):
+        self.header_row = None
+        self.item_type = 'A'
+        self.levels = []  # (ID column, name column) per level, outermost first
+        col = 2
+        for _ in range(depth):
+            self.levels.append((get_column_letter(col), get_column_letter(col + 1)))
+            col += 2
+        occurrences = [get_column_letter(col + pair) for pair in range(score_columns)]
+        col += score_columns
+        self.harm_id = self.harm = None
+        if harm_columns:
+            self.harm_id, self.harm = get_column_letter(col), get_column_letter(col + 1)
+            col += 2
+        self.severity = None
+        if score_columns or harm_columns:
+            self.severity = get_column_letter(col)
+            col += 1
+        self.max_column = col - 1
+        # (occurrence column, risk analysis column) pairs; risk analysis goes after the export
+        self.scores = [(occurrence, get_column_letter(self.max_column + 1 + pair))
+                       for pair, occurrence in enumerate(occurrences)]
+        self.output_columns = self.max_column + score_columns
+
+def text(rnd, length):
+    """Random sentence of about length characters"""
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rnd.choice(WORDS))
+    return " ".join(words).capitalize()
+
+def generate_trace_view(rows=1000, depth=3, fan_out=3, text_length=40, harm_columns=True,
+                        folders=False, score_columns=2, header_row=4, shared_children=0.1, seed=0):
+    """
+    Generate a trace view export of about rows data rows.
+    depth is the number of trace levels and fan_out the most children a node has (1 to fan_out each).
+    shared_children is the chance a child reuses an existing ID of its level, as when one requirement
+    traces to several needs. folders adds Marathon UT style Folder rows before top-level groups.
+    score_columns is the number of occurrence columns (each with a risk analysis column after the export), 0 for none.
+    Returns (layout, header, data rows).
+    """
+    rnd = random.Random(seed)
+    layout = TraceLayout(depth, harm_columns, score_columns)
+    layout.header_row = header_row
+
+    header = ["Item Type"]
+    for level in range(depth):
+        name = LEVEL_NAMES[level % len(LEVEL_NAMES)]
+        header += [f"{name} ID", f"{name} Name"]
+    for pair in range(score_columns):
+        label = "Pre-Mitigation" if pair == 0 else "Post-Mitigation" if pair == 1 else f"Score {pair + 1}"
+        header.append(f"{label} Occurrence")
+    if harm_columns:
+        header += ["Harm ID", "Harm"]
+    if layout.severity:
+        header.append("Severity")
+
+    counters = [0] * depth
+    issued = [[] for _ in range(depth)]
+    harms = [(f"HARM-{i}", text(rnd, text_length), rnd.randint(1, 5)) for i in range(1, 26)]
+    leaf_type = LEVEL_NAMES[(depth - 1) % len(LEVEL_NAMES)]
+    data = []
+
+    def node(level):
+        if issued[level] and rnd.random() < shared_children:
+            return rnd.choice(issued[level])
+        counters[level] += 1
+        item = (f"{LEVEL_PREFIXES[level % len(LEVEL_PREFIXES)]}-{counters[level]}", text(rnd, text_length))
+        issued[level].append(item)
+        return item
+
+    def emit(path, level, occurrences):
+        if len(data) >= rows:
+            return
+        item = node(level)
+        path = path + [item]
+        if level == depth - 2 or depth == 1:
+            # Occurrence scores belong to the parent of the leaves and are merged over them
+            occurrences = [f"{rnd.randint(1, 5)} - {rnd.choice(['Remote', 'Occasional', 'Likely'])}" for _ in range(score_columns)]
+        if level == depth - 1:
+            row = [leaf_type]
+            for item_id, name in path:
+                row += [item_id, name]
+            row += occurrences
+            if harm_columns:
+                harm_id, harm, severity = rnd.choice(harms)
+                row += [harm_id, harm]
+            else:
+                severity = rnd.randint(1, 5)
+            if layout.severity:
+                row.append(f"{severity} - Severity")
+            data.append(row)
+            return
+        for _ in range(rnd.randint(1, fan_out)):
+            emit(path, level + 1, occurrences)
+
+    group = 0
+    while len(data) < rows:
+        if folders and group % 5 == 0:
+            # Folder row: the folder name sits in the top-level name column
+            folder = [None] * layout.max_column
+            folder[0] = "Folder"
+            folder[2] = f"Folder {group // 5 + 1}: {text(rnd, text_length // 2)}"
+            data.append(folder)
+        emit([], 0, [None] * score_columns)
+        group += 1
+
+    return layout, header, data
+
+def title_rows(header_row, title):
+    """The rows Jama writes above the header"""
+    rows = [[title], ["Exported by benchmark generator"]]
+    rows = rows[:header_row - 1]
+    rows += [[]] * (header_row - 1 - len(rows))
+    return rows
+
+def write_xlsx(path, rows, merges=(), column_width=None):
+    """Write rows (and merged range strings) to an .xlsx file in write-only mode"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    if column_width:
+        for col in range(1, max(len(row) for row in rows) + 1):
+            ws.column_dimensions[get_column_letter(col)].width = column_width
+    for row in rows:
+        ws.append(row)
+    for merge in merges:
+        ws.merged_cells.ranges.add(merge)
+    wb.save(path)
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+
+def write_trace_view(path, layout, header, data, title="Trace View"):
+    """Write a generated trace view as .xlsx or .csv, depending on the extension of path"""
+    rows = title_rows(layout.header_row, title) + [header] + data
+    if path.lower().endswith('.csv'):
+        write_csv(path, rows)
+    else:
+        write_xlsx(path, rows, column_width=20)
+    return path
+
+def generate_control_document(risk_ids, controls_per_id=3, text_length=40, header_row=4, seed=0):
+    """
+    Control trace view for merge_risk_control: the risk ID (column B, merged over its controls),
+    then control ID and control text. Returns (rows, merges).
+    """
+    rnd = random.Random(seed)
+    rows = title_rows(header_row, "Risk Control Trace") + [["Item Type", "Risk ID", "Control ID", "Control"]]
+    merges = []
+    control = 0
+    for risk_id in risk_ids:
+        start = len(rows) + 1
+        for _ in range(rnd.randint(1, controls_per_id)):
+            control += 1
+            rows.append(["Risk Control", risk_id, f"RC-{control}", text(rnd, text_length)])
+        if len(rows) > start:
+            merges.append(f"B{start}:B{len(rows)}")
+    return rows, merges
+
+def mutate(rnd, value, rate):
+    return f"{value}-rev" if rnd.random() < rate else value
+
+def generate_dfmea_pair(rows=1000, change_rate=0.1, seed=0):
+    """
+    Original and revised dFMEA sheets in the layout dFMEA_Redline expects: the key in A merged over
+    its group with B-F and M-N, G-H merged per failure mode, I-L one per row.
+    Returns ((rows, merges), (rows, merges)).
+    """
+    def build(revised):
+        rnd = random.Random(seed)
+        out, merges = [], []
+        group = 0
+        while len(out) < rows:
+            group += 1
+            if revised and rnd.random() < change_rate / 2:
+                continue  # Group deleted in the revision
+            a_start = len(out) + 1
+            for mode in range(rnd.randint(1, 3)):
+                g_start = len(out) + 1
+                for cause in range(rnd.randint(1, 3)):
+                    row = [f"FM-{group}"]
+                    row += [mutate(rnd, f"{c}{group}-{cause}", change_rate if revised else 0) for c in "BCDEF"]
+                    row += [f"G-{group}-{mode}", f"H{group}{mode}"]
+                    row += [mutate(rnd, f"{c}{group}{mode}{cause}", change_rate if revised else 0) for c in "IJKL"]
+                    row += [f"M{group}", f"N{group}{cause}"]
+                    out.append(row)
+                if len(out) > g_start:
+                    merges += [f"G{g_start}:G{len(out)}", f"H{g_start}:H{len(out)}"]
+            if len(out) > a_start:
+                merges += [f"A{a_start}:A{len(out)}", f"M{a_start}:M{len(out)}"]
+        return out, merges
+    return build(False), build(True)
+
+def generate_rtm_pair(rows=1000, depth=3, fan_out=3, change_rate=0.1, seed=0):
+    """Original and revised RTM sheets for rtmRedline: one ID column per level, parents merged"""
+    def build(revised):
+        rnd = random.Random(seed)
+        out, merges = [], []
+        counters = [0] * depth
+
+        def emit(path, level):
+            counters[level] += 1
+            item = f"{LEVEL_PREFIXES[level % len(LEVEL_PREFIXES)]}-{counters[level]}"
+            item = mutate(rnd, item, change_rate if revised else 0)
+            start = len(out) + 1
+            if level == depth - 1:
+                out.append(path + [item])
+                return
+            for _ in range(rnd.randint(1, fan_out)):
+                emit(path + [item], level + 1)
+            if len(out) > start:
+                merges.append(f"{get_column_letter(level + 1)}{start}:{get_column_letter(level + 1)}{len(out)}")
+
+        while len(out) < rows:
+            emit([], 0)
+        return out, merges
+    return build(False), build(True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Jama trace view export")
+    parser.add_argument('output', help="Output .xlsx or .csv path")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fan-out', type=int, default=3)
+    parser.add_argument('--text-length', type=int, default=40)
+    parser.add_argument('--no-harm', action='store_true', help="Leave out the harm columns")
+    parser.add_argument('--folders', action='store_true', help="Add Marathon UT Folder rows")
+    parser.add_argument('--score-columns', type=int, default=2, help="Occurrence score columns")
+    parser.add_argument('--header-row', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    layout, header, data = generate_trace_view(
+        args.rows, args.depth, args.fan_out, args.text_length, not args.no_harm,
+        args.folders, args.score_columns, args.header_row, seed=args.seed
+    )
+    write_trace_view(args.output, layout, header, data)
+    print(f"Wrote {len(data)} rows to {args.output}")
+
+if __name__ == "__main__":
+    main()
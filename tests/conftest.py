@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app is imported as in UI/main.py and UI/cli.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'UI'))
@@ -0,0 +1,32 @@
+from openpyxl.worksheet.cell_range import CellRange
+from app.utils.trace_table import TraceTable
+from app.utils.border_format import add_merged_borders
+
+
+def make_table():
+    """Title merge A1:D1, a column B merge over rows 2-3 and a group recorded in column C"""
+    table = TraceTable([["Title", "x", "x", "x"], [None, "b", "b", "c"], [None, "p", "q", "r"], [None, 1, 2, 3]])
+    table.merged_ranges = [CellRange("A1:D1"), CellRange("B2:B3")]
+    table.group_ends = {3: (0, 3), 4: (1, 4)}
+    return table
+
+
+def bottom(table, row, col):
+    border = table.get_style(row, col, 'border')
+    return border.bottom.style if border is not None else None
+
+
+def test_default_borders_follow_column_b_merges():
+    table = add_merged_borders(make_table())
+    # Every merge covering column B, the title included, is bordered from column B on
+    assert [bottom(table, 1, col) for col in range(1, 5)] == [None, 'thick', 'thick', 'thick']
+    assert [bottom(table, 3, col) for col in range(1, 5)] == [None, 'thick', 'thick', 'thick']
+    # Recorded group ends are not used without levels
+    assert [bottom(table, 4, col) for col in range(1, 5)] == [None, None, None, None]
+
+
+def test_level_borders_follow_recorded_group_ends():
+    table = add_merged_borders(make_table(), levels=True)
+    assert [bottom(table, 1, col) for col in range(1, 5)] == [None, None, None, None]
+    assert [bottom(table, 3, col) for col in range(1, 5)] == [None, 'thick', 'thick', 'thick']
+    assert [bottom(table, 4, col) for col in range(1, 5)] == [None, None, None, 'thin']
@@ -0,0 +1,62 @@
+import threading
+import time
+from app.utils.duplicate_index import DuplicateIndex, check_and_index
+
+RELEASE_1 = [("REQ-1", "The pump shall stop.", "Row 5"), ("REQ-2", "The alarm shall sound.", "Rows 6-7")]
+RELEASE_2 = [("REQ-1", "the pump shall stop", "Row 5"), ("REQ-3", "The door shall lock.", "Row 6")]
+
+
+def test_first_run_finds_nothing_and_indexes_every_entry(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    assert check_and_index([("exports/release_1.xlsx", "c", RELEASE_1)], path) == [["", ""]]
+    with DuplicateIndex(path) as index:
+        rows = index.connection.execute("SELECT key, item_id, source_file, column_letter, row_info FROM items ORDER BY rowid").fetchall()
+    assert rows == [("the pump shall stop", "REQ-1", "release_1.xlsx", "C", "Row 5"),
+                    ("the alarm shall sound", "REQ-2", "release_1.xlsx", "C", "Rows 6-7")]
+
+
+def test_indexing_the_same_export_again_adds_and_reports_nothing(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    check_and_index([("release_1.xlsx", "C", RELEASE_1)], path)
+    # The same file name from another directory is the same export
+    assert check_and_index([("copy/release_1.xlsx", "C", RELEASE_1)], path) == [["", ""]]
+    with DuplicateIndex(path) as index:
+        assert index.connection.execute("SELECT COUNT(*) FROM items").fetchone() == (2,)
+
+
+def test_later_exports_see_earlier_matches(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    check_and_index([("release_1.xlsx", "C", RELEASE_1)], path)
+    assert check_and_index([("release_2.xlsx", "C", RELEASE_2)], path) == [
+        ["REQ-1 in release_1.xlsx (Column C, Row 5)", ""]]
+
+
+def test_columns_searched_together_are_not_earlier_matches_of_each_other(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    assert check_and_index([("release_1.xlsx", "C", RELEASE_1), ("release_2.xlsx", "C", RELEASE_2)], path) == [
+        ["", ""], ["", ""]]
+
+
+def test_a_second_writer_waits_for_the_first(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    DuplicateIndex(path).connection.close()
+    errors = []
+
+    def index_release_2():
+        try:
+            check_and_index([("release_2.xlsx", "C", RELEASE_2)], path)
+        except Exception as e:
+            errors.append(e)
+
+    with DuplicateIndex(path) as index:
+        # The insert holds the write lock until the block commits
+        index.add(RELEASE_1, "release_1.xlsx", "C")
+        writer = threading.Thread(target=index_release_2)
+        writer.start()
+        time.sleep(0.5)
+        assert writer.is_alive()
+    writer.join(timeout=30)
+    assert not writer.is_alive() and errors == []
+    with DuplicateIndex(path) as index:
+        files = index.connection.execute("SELECT source_file FROM items ORDER BY rowid").fetchall()
+    assert files == [("release_1.xlsx",)] * 2 + [("release_2.xlsx",)] * 2
@@ -0,0 +1,26 @@
+import openpyxl
+from app.utils.duplicate_item import highlight_duplicates_in_column, find_duplicates_across, ANALYSIS_SHEET
+
+TEXTS = ["The pump shall stop.", "the pump shall stop", "Pressure > 5", "Pressure < 5", "The pump shall stop."]
+
+
+def analysis_groups(path, content_col, group_col):
+    ws = openpyxl.load_workbook(path)[ANALYSIS_SHEET]
+    return [(row[content_col], row[group_col]) for row in ws.iter_rows(min_row=2, values_only=True)]
+
+
+def test_single_and_multi_file_searches_group_a_column_alike(tmp_path):
+    source = str(tmp_path / "export.xlsx")
+    wb = openpyxl.Workbook()
+    for number, text in enumerate(TEXTS, start=1):
+        wb.active.append([f"REQ-{number}", text])
+    wb.save(source)
+
+    single = highlight_duplicates_in_column(source, "B", str(tmp_path / "single.xlsx"), analysis_only=True)
+    across = find_duplicates_across([(source, "B")], str(tmp_path / "across.xlsx"))
+
+    # The multi-file analysis starts with each entry's file and column
+    groups = analysis_groups(single, 1, 3)
+    assert groups == analysis_groups(across, 3, 5)
+    # Exact matching keeps case and punctuation variants apart
+    assert [group for _, group in groups] == [1, 2, 3, 4, 1]
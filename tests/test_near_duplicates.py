@@ -0,0 +1,25 @@
+from app.utils.near_duplicates import find_clusters
+
+# Shingle similarity: FIRST-SECOND 0.85, SECOND-THIRD 0.84, FIRST-THIRD 0.71
+FIRST = "The infusion pump shall stop the motor when the door is opened during delivery"
+SECOND = "The infusion pump shall stop the motor when the door is opened during a delivery cycle"
+THIRD = "The infusion pump shall halt the motor when the door is opened during a delivery cycle"
+OTHER = "Alarm volume shall be adjustable"
+
+
+def test_texts_equal_once_normalized_are_one_cluster():
+    clusters = find_clusters(["Stop the pump.", "stop  the PUMP", OTHER])
+    assert clusters == [(1, 1.0), (1, 1.0), (2, 1.0)]
+
+
+def test_texts_are_grouped_at_the_similarity_threshold():
+    assert [number for number, _ in find_clusters([FIRST, SECOND], 0.85)] == [1, 1]
+    assert [number for number, _ in find_clusters([FIRST, SECOND], 0.86)] == [1, 2]
+
+
+def test_clusters_join_through_a_shared_near_duplicate():
+    clusters = find_clusters([FIRST, SECOND, THIRD, OTHER], 0.8)
+    assert [number for number, _ in clusters] == [1, 1, 1, 2]
+    # Each text is scored against the first text of its cluster, below the threshold here
+    assert 0.7 < clusters[2][1] < 0.8
+
@@ -0,0 +1,104 @@
+import os
+import openpyxl
+import pytest
+from app.utils import parse_cache
+from app.utils.trace_table import TraceTable
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv(parse_cache.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    monkeypatch.delenv(parse_cache.CACHE_SIZE_ENV, raising=False)
+    return tmp_path / "cache"
+
+
+def counting_parse(calls):
+    def parse(file_path):
+        calls.append(file_path)
+        return {"parsed": file_path}
+    return parse
+
+
+def test_cache_hit_skips_parsing(tmp_path):
+    source = tmp_path / "export.csv"
+    source.write_text("a,b\n")
+    copy = tmp_path / "copy.csv"
+    copy.write_text("a,b\n")
+    calls = []
+    first = parse_cache.cached_parse(str(source), counting_parse(calls))
+    # Same content under another name is a hit, and each hit is a fresh object
+    second = parse_cache.cached_parse(str(copy), counting_parse(calls))
+    assert calls == [str(source)]
+    assert second == first and second is not first
+
+
+def test_cached_workbook_saves_without_reading_the_source(tmp_path, monkeypatch):
+    source = str(tmp_path / "export.xlsx")
+    wb = openpyxl.Workbook()
+    wb.active.title = "Trace"
+    wb.active.append(["#", "Parent", "Child"])
+    wb.create_sheet("Notes")["A1"] = "kept"
+    wb.save(source)
+    TraceTable.load(source)
+
+    def no_parse(file_path):
+        raise AssertionError("parsed again")
+
+    opened = []
+    load_workbook = openpyxl.load_workbook
+
+    def recording_load_workbook(filename, *args, **kwargs):
+        opened.append(filename)
+        return load_workbook(filename, *args, **kwargs)
+
+    monkeypatch.setattr(TraceTable, "parse", no_parse)
+    monkeypatch.setattr(openpyxl, "load_workbook", recording_load_workbook)
+    output = str(tmp_path / "output.xlsx")
+    TraceTable.load(source).save(output)
+    assert source not in opened
+    assert load_workbook(output).sheetnames == ["Trace", "Notes"]
+
+
+def test_entries_of_another_version_are_not_loaded(tmp_path, monkeypatch):
+    source = tmp_path / "export.csv"
+    source.write_text("a,b\n")
+    calls = []
+    parse_cache.cached_parse(str(source), counting_parse(calls))
+    monkeypatch.setattr(parse_cache, "CACHE_VERSION", b"another-layout")
+    parse_cache.cached_parse(str(source), counting_parse(calls))
+    assert len(calls) == 2
+
+
+def test_unreadable_entry_is_dropped_and_parsed_again(tmp_path, cache_dir):
+    source = tmp_path / "export.csv"
+    source.write_text("a,b\n")
+    calls = []
+    parse_cache.cached_parse(str(source), counting_parse(calls))
+    entry = cache_dir / f"{parse_cache.content_key(str(source))}.pickle"
+    entry.write_bytes(b"truncated")
+    assert parse_cache.cached_parse(str(source), counting_parse(calls)) == {"parsed": str(source)}
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entries_are_evicted(cache_dir, monkeypatch):
+    # Room for two entries of about 600 bytes
+    monkeypatch.setenv(parse_cache.CACHE_SIZE_ENV, str(1300 / (1024 * 1024)))
+    parse_cache.put("a", b"a" * 600)
+    parse_cache.put("b", b"b" * 600)
+    os.utime(cache_dir / "a.pickle", (1000, 1000))
+    os.utime(cache_dir / "b.pickle", (2000, 2000))
+    # Reading a marks it as recently used, so b goes first
+    assert parse_cache.get("a") == b"a" * 600
+    parse_cache.put("c", b"c" * 600)
+    assert sorted(os.listdir(cache_dir)) == ["a.pickle", "c.pickle"]
+
+
+def test_zero_limit_turns_the_cache_off(tmp_path, cache_dir, monkeypatch):
+    monkeypatch.setenv(parse_cache.CACHE_SIZE_ENV, "0")
+    source = tmp_path / "export.csv"
+    source.write_text("a,b\n")
+    calls = []
+    parse_cache.cached_parse(str(source), counting_parse(calls))
+    parse_cache.cached_parse(str(source), counting_parse(calls))
+    assert len(calls) == 2
+    assert not cache_dir.exists()
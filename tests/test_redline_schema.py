@@ -0,0 +1,123 @@
+import importlib.util
+import json
+import os
+import openpyxl
+import pytest
+from openpyxl.utils import column_index_from_string
+from app.utils.redline_schema import normalize_schema, load_schema, redline_order, DFMEA_SCHEMA
+
+EXCEL_CRUNCH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ExcelCrunch')
+
+
+def load_dfmea_redline():
+    spec = importlib.util.spec_from_file_location("dFMEA_Redline", os.path.join(EXCEL_CRUNCH, "dFMEA_Redline.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("schema, message", [
+    ([], "at least one level"),
+    (None, "at least one level"),
+    ([{'columns': ['B']}], "Level 1 of the schema has no key column"),
+    ([{'key': 'A'}, {'key': 'G', 'keyed': ['I']}], "Level 2 of the schema has unknown entries: keyed"),
+    ([{'key': 'A', 'columns': ['B2']}], "Level 1 of the schema has an invalid column letter"),
+])
+def test_invalid_schemas_are_rejected(schema, message):
+    with pytest.raises(ValueError, match=message):
+        normalize_schema(schema)
+
+
+def test_schema_files_hold_a_list_or_an_object_with_levels(tmp_path):
+    listed = tmp_path / "listed.json"
+    listed.write_text(json.dumps(DFMEA_SCHEMA))
+    wrapped = tmp_path / "wrapped.json"
+    wrapped.write_text(json.dumps({'levels': DFMEA_SCHEMA}))
+    assert load_schema(str(listed)) == load_schema(str(wrapped)) == DFMEA_SCHEMA
+    unwrapped = tmp_path / "unwrapped.json"
+    unwrapped.write_text(json.dumps({'schema': DFMEA_SCHEMA}))
+    with pytest.raises(ValueError):
+        load_schema(str(unwrapped))
+
+
+def test_new_ids_come_first_then_removed_ones():
+    assert redline_order(["R3", "R1", "R3"], ["R1", "R2"]) == ["R3", "R1", "R2"]
+
+
+def write_dfmea(path, failures):
+    """
+    failures: (failure ID, {column: ID} for B-F and M-N, [(cause ID, effect ID, [(I, J, K, L) per row])])
+    Every failure and cause is merged over its rows, as in a formatted dFMEA.
+    """
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    row = 1
+    for failure_id, failure_columns, causes in failures:
+        first_row = row
+        for cause_id, effect_id, controls in causes:
+            ws.cell(row, column_index_from_string('G'), cause_id)
+            ws.cell(row, column_index_from_string('H'), effect_id)
+            if len(controls) > 1:
+                for col in ('G', 'H'):
+                    ws.merge_cells(f"{col}{row}:{col}{row + len(controls) - 1}")
+            for control in controls:
+                for col, value in zip('IJKL', control):
+                    ws[f"{col}{row}"] = value
+                row += 1
+        ws.cell(first_row, 1, failure_id)
+        for col, value in failure_columns.items():
+            ws[f"{col}{first_row}"] = value
+        if row - first_row > 1:
+            for col in ['A', *failure_columns]:
+                ws.merge_cells(f"{col}{first_row}:{col}{row - 1}")
+    wb.save(path)
+
+
+def failure(number, suffix=""):
+    return {col: f"{col}-{number}{suffix}" for col in "BCDEFMN"}
+
+
+ORIGINAL = [
+    ("FM-1", failure(1), [("C-1", "E-1", [("I-1", "J-1", "K-1", "L-1"), ("I-2", "J-2", "K-2", "L-2")]),
+                          ("C-2", "E-2", [("I-3", "J-3", "K-3", "L-3")])]),
+    ("FM-2", failure(2), [("C-3", "E-3", [("I-4", "J-4", "K-4", "L-4")])]),
+    ("FM-3", failure(3), [("C-4", "E-4", [("I-5", "J-5", "K-5", "L-5")])]),
+]
+NEW = [
+    ("FM-1", {**failure(1), 'C': "C-1b", 'M': "M-1b"},
+     [("C-1", "E-1b", [("I-1", "J-1", "K-1b", "L-1"), ("I-6", "J-2", "K-2", "L-2")]),
+      ("C-5", "E-5", [("I-7", "J-7", "K-7", "L-7")])]),
+    ("FM-4", failure(4), [("C-6", "E-6", [("I-8", "J-8", "K-8", "L-8"), ("I-9", "J-9", "K-9", "L-9")])]),
+    ("FM-2", failure(2), [("C-3", "E-3", [("I-4", "J-4", "K-4", "L-4")])]),
+]
+
+
+def read_redline(path):
+    ws = openpyxl.load_workbook(path).active
+    cells = {}
+    for row in ws.iter_rows():
+        for cell in row:
+            if cell.value is not None:
+                color = cell.font.color.rgb if cell.font.color is not None else None
+                cells[cell.coordinate] = (cell.value, color if isinstance(color, str) else None, cell.font.strike)
+    return sorted(str(merged_range) for merged_range in ws.merged_cells.ranges), cells
+
+
+def test_indexed_redline_matches_the_scan(tmp_path):
+    original, new = str(tmp_path / "original.xlsx"), str(tmp_path / "new.xlsx")
+    write_dfmea(original, ORIGINAL)
+    write_dfmea(new, NEW)
+    dfmea_redline = load_dfmea_redline()
+    indexed, scanned = str(tmp_path / "indexed.xlsx"), str(tmp_path / "scanned.xlsx")
+    dfmea_redline.compare_excel_files(original, new, indexed)
+    dfmea_redline.compare_excel_files(original, new, scanned, indexed=False)
+
+    merges, cells = read_redline(indexed)
+    assert (merges, cells) == read_redline(scanned)
+    # A changed ID is listed first as added, ahead of the original it replaces
+    assert cells['C1'] == ("C-1b", "0000FF00", None)
+    assert cells['H1'] == ("E-1b", "0000FF00", None)
+    # Unchanged IDs keep their font, and a new failure mode is added with everything under it
+    assert cells['B1'] == ("B-1", None, None)
+    assert cells['I2'] == ("I-6", "0000FF00", None)
+    assert cells['A4'] == ("FM-4", None, None) and cells['G4'] == ("C-6", "0000FF00", None)
@@ -0,0 +1,58 @@
+import openpyxl
+import pytest
+from app.utils import streaming
+from app.utils.pipelines import format_trace_file
+
+HEADER = ["Item Type", "Need", "Need Name", "Requirement", "Requirement Text", "Occurrence", "Severity",
+          "Risk Analysis", "Harm ID", "Harm", "Harm Severity"]
+
+
+def make_export(path):
+    """A trace view with a merged title and nested groups, one streaming block per need"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Trace View"])
+    ws.append([None])
+    ws.append([None])
+    ws.append(HEADER)
+    for need in range(1, 7):
+        for requirement in range(1, need % 3 + 2):
+            for harm in range(1, requirement + 1):
+                ws.append(["Need", f"NEED-{need}", f"Need {need}", f"REQ-{need}.{requirement}",
+                           f"Requirement {need}.{requirement}", (need + requirement) % 5 + 1, harm % 5 + 1,
+                           None, f"HARM-{harm}", f"Harm {harm}", harm % 5 + 1])
+    ws.merge_cells('A1:E1')
+    ws.column_dimensions['E'].width = 40
+    wb.save(path)
+
+
+def read_output(path):
+    ws = openpyxl.load_workbook(path).active
+    cells = {}
+    for row in ws.iter_rows():
+        for cell in row:
+            if cell.value is not None or cell.has_style:
+                cells[cell.coordinate] = (cell.value, cell.border.bottom.style, cell.fill.fgColor.rgb,
+                                          cell.alignment.vertical)
+    return sorted(str(merged_range) for merged_range in ws.merged_cells.ranges), cells
+
+
+@pytest.mark.parametrize("options", [
+    {'harm_id_col': 'I', 'score_columns': [('F', 'H')], 'severity_col': 'G', 'borders': True},
+    {'harm_id_col': 'I', 'parent_cols': ['B', 'D'], 'borders': True},
+    {'harm_id_col': 'I', 'parent_cols': ['B', 'D'], 'borders': True, 'level_borders': True},
+])
+def test_streaming_matches_the_in_memory_output(tmp_path, monkeypatch, options):
+    monkeypatch.setenv("JAMAGUI_CACHE_MB", "0")
+    source = str(tmp_path / "export.xlsx")
+    make_export(source)
+    in_memory = str(tmp_path / "in_memory.xlsx")
+    format_trace_file(source, in_memory, 4, **options)
+
+    monkeypatch.setattr(streaming, "STREAMING_FILE_SIZE", 0)
+    streamed = str(tmp_path / "streamed.xlsx")
+    format_trace_file(source, streamed, 4, **options)
+
+    merges, cells = read_output(streamed)
+    assert merges
+    assert (merges, cells) == read_output(in_memory)
@@ -0,0 +1,118 @@
+import openpyxl
+import pytest
+from openpyxl.comments import Comment
+from openpyxl.worksheet.datavalidation import DataValidation
+from app.utils.pipelines import format_trace_file
+from app.utils.trace_table import TraceTable
+
+
+def make_export(path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Trace"
+    ws.append(["Jama export"])
+    ws.append([None])
+    ws.append([None])
+    ws.append(["#", "Parent", "Child"])
+    for row in (["1", "NEED-1", "REQ-1"], ["2", "NEED-1", "REQ-2"], ["3", "NEED-2", "REQ-3"]):
+        ws.append(row)
+    ws["C5"].hyperlink = "https://example.com/REQ-1"
+    ws["C6"].comment = Comment("check wording", "reviewer")
+    validation = DataValidation(type="list", formula1='"Yes,No"')
+    validation.add("D5:D7")
+    ws.add_data_validation(validation)
+    ws.freeze_panes = "A5"
+    ws.row_dimensions[4].height = 32
+    ws.print_title_rows = "4:4"
+    ws.page_setup.orientation = "landscape"
+    wb.create_sheet("Notes")["A1"] = "kept"
+    wb.save(path)
+
+
+def test_formatting_keeps_the_rest_of_the_workbook(tmp_path, monkeypatch):
+    monkeypatch.setenv("JAMAGUI_CACHE_DIR", str(tmp_path / "cache"))
+    source = str(tmp_path / "export.xlsx")
+    make_export(source)
+    # The second run is served from the parse cache
+    for name in ("first.xlsx", "second.xlsx"):
+        output = str(tmp_path / name)
+        format_trace_file(source, output, 4)
+
+        wb = openpyxl.load_workbook(output)
+        assert wb.sheetnames == ["Trace", "Notes"]
+        assert wb["Notes"]["A1"].value == "kept"
+        ws = wb["Trace"]
+        assert "B5:B6" in {str(merged_range) for merged_range in ws.merged_cells.ranges}
+        assert ws["C5"].hyperlink.target == "https://example.com/REQ-1"
+        assert ws["C6"].comment.text == "check wording"
+        assert [str(validation.sqref) for validation in ws.data_validations.dataValidation] == ["D5:D7"]
+        assert ws.freeze_panes == "A5"
+        assert ws.row_dimensions[4].height == 32
+        assert ws.print_title_rows == "$4:$4"
+        assert ws.page_setup.orientation == "landscape"
+
+
+def test_cached_csv_is_titled_after_its_own_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("JAMAGUI_CACHE_DIR", str(tmp_path / "cache"))
+    for name in ("release_1.csv", "release_2.csv"):
+        (tmp_path / name).write_text("Jama export\n\n\n#,Parent,Child\n1,NEED-1,REQ-1\n2,NEED-1,REQ-2\n")
+        output = str(tmp_path / name.replace(".csv", ".xlsx"))
+        format_trace_file(str(tmp_path / name), output, 4)
+        assert openpyxl.load_workbook(output).sheetnames == [name[:-4]]
+
+
+
+def test_other_sheets_are_kept_from_load_time(tmp_path, monkeypatch):
+    monkeypatch.setenv("JAMAGUI_CACHE_MB", "0")
+    source = str(tmp_path / "export.xlsx")
+    make_export(source)
+    table = TraceTable.load(source)
+
+    # Saving writes the sheets read at load time, without opening the source again
+    openpyxl.Workbook().save(source)
+    opened = []
+    load_workbook = openpyxl.load_workbook
+
+    def recording_load_workbook(filename, *args, **kwargs):
+        opened.append(filename)
+        return load_workbook(filename, *args, **kwargs)
+
+    monkeypatch.setattr(openpyxl, "load_workbook", recording_load_workbook)
+    output = str(tmp_path / "output.xlsx")
+    table.save(output)
+    assert source not in opened
+
+    wb = load_workbook(output)
+    assert wb.sheetnames == ["Trace", "Notes"]
+    assert wb["Notes"]["A1"].value == "kept"
+    assert wb["Trace"]["C5"].value == "REQ-1"
+
+
+@pytest.mark.parametrize("col, freeze_panes, print_title_cols, validation", [
+    (2, "D5", "$A:$C", "C2:E4 G1"),
+    # A column inserted at the split is not frozen
+    (3, "C5", "$A:$B", "B2:E4 G1"),
+])
+def test_inserted_columns_move_validations_and_column_settings(tmp_path, col, freeze_panes, print_title_cols,
+                                                               validation):
+    source = str(tmp_path / "export.xlsx")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["ID", "Name", "Type", "Status", None, "Owner"])
+    data_validation = DataValidation(type="list", formula1='"Open,Closed"')
+    data_validation.add("B2:D4")
+    data_validation.add("F1")
+    ws.add_data_validation(data_validation)
+    ws.freeze_panes = "C5"
+    ws.print_title_cols = "A:B"
+    wb.save(source)
+
+    table = TraceTable.parse(source)
+    table.insert_column(col)
+    output = str(tmp_path / "output.xlsx")
+    table.save(output)
+
+    ws = openpyxl.load_workbook(output).active
+    assert ws.freeze_panes == freeze_panes
+    assert ws.print_title_cols == print_title_cols
+    assert [str(data_validation.sqref) for data_validation in ws.data_validations.dataValidation] == [validation]